@@ -0,0 +1,285 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import decode_token
+from auth import bearer_token, get_token_cache
+from metrics import TracedConnection, resource_name
+
+""" Controle de admissão das requisições: limite de taxa e de concorrência.
+
+    Limite de taxa: um balde de fichas (token bucket) por recurso e por cliente. O cliente
+    é a identidade do JWT quando a requisição traz um token válido e, sem ele, o IP (assim
+    '/login' e '/signup' são limitados por IP). Cada recurso tem o seu orçamento
+    (requisições, segundos): o balde começa cheio, com 'requisições' fichas, e se refaz a
+    'requisições / segundos' fichas por segundo. Sem ficha, a resposta é 429 com
+    'Retry-After'. Um balde cheio é igual a um balde inexistente, então os baldes que já
+    se encheram são descartados de tempos em tempos e a memória fica limitada aos clientes
+    ativos.
+
+    Limite de concorrência: no máximo 'MAX_CONCURRENT_REQUESTS' requisições em execução
+    por processo. Uma requisição além disso espera 'ADMISSION_TIMEOUT' segundos por uma
+    vaga e, sem vaga, recebe 503 em vez de entrar em uma fila sem fim.
+
+    Backends do limite de taxa:
+    - MemoryRateLimiter: dicionário local ao processo (um único worker).
+    - SQLiteRateLimiter: arquivo SQLite compartilhado entre os workers da mesma máquina. """
+
+
+# Orçamentos padrão por classe de recurso: (requisições, segundos); 'default' vale para os demais
+DEFAULT_RATE_LIMITS = {
+    "default": (600, 60),
+    "UserLogin": (10, 60),
+    "UserRegister": (10, 60),
+    "ItemsBulk": (30, 60),
+    "LoanBatch": (30, 60),
+    "DevolutionBatch": (30, 60),
+}
+
+TOO_MANY_REQUESTS = "Too many requests, try again later."
+SERVER_BUSY = "The server is busy, try again later."
+
+
+class MemoryRateLimiter:
+    """ Baldes de fichas em memória.
+
+        Cada balde é (fichas, atualizado em, cheio em); as fichas são recalculadas a cada
+        consulta pelo tempo decorrido. A cada 'purge_every' consultas, os baldes que já se
+        encheram saem do dicionário. """
+
+    def __init__(self, purge_every=1000):
+        self.purge_every = purge_every
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+
+    def take(self, key, capacity, period):
+        """ Tira uma ficha do balde 'key'.
+
+            Parâmetros:
+                key (str): Recurso e cliente.
+                capacity (int): Fichas do balde cheio (rajada máxima).
+                period (float): Segundos para encher o balde vazio.
+
+            Retorna:
+                float: 0 se a ficha foi tirada; senão, os segundos até haver uma. """
+
+        now = time.time()
+        rate = capacity / period
+
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.purge_every == 0:
+                self._purge(now)
+
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+                return (1 - tokens) / rate
+
+            tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return 0.0
+
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+    def _purge(self, now):
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+
+
+class SQLiteRateLimiter:
+    """ Baldes de fichas em um arquivo SQLite, compartilhados por todos os processos que usam o arquivo.
+
+        Cada consulta é um único UPSERT condicional: só atualiza o balde se houver ficha, e
+        o RETURNING diz se atualizou. Os baldes cheios são apagados a cada 'purge_every'
+        consultas. """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._calls = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL, full_at REAL) WITHOUT ROWID")
+
+
+    def _connection(self):
+        # Uma conexão por thread, em autocommit: cada comando já é a sua própria transação
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, factory=TracedConnection)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+    def take(self, key, capacity, period):
+        """ Tira uma ficha do balde 'key' (mesmo contrato de 'MemoryRateLimiter.take'). """
+
+        connection = self._connection()
+        values = {"key": key, "capacity": capacity, "rate": capacity / period, "now": time.time()}
+
+        self._calls += 1
+        if self._calls % self.purge_every == 0:
+            connection.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (values["now"],))
+
+        taken = connection.execute(
+            "INSERT INTO rate_buckets (key, tokens, updated_at, full_at) VALUES (:key, :capacity - 1, :now, :now + 1 / :rate) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "tokens = MIN(:capacity, tokens + (:now - updated_at) * :rate) - 1, updated_at = :now, "
+            "full_at = :now + (:capacity - MIN(:capacity, tokens + (:now - updated_at) * :rate) + 1) / :rate "
+            "WHERE MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1 "
+            "RETURNING tokens", values).fetchone()
+        if taken is not None:
+            return 0.0
+
+        tokens = connection.execute(
+            "SELECT MIN(:capacity, tokens + (:now - updated_at) * :rate) FROM rate_buckets WHERE key = :key", values).fetchone()
+        return max(0.0, (1 - tokens[0]) / values["rate"]) if tokens is not None else 0.0
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+
+
+
+class Admission:
+    """ Regras de admissão de uma aplicação: limitador de taxa, orçamentos e vagas de execução.
+
+        Atributos:
+            limiter (MemoryRateLimiter | SQLiteRateLimiter | None): None desliga o limite de taxa.
+            limits (dict): Classe de recurso -> (requisições, segundos), com 'default'.
+            slots (BoundedSemaphore | None): Vagas de execução; None desliga o limite de concorrência.
+            max_concurrent (int): Quantidade de vagas.
+            timeout (float): Segundos de espera por uma vaga. """
+
+    def __init__(self, limiter, limits, max_concurrent, timeout):
+        self.limiter = limiter
+        self.limits = limits
+        self.max_concurrent = max_concurrent
+        self.slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.timeout = timeout
+
+
+    def retry_after(self, resource, authorization, address):
+        """ Consome uma ficha do orçamento de 'resource' para o cliente.
+
+            Parâmetros:
+                resource (str): Classe do recurso ('Items', 'UserLogin', ...).
+                authorization (str | None): Cabeçalho 'Authorization' da requisição.
+                address (str | None): IP do cliente.
+
+            Retorna:
+                float: 0 se a requisição pode seguir; senão, os segundos até a próxima ficha. """
+
+        if self.limiter is None:
+            return 0.0
+
+        budget = self.limits.get(resource, self.limits.get("default"))
+        if not budget:
+            return 0.0
+
+        requests, seconds = budget
+        return self.limiter.take("{}|{}".format(resource, client_key(authorization, address)), requests, seconds)
+
+
+
+def client_key(authorization, address):
+    """ Identifica o cliente para o limite de taxa: 'user:<id>' com um JWT válido, senão 'ip:<endereço>'.
+
+        Precisa do contexto da aplicação (chave e regras do JWT). Um token inválido ou
+        expirado não é erro aqui: o cliente é identificado pelo IP e o endpoint decide. """
+
+    token = bearer_token(authorization)
+    if token:
+        # Um token já verificado por 'login_required' dispensa a decodificação
+        user = get_token_cache().get(token)
+        if user is not None:
+            return "user:{}".format(user.user_id)
+        try:
+            return "user:{}".format(decode_token(token)["sub"])
+        except Exception:
+            pass
+    return "ip:{}".format(address)
+
+
+def retry_header(seconds):
+    # 'Retry-After' é em segundos inteiros; arredonda para cima para o cliente não voltar cedo demais
+    return str(max(1, math.ceil(seconds)))
+
+
+def init_admission(app):
+    """ Cria as regras de admissão a partir do config, as registra em 'app.extensions' e liga os hooks.
+
+        Config:
+            RATE_LIMIT_ENABLED (bool): Padrão é True.
+            RATE_LIMIT_BACKEND: 'memory' (padrão) ou 'sqlite'.
+            RATE_LIMIT_SQLITE_PATH: arquivo do backend 'sqlite' (padrão: instance/rate_limits.db).
+            RATE_LIMITS (dict): Orçamentos por classe de recurso, (requisições, segundos), somados
+                aos de 'DEFAULT_RATE_LIMITS'; None em um recurso o deixa sem limite.
+            MAX_CONCURRENT_REQUESTS (int): Requisições em execução por processo. Padrão é 64; 0 desliga.
+            ADMISSION_TIMEOUT (float): Segundos de espera por uma vaga antes do 503. Padrão é 0.1. """
+
+    limiter = None
+    if app.config.get("RATE_LIMIT_ENABLED", True):
+        backend = app.config.get("RATE_LIMIT_BACKEND", "memory")
+
+        if backend == "memory":
+            limiter = MemoryRateLimiter()
+
+        elif backend == "sqlite":
+            path = app.config.get("RATE_LIMIT_SQLITE_PATH") or os.path.join(app.instance_path, "rate_limits.db")
+            limiter = SQLiteRateLimiter(path)
+
+        else:
+            raise ValueError("Unknown RATE_LIMIT_BACKEND '{}'.".format(backend))
+
+    limits = dict(DEFAULT_RATE_LIMITS, **app.config.get("RATE_LIMITS", {}))
+    admission = Admission(limiter, limits, app.config.get("MAX_CONCURRENT_REQUESTS", 64), app.config.get("ADMISSION_TIMEOUT", 0.1))
+    app.extensions["admission"] = admission
+
+
+    @app.before_request
+    def admit():
+        wait = admission.retry_after(resource_name(), request.headers.get("Authorization"), request.remote_addr)
+        if wait:
+            response = jsonify({"message": TOO_MANY_REQUESTS})
+            response.status_code = 429
+            response.headers["Retry-After"] = retry_header(wait)
+            return response
+
+        if admission.slots is not None:
+            if not admission.slots.acquire(timeout=admission.timeout):
+                response = jsonify({"message": SERVER_BUSY})
+                response.status_code = 503
+                response.headers["Retry-After"] = "1"
+                return response
+            g.admission_slot = True
+
+    @app.teardown_request
+    def release(error=None):
+        # Respostas em streaming passam aqui de novo ao fim do gerador; a vaga é devolvida uma vez só
+        if g.pop("admission_slot", False):
+            admission.slots.release()
+
+    return admission
+
+
+def get_admission():
+    """ Retorna as regras de admissão da aplicação atual. """
+
+    return current_app.extensions["admission"]
@@ -1,10 +1,23 @@
 from flask import Flask, jsonify
+import os
 from flask_restful import Api
-from resourcers.item_resources import Items, Item
-from resourcers.user_resourcers import User, UserRegister, UserLogin, UserLogout
-from resourcers.transaction_resourcers import Transactions, LoanTransaction, DevolutionTransaction
+from resourcers.item_resources import Items, Item, ItemsBulk
+from resourcers.user_resourcers import User, UserHoldings, UserRegister, UserLogin, UserLogout
+from resourcers.transaction_resourcers import Transactions, LoanTransaction, DevolutionTransaction, LoanBatch, DevolutionBatch
 from flask_jwt_extended import JWTManager
-from blacklist import BLACKLIST
+from resourcers.cache_resourcers import CacheStats
+from resourcers.stats_resourcers import Stats, OwnerStats, UserStats
+from blacklist import init_blacklist, get_blacklist
+from auth import init_auth
+from cache import init_cache
+from serialization import output_json
+from metrics import init_metrics
+from admission import init_admission
+from compression import init_compression
+from passwords import init_passwords
+from sql_alchemy import init_data
+from commands import register_commands
+from migrations import init_schema
 
 """ Aplicação Flask RESTful para gerenciamento de itens, usuários e transações.
 
@@ -14,49 +27,107 @@ from blacklist import BLACKLIST
     - Endpoints para transações de empréstimo e devolução de itens.
 
     Configurações importantes:
-    - Banco de dados SQLite configurado via SQLAlchemy.
-    - JWT configurado com secret key e blacklist ativada.
+    - Banco de dados SQLite configurado via SQLAlchemy, com pool de conexões (DATABASE_POOL_*)
+      e pragmas de desempenho (WAL) aplicados por 'init_data'.
+    - JWT configurado com secret key e blacklist ativada; o backend da blacklist
+      (memória, arquivo SQLite compartilhado ou Redis) vem de BLACKLIST_BACKEND.
+      Tokens já verificados ficam em um cache ('auth.py', JWT_CACHE_MAX_ENTRIES).
+    - Cache de leitura de itens/usuários (LRU com TTL ou Redis) configurado por CACHE_BACKEND.
+    - Senhas guardadas com hash scrypt/PBKDF2, calculado em um pool de threads limitado (PASSWORD_*).
+    - Métricas de latência por recurso e de consultas SQL em '/metrics' (METRICS_ENABLED).
+    - Limite de taxa por cliente e recurso (429) e de requisições simultâneas (503), em 'admission.py'.
+    - Respostas comprimidas com br/gzip conforme o 'Accept-Encoding' (COMPRESSION_*), em 'compression.py';
+      '/items' e '/transactions' levam um ETag fraco da versão da coleção ('versions.py') e respondem 304.
 
     Execução:
-    - Inicializa banco de dados antes de cada requisição.
+    - 'create_app(config)' monta a aplicação; o módulo expõe 'app = create_app()' para
+      'flask run' e servidores WSGI ('gunicorn app:app', 'waitress-serve app:app').
+    - O schema é verificado uma vez, na criação da aplicação (SCHEMA_SETUP_ON_STARTUP),
+      e não mais a cada requisição. 'flask --app app init-db' faz o mesmo pelo CLI.
+    - 'flask --app app migrate' aplica as migrações de schema (índices) em bancos existentes.
     - Roda o servidor Flask em modo debug. """
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///data.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = 'Secret'
-app.config['JWT_BLACK_LIST_ENABLED'] = True
-api = Api(app)
-jwt = JWTManager(app)
-
-
-@app.before_request
-def create_data():
-    # Cria as tabelas no banco de dados, se não existirem
-    data.create_all()
-
-
-@jwt.token_in_blocklist_loader
-def verify_blocklist(jwt_header, jwt_payload):
-    # Verifica se o token JWT está na blacklist (token inválido/revogado)
-    return jwt_payload['jti'] in BLACKLIST
-
-@jwt.revoked_token_loader
-def invalid_access_token(jwt_header, jwt_payload):
-    # Retorna mensagem ao acessar com token inválido ou revogado
-    return jsonify({'message': 'You have been logged out'}) # unauthorized
-
-api.add_resource(Items, '/items')
-api.add_resource(Item, '/items/<int:item_id>')
-api.add_resource(User, '/users/<int:user_id>')
-api.add_resource(UserRegister, '/signup')
-api.add_resource(UserLogin, '/login')
-api.add_resource(UserLogout, '/logout')
-api.add_resource(Transactions,'/transactions')
-api.add_resource(LoanTransaction,'/loans')
-api.add_resource(DevolutionTransaction,'/devolution')
+
+def register_resources(api):
+    # Registra as rotas REST da aplicação
+    api.add_resource(Items, '/items')
+    api.add_resource(ItemsBulk, '/items/bulk')
+    api.add_resource(Item, '/items/<int:item_id>')
+    api.add_resource(User, '/users/<int:user_id>')
+    api.add_resource(UserHoldings, '/users/<int:user_id>/holdings')
+    api.add_resource(UserRegister, '/signup')
+    api.add_resource(UserLogin, '/login')
+    api.add_resource(UserLogout, '/logout')
+    api.add_resource(Transactions,'/transactions')
+    api.add_resource(LoanTransaction,'/loans')
+    api.add_resource(DevolutionTransaction,'/devolution')
+    api.add_resource(LoanBatch, '/loans/batch')
+    api.add_resource(DevolutionBatch, '/devolution/batch')
+    api.add_resource(CacheStats, '/cache/stats')
+    api.add_resource(Stats, '/stats')
+    api.add_resource(OwnerStats, '/stats/owners/<int:owner_id>')
+    api.add_resource(UserStats, '/stats/users/<int:user_id>')
+
+
+def create_app(config=None):
+    """ Cria e configura a aplicação Flask.
+
+        Parâmetros:
+            config (dict, opcional): Valores que sobrescrevem a configuração padrão,
+                por exemplo {'SQLALCHEMY_DATABASE_URI': 'sqlite:///teste.db'}.
+                Variáveis de ambiente 'FLASK_<CHAVE>' também são lidas.
+                'SCHEMA_SETUP_ON_STARTUP' (padrão True) controla a criação/migração do
+                schema na inicialização; desative quando o deploy já roda 'flask init-db'
+                antes de subir vários workers.
+
+        Retorna:
+            Flask: A aplicação com banco, JWT, rotas e comandos registrados. """
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///data.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'Secret'
+    app.config['JWT_BLACK_LIST_ENABLED'] = True
+    app.config['PROPAGATE_EXCEPTIONS'] = True # Deixa os erros do JWT chegarem aos handlers do flask_jwt_extended
+    app.config['SCHEMA_SETUP_ON_STARTUP'] = True
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    api = Api(app)
+    api.representation('application/json')(output_json)
+    jwt = JWTManager(app)
+    init_data(app)
+    init_blacklist(app)
+    init_auth(app)
+    init_cache(app)
+    init_metrics(app)
+    init_admission(app)
+    init_compression(app)
+    init_passwords(app)
+    register_resources(api)
+    register_commands(app)
+
+
+    @jwt.token_in_blocklist_loader
+    def verify_blocklist(jwt_header, jwt_payload):
+        # Verifica se o token JWT está na blacklist (token inválido/revogado)
+        return jwt_payload['jti'] in get_blacklist()
+
+    @jwt.revoked_token_loader
+    def invalid_access_token(jwt_header, jwt_payload):
+        # Retorna mensagem ao acessar com token inválido ou revogado
+        return jsonify({'message': 'You have been logged out'}), 401 # unauthorized
+
+
+    if app.config['SCHEMA_SETUP_ON_STARTUP']:
+        with app.app_context():
+            # Cria as tabelas e aplica migrações uma única vez, na inicialização
+            init_schema()
+
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    from sql_alchemy import data
-    data.init_app(app)
     app.run(debug=True)
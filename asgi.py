@@ -0,0 +1,398 @@
+import asyncio
+import contextvars
+import re
+import time
+from urllib.parse import parse_qs
+from sqlalchemy import text
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags, quote_etag
+from admission import SERVER_BUSY, TOO_MANY_REQUESTS, MemoryRateLimiter, retry_header
+from cache import MemoryCache, NullCache, cache_entry, item_key, user_key
+from resourcers import item_resources, transaction_resourcers
+from sql_alchemy import data, apply_sqlite_pragmas, SQLITE_PRAGMAS
+from pagination import paginate, search_boundary
+from partitions import PARTITION_CATALOG, PartitionRouter
+from serialization import ITEM_FIELDS, USER_FIELDS, dumps, item_record, transaction_record, user_record
+from versions import VERSION_QUERY
+
+try:
+    from a2wsgi import WSGIMiddleware
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import aiosqlite  # noqa: F401 (driver do 'sqlite+aiosqlite')
+except ImportError as error:
+    raise ImportError("The ASGI mode requires 'a2wsgi', 'aiosqlite' and 'greenlet': "
+                      "pip install a2wsgi aiosqlite greenlet uvicorn") from error
+
+""" Modo de execução ASGI (opcional) da API.
+
+    As leituras mais frequentes ('GET /items', '/items/<id>', '/users/<id>',
+    '/users/<id>/holdings' e '/transactions') são atendidas de forma assíncrona, com um
+    engine SQLAlchemy assíncrono (aiosqlite) sobre as mesmas tabelas dos modelos e com
+    os mesmos contratos JSON. Uma conexão esperando o banco não prende uma thread, então
+    muitas requisições simultâneas cabem em um único processo.
+
+    Todo o resto (escritas, autenticação, empréstimos, devoluções e exportação em
+    streaming) continua nos recursos Flask, executados pelo adaptador WSGI em um pool de
+    threads; assim as regras de negócio e de JWT ficam em um único lugar.
+
+    As leituras assíncronas passam pelo mesmo limite de taxa das rotas Flask (mesmos
+    orçamentos e baldes, pela classe de recurso equivalente). O limite de concorrência
+    delas é um contador: acima de 'MAX_CONCURRENT_REQUESTS' leituras em andamento, a
+    resposta é 503 na hora, sem espera.
+
+    O cache de leitura e o limite de taxa são síncronos. Com os backends em memória a
+    chamada é direta; com os que fazem E/S (cache 'redis', limite de taxa 'sqlite') ela
+    roda em uma thread ('asyncio.to_thread'), para não parar o loop de eventos.
+
+    As listagens levam o mesmo ETag fraco das rotas Flask ('versions.py') e respondem 304
+    sem consultar; '/items/<id>' e '/users/<id>' usam o mesmo cache de leitura e o mesmo
+    ETag das rotas Flask ('cache.py'). As respostas são comprimidas pelo mesmo
+    'Compressor' ('compression.py'), e as requisições e consultas entram nas mesmas
+    métricas ('metrics.py'), com o driver 'aiosqlite'.
+
+    Execução:
+        uvicorn asgi:app --workers 4 """
+
+
+# Consultas das leituras de um objeto, com as colunas na ordem de 'serialization'
+ITEM_BY_ID = text("SELECT {} FROM items WHERE item_id = :item_id".format(", ".join(ITEM_FIELDS)))
+USER_BY_ID = text("SELECT {} FROM users WHERE user_id = :user_id".format(", ".join(USER_FIELDS)))
+HOLDINGS = text("SELECT {} FROM items WHERE current_holder_id = :user_id ORDER BY item_id".format(", ".join(ITEM_FIELDS)))
+
+# [recurso, consultas] da leitura assíncrona em andamento (cada requisição roda na sua própria task)
+CURRENT_READ = contextvars.ContextVar("asgi_current_read")
+
+# Drivers assíncronos equivalentes aos drivers síncronos configurados
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url):
+    """ Converte a URL do engine síncrono na URL equivalente com driver assíncrono.
+
+        Parâmetros:
+            url (URL): 'data.engine.url' (já com o caminho do SQLite resolvido pelo Flask-SQLAlchemy).
+
+        Retorna:
+            URL: A mesma URL com o driver assíncrono.
+
+        Levanta:
+            ValueError: Se não houver driver assíncrono conhecido para o banco. """
+
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError("No async driver configured for '{}'; set ASYNC_DATABASE_URL.".format(backend))
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def query_arguments(query_string):
+    # Query string crua do escopo ASGI -> mapeamento com o primeiro valor de cada argumento
+    raw = parse_qs(query_string.decode("latin-1"), keep_blank_values=True)
+    return {name: values[0] for name, values in raw.items()}
+
+
+class InventoryASGI:
+    """ Aplicação ASGI que atende as leituras de forma assíncrona e delega o resto ao Flask.
+
+        Atributos:
+            flask_app (Flask): Aplicação criada por 'create_app'.
+            engine (AsyncEngine): Engine assíncrono sobre o mesmo banco.
+            wsgi (WSGIMiddleware): Adaptador que executa o Flask em um pool de threads.
+            admission (Admission | None): Regras de admissão do Flask ('init_admission').
+            compressor (Compressor | None): Compressão do Flask ('init_compression').
+            cache: Cache de leitura do Flask ('init_cache').
+            metrics (Metrics | None): Métricas do Flask ('init_metrics').
+            active (int): Leituras assíncronas em andamento. """
+
+
+    def __init__(self, flask_app, engine, wsgi):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.wsgi = wsgi
+        self.admission = flask_app.extensions.get("admission")
+        self.compressor = flask_app.extensions.get("compression")
+        self.cache = flask_app.extensions["cache"]
+        self.metrics = flask_app.extensions.get("metrics")
+        self.active = 0
+        # Backends que fazem E/S rodam fora do loop de eventos ('blocking')
+        limiter = self.admission.limiter if self.admission is not None else None
+        self.offload_limiter = limiter is not None and not isinstance(limiter, MemoryRateLimiter)
+        self.offload_cache = not isinstance(self.cache, (MemoryCache, NullCache))
+        # (padrão do caminho, handler, classe de recurso equivalente no Flask)
+        self.routes = [
+            (re.compile(r"^/items$"), self.list_items, "Items"),
+            (re.compile(r"^/items/(\d+)$"), self.get_item, "Item"),
+            (re.compile(r"^/users/(\d+)$"), self.get_user, "User"),
+            (re.compile(r"^/users/(\d+)/holdings$"), self.get_holdings, "UserHoldings"),
+            (re.compile(r"^/transactions$"), self.list_transactions, "Transactions"),
+        ]
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        route = self.match(scope)
+        if route is None:
+            return await self.wsgi(scope, receive, send)
+
+        handler, path_args, resource = route
+        start = time.perf_counter()
+        current = [resource, 0]
+        token = CURRENT_READ.set(current)
+        try:
+            response = await self.refuse(scope, resource)
+            if response is None:
+                response = await self.handle(handler, scope, path_args)
+            await self.send_json(send, scope, *response)
+        finally:
+            CURRENT_READ.reset(token)
+
+        if self.metrics is not None:
+            self.metrics.observe_request(resource, "GET", response[1], time.perf_counter() - start, current[1])
+
+
+    async def handle(self, handler, scope, path_args):
+        # (corpo, status) ou (corpo, status, cabeçalhos)
+        self.active += 1
+        try:
+            return await handler(scope, *path_args)
+        except HTTPException as error:
+            # Mesmo corpo de erro do flask_restful ('abort' com 'message' ou a descrição)
+            return getattr(error, "data", None) or {"message": error.description}, error.code
+        finally:
+            self.active -= 1
+
+
+    async def refuse(self, scope, resource):
+        # (corpo, status, cabeçalhos) da recusa pelo limite de taxa ou de concorrência, ou None
+        if self.admission is None:
+            return None
+
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"").decode("latin-1") or None
+        wait = await self.blocking(self.offload_limiter, self.rate_limit_wait, resource, authorization,
+                                   (scope.get("client") or (None,))[0])
+        if wait:
+            return {"message": TOO_MANY_REQUESTS}, 429, [(b"retry-after", retry_header(wait).encode())]
+
+        if self.admission.max_concurrent and self.active >= self.admission.max_concurrent:
+            return {"message": SERVER_BUSY}, 503, [(b"retry-after", b"1")]
+        return None
+
+
+    def rate_limit_wait(self, resource, authorization, address):
+        # No contexto da aplicação: o backend 'sqlite' registra as consultas nas métricas
+        with self.flask_app.app_context():
+            return self.admission.retry_after(resource, authorization, address)
+
+
+    @staticmethod
+    async def blocking(offload, function, *args):
+        # Chamada síncrona; com 'offload', em uma thread do executor padrão do loop
+        if offload:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+
+    def match(self, scope):
+        # Só leituras JSON são atendidas aqui; exportações em streaming ficam com o Flask
+        if scope["type"] != "http" or scope["method"] != "GET" or self.wants_export(scope):
+            return None
+
+        for pattern, handler, resource in self.routes:
+            found = pattern.match(scope["path"])
+            if found:
+                return handler, [int(value) for value in found.groups()], resource
+        return None
+
+
+    @staticmethod
+    def wants_export(scope):
+        if b"format=" in scope["query_string"]:
+            return True
+        accept = dict(scope["headers"]).get(b"accept", b"")
+        return b"ndjson" in accept or b"csv" in accept
+
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+    async def send_json(self, send, scope, body, status, headers=()):
+        # Mesmo formato de saída do flask_restful (JSON seguido de quebra de linha), comprimido como no Flask
+        if status == 304:
+            await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+            return await send({"type": "http.response.body", "body": b""})
+
+        payload = dumps(body) + b"\n"
+        headers = [(b"content-type", b"application/json"), *headers]
+        if self.compressor is not None:
+            accept_encoding = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+            payload, encoding = self.compressor.encode(payload, accept_encoding)
+            headers.append((b"vary", b"Accept-Encoding"))
+            if encoding is not None:
+                headers.append((b"content-encoding", encoding.encode()))
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [*headers, (b"content-length", str(len(payload)).encode())],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+
+    async def fetch(self, query, values):
+        if isinstance(query, str):
+            query = text(query)
+        start = time.perf_counter()
+        async with self.engine.connect() as connection:
+            result = await connection.execute(query, values)
+            rows = result.fetchall()
+
+        current = CURRENT_READ.get(None)
+        if self.metrics is not None and current is not None:
+            current[1] += 1
+            self.metrics.observe_query(current[0], "aiosqlite", time.perf_counter() - start)
+        return rows
+
+
+    def if_none_match(self, scope, etag, weak=False):
+        # Se o 'If-None-Match' do cliente já tem 'etag'
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        return bool(if_none_match) and parse_etags(if_none_match.decode("latin-1")).contains_weak(etag)
+
+
+    async def collection_etag(self, scope, name):
+        # (cabeçalhos com o ETag fraco da coleção, se o 'If-None-Match' do cliente já tem essa versão)
+        rows = await self.fetch(VERSION_QUERY, {"name": name})
+        etag = "{}-{}".format(name, rows[0][0] if rows else 0)
+        return [(b"etag", quote_etag(etag, weak=True).encode())], self.if_none_match(scope, etag)
+
+
+    async def cached(self, scope, key, query, values, record):
+        # Leitura de um objeto pelo cache de leitura do Flask ('cache.read_through'), com o mesmo
+        # ETag e o mesmo 304; (corpo, status, cabeçalhos), ou None se o objeto não existir
+        entry = await self.blocking(self.offload_cache, self.cache.get, key)
+        if entry is None:
+            rows = await self.fetch(query, values)
+            if not rows:
+                return None
+            entry = cache_entry(record(rows[0]))
+            await self.blocking(self.offload_cache, self.cache.set, key, entry)
+
+        headers = [(b"etag", quote_etag(entry["etag"]).encode())]
+        if self.if_none_match(scope, entry["etag"]):
+            return None, 304, headers
+        return entry["body"], 200, headers
+
+
+    async def list_items(self, scope):
+        args = item_resources.arguments.parse(query_arguments(scope["query_string"]))
+        parameters = item_resources.normalize_arguments(**args)
+        headers, current = await self.collection_etag(scope, "items")
+        if current:
+            return None, 304, headers
+        query, values, sort = item_resources.ITEM_QUERY.build(parameters)
+        boundary = None
+        if sort == "relevance":
+            boundary = search_boundary(await self.fetch(item_resources.ITEM_QUERY.ranked_boundary, {"q": values["q"]}))
+
+        rows = await self.fetch(query, values)
+        rows, next_cursor = paginate(rows, parameters["limit"], 0, sort, values.get("offset", 0), boundary)
+
+        body = {"items": [item_record(row) for row in rows], "next_cursor": next_cursor}
+        if boundary is not None:
+            body["truncated"] = True
+        return body, 200, headers
+
+
+    async def list_transactions(self, scope):
+        args = transaction_resourcers.arguments.parse(query_arguments(scope["query_string"]))
+        parameters = transaction_resourcers.normalize_arguments(**args)
+        headers, current = await self.collection_etag(scope, "transactions")
+        if current:
+            return None, 304, headers
+        router = PartitionRouter(await self.fetch(PARTITION_CATALOG, {}))
+        query, values, sort = transaction_resourcers.TRANSACTION_QUERY.build(parameters, route=router.route)
+
+        rows = await self.fetch(query, values)
+        rows, next_cursor = paginate(rows, parameters["limit"], 0, sort)
+
+        body = {"transactions": [transaction_record(row) for row in rows], "next_cursor": next_cursor}
+        if router.archived:
+            body["archived_months"] = router.archived
+        return body, 200, headers
+
+
+    async def get_item(self, scope, item_id):
+        response = await self.cached(scope, item_key(item_id), ITEM_BY_ID, {"item_id": item_id}, item_record)
+        if response is not None:
+            return response
+        return {'message': 'Item not found.'}, 404 # not found
+
+
+    async def get_user(self, scope, user_id):
+        response = await self.cached(scope, user_key(user_id), USER_BY_ID, {"user_id": user_id}, user_record)
+        if response is not None:
+            return response
+        return {'message': 'User not found.'}, 404 #not found
+
+
+    async def get_holdings(self, scope, user_id):
+        if not await self.fetch("SELECT 1 FROM users WHERE user_id = :user_id", {"user_id": user_id}):
+            return {'message': 'User not found.'}, 404 #not found
+
+        rows = await self.fetch(HOLDINGS, {"user_id": user_id})
+        return {'items': [item_record(row) for row in rows]}, 200
+
+
+
+def create_asgi_app(flask_app=None):
+    """ Cria a aplicação ASGI sobre uma aplicação Flask.
+
+        Parâmetros:
+            flask_app (Flask, opcional): Aplicação criada por 'create_app'; sem ela, usa o
+                'app' do módulo 'app'.
+
+        Lê do config da aplicação (todos opcionais):
+            ASYNC_DATABASE_URL: URL do banco para o engine assíncrono (padrão: a mesma do Flask
+                com driver assíncrono).
+            DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW: tamanho do pool assíncrono.
+            ASGI_WSGI_WORKERS (int): Threads que executam as rotas Flask. Padrão é 10.
+
+        Retorna:
+            InventoryASGI: A aplicação pronta para 'uvicorn'. """
+
+    if flask_app is None:
+        from app import app as flask_app
+
+    config = flask_app.config
+
+    with flask_app.app_context():
+        url = config.get("ASYNC_DATABASE_URL") or async_database_url(data.engine.url)
+
+    engine = create_async_engine(
+        url,
+        pool_size=config.get("DATABASE_POOL_SIZE", 5),
+        max_overflow=config.get("DATABASE_MAX_OVERFLOW", 10),
+    )
+
+    if engine.dialect.name == "sqlite":
+        pragmas = dict(SQLITE_PRAGMAS)
+        pragmas.update(config.get("SQLITE_PRAGMAS", {}))
+        apply_sqlite_pragmas(engine.sync_engine, pragmas)
+
+    wsgi = WSGIMiddleware(flask_app, workers=config.get("ASGI_WSGI_WORKERS", 10))
+    return InventoryASGI(flask_app, engine, wsgi)
+
+
+app = create_asgi_app()
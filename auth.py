@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from blacklist import get_blacklist
+
+""" Autenticação dos endpoints protegidos com um cache de tokens já verificados.
+
+    O 'jwt_required' do flask_jwt_extended decodifica o token e confere a assinatura HMAC a
+    cada requisição, e os handlers ainda convertiam 'get_jwt_identity()' com 'int(...)'.
+    Aqui, a primeira requisição com um token passa pela verificação completa do
+    flask_jwt_extended (assinatura, expiração, tipo e blacklist, com as mesmas respostas de
+    erro); o resultado vira um 'AuthenticatedUser' guardado em um LRU pelo token cru. As
+    requisições seguintes com o mesmo token só consultam o LRU e a blacklist.
+
+    A blacklist continua consultada em todo acerto: com vários workers, o logout feito em
+    outro processo só chega a este pela blacklist compartilhada. O logout deste processo
+    também tira o token do LRU ('forget_token'). As entradas vencem junto com o 'exp' do
+    token. """
+
+
+class AuthenticatedUser:
+    """ Usuário autenticado da requisição atual.
+
+        Atributos:
+            user_id (int): Identidade do token ('sub').
+            jti (str): Identificador único do token (usado no logout).
+            expires_at (int | None): 'exp' do token, em segundos desde a época.
+            token (str): Token cru, chave do cache. """
+
+    __slots__ = ("user_id", "jti", "expires_at", "token")
+
+    def __init__(self, user_id, jti, expires_at, token):
+        self.user_id = user_id
+        self.jti = jti
+        self.expires_at = expires_at
+        self.token = token
+
+
+
+class TokenCache:
+    """ LRU de tokens verificados, com a validade de cada entrada igual ao 'exp' do token.
+
+        Parâmetros:
+            max_entries (int): Quantidade máxima de tokens; o menos usado sai primeiro. 0 desliga o cache. """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, token):
+        with self._lock:
+            user = self._entries.get(token)
+            if user is None:
+                self.misses += 1
+                return None
+            if user.expires_at is not None and user.expires_at <= time.time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+
+    def put(self, user):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[user.token] = user
+            self._entries.move_to_end(user.token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+def bearer_token(authorization):
+    # Token do cabeçalho 'Authorization: Bearer <token>', ou None
+    if authorization and authorization.startswith("Bearer "):
+        return authorization[7:]
+    return None
+
+
+def authenticate():
+    """ Autentica a requisição atual e guarda o usuário em 'g.current_user'.
+
+        Retorna:
+            AuthenticatedUser: O usuário do token.
+
+        Levanta:
+            As exceções do flask_jwt_extended (token ausente, inválido, expirado ou revogado),
+            tratadas pelos handlers do 'JWTManager' como no 'jwt_required'. """
+
+    cache = get_token_cache()
+    token = bearer_token(request.headers.get("Authorization"))
+    user = cache.get(token) if token else None
+
+    if user is not None and user.jti in get_blacklist():
+        # Revogado em outro processo: a verificação completa responde como o 'jwt_required'
+        cache.discard(token)
+        user = None
+
+    if user is None:
+        verify_jwt_in_request()
+        claims = get_jwt()
+        user = AuthenticatedUser(int(claims["sub"]), claims["jti"], claims.get("exp"), token)
+        if token:
+            cache.put(user)
+
+    g.current_user = user
+    return user
+
+
+def login_required(function):
+    """ Decorador dos métodos de recurso que exigem um token de acesso (no lugar de 'jwt_required()'). """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        authenticate()
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def current_user():
+    """ Retorna o 'AuthenticatedUser' da requisição (dentro de um método com 'login_required'). """
+
+    return g.current_user
+
+
+def forget_token(token):
+    """ Tira o token do cache deste processo (logout). """
+
+    get_token_cache().discard(token)
+
+
+def init_auth(app):
+    """ Cria o cache de tokens verificados e o registra em 'app.extensions'.
+
+        Config:
+            JWT_CACHE_MAX_ENTRIES (int): Tokens guardados. Padrão é 4096; 0 desliga o cache. """
+
+    cache = TokenCache(app.config.get("JWT_CACHE_MAX_ENTRIES", 4096))
+    app.extensions["token_cache"] = cache
+    return cache
+
+
+def get_token_cache():
+    """ Retorna o cache de tokens da aplicação atual. """
+
+    return current_app.extensions["token_cache"]
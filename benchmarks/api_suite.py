@@ -0,0 +1,386 @@
+""" Suíte de carga da API: vazão e latências p50/p99 por endpoint, com resultado em JSON.
+
+    Semeia um banco sintético (usuários, itens com descrições e datas variadas e um
+    histórico de empréstimos/devoluções) e mede cada endpoint de duas formas:
+
+    - 'client': cliente de teste do Flask, no mesmo processo, uma requisição por vez.
+      Mede o custo da aplicação sem rede nem servidor.
+    - 'server': servidor local de verdade ('flask run --with-threads' ou, com
+      '--server asgi', 'uvicorn asgi:app') com '--concurrency' requisições simultâneas
+      de um cliente assíncrono. Mede vazão e latência sob concorrência.
+
+    Endpoints: '/items' sem filtro e com cada filtro (description, is_available, owner_id,
+    date_from, date, q, sort=desc), '/items/<id>', '/users/<id>', '/stats', '/transactions'
+    (primeira página e página profunda por cursor e por offset), '/loans' e '/devolution'
+    (em pares, cada um sobre um item disponível) e '/login'.
+
+    O JSON ('--output') traz o commit, a escala e, por alvo e endpoint, requisições, erros,
+    vazão e latências; '--compare BASE NOVO' compara dois resultados.
+
+    Uso:
+        python benchmarks/api_suite.py [--target client|server|both] [--users 200] [--items 20000]
+                                       [--transactions 50000] [--requests 300] [--output result.json]
+        python benchmarks/api_suite.py --compare antes.json depois.json """
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import ROOT, disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from date import Time  # noqa: E402
+from models.stats_models import rebuild_stats  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+WORDS = ["livro", "caderno", "caneta", "mesa", "cadeira", "monitor", "teclado", "mouse", "cabo", "projetor",
+         "azul", "verde", "preto", "novo", "usado", "grande", "pequeno", "Café", "ferramenta", "furadeira"]
+PASSWORD = "bench-password"
+DAY = 86400
+
+
+def seed(client, options, rng):
+    """ Semeia o banco e devolve o contexto usado para montar as requisições. """
+
+    # Contas com senha válida (login, empréstimos); o resto dos usuários entra direto no banco
+    accounts = ["bench{}".format(number) for number in range(options.accounts)]
+    for login in accounts:
+        client.post("/signup", json={"login": login, "username": login, "password": PASSWORD})
+    first_user = len(accounts) + 1
+
+    now = Time.epoch()
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO users (user_id, username, login, password) VALUES (?, ?, ?, ?)",
+                       [(user_id, "user", "user{}".format(user_id), "!") for user_id in range(first_user, first_user + options.users)])
+
+    items = []
+    for item_id in range(1, options.items + 1):
+        created_at = now - rng.randrange(365 * DAY)
+        description = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        items.append((item_id, description, True, first_user + rng.randrange(options.users), created_at, Time.format_epoch(created_at)))
+    cursor.executemany("INSERT INTO items (item_id, description, is_available, owner_id, created_at, date) VALUES (?, ?, ?, ?, ?, ?)", items)
+
+    # Histórico em pares empréstimo/devolução: os itens terminam disponíveis, com o dono
+    transactions = []
+    for number in range(options.transactions // 2):
+        item_id, _, _, owner_id, _, _ = items[rng.randrange(len(items))]
+        borrower = first_user + rng.randrange(options.users)
+        created_at = now - (options.transactions - 2 * number) * 60
+        transactions.append((item_id, owner_id, borrower, False, created_at, Time.format_epoch(created_at)))
+        transactions.append((item_id, borrower, owner_id, True, created_at + 30, Time.format_epoch(created_at + 30)))
+    cursor.executemany(
+        "INSERT INTO transactions (item_id, from_user_id, to_user_id, is_available, created_at, date) VALUES (?, ?, ?, ?, ?, ?)",
+        transactions)
+    connection.commit()
+    connection.close()
+
+    with data.engine.begin() as connection:
+        rebuild_stats(connection)
+
+    deep = int(len(transactions) * 0.9)
+    return {
+        "accounts": accounts,
+        "users": (first_user, first_user + options.users - 1),
+        "items": options.items,
+        "deep_cursor": encode_cursor(deep),
+        "deep_offset": deep,
+        "last_month": Time.format_epoch(now - 30 * DAY)[:10],
+        "one_day": Time.format_epoch(now - 100 * DAY)[:10],
+    }
+
+
+def read_endpoints(context):
+    """ (nome, função rng -> caminho) das leituras medidas. """
+
+    first, last = context["users"]
+    return [
+        ("GET /items", lambda rng: "/items?limit=50"),
+        ("GET /items?description", lambda rng: "/items?description={}&limit=50".format(rng.choice(WORDS))),
+        ("GET /items?is_available", lambda rng: "/items?is_available=true&limit=50"),
+        ("GET /items?owner_id", lambda rng: "/items?owner_id={}&limit=50".format(rng.randint(first, last))),
+        ("GET /items?date_from", lambda rng: "/items?date_from={}&limit=50".format(context["last_month"])),
+        ("GET /items?date", lambda rng: "/items?date={}&limit=50".format(context["one_day"])),
+        ("GET /items?q", lambda rng: "/items?q={}&limit=50".format(rng.choice(WORDS)[:4])),
+        ("GET /items?sort=desc", lambda rng: "/items?sort=desc&limit=50"),
+        ("GET /items/<id>", lambda rng: "/items/{}".format(rng.randint(1, context["items"]))),
+        ("GET /users/<id>", lambda rng: "/users/{}".format(rng.randint(first, last))),
+        ("GET /stats", lambda rng: "/stats"),
+        ("GET /transactions", lambda rng: "/transactions?limit=50"),
+        ("GET /transactions (cursor profundo)", lambda rng: "/transactions?limit=50&cursor=" + context["deep_cursor"]),
+        ("GET /transactions (offset profundo)", lambda rng: "/transactions?limit=50&offset={}".format(context["deep_offset"])),
+    ]
+
+
+def summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def run_client(app, context, options, rng):
+    """ Mede cada endpoint pelo cliente de teste, uma requisição por vez. """
+
+    client = app.test_client()
+    results = {}
+
+    def timed(name, requests, call):
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for index in range(requests):
+            began = time.perf_counter()
+            errors += not call(index)
+            latencies.append(time.perf_counter() - began)
+        results[name] = summary(latencies, errors, time.perf_counter() - start)
+
+    for name, path in read_endpoints(context):
+        client.get(path(rng))
+        timed(name, options.requests, lambda index: client.get(path(rng)).status_code == 200)
+
+    headers = {}
+    for login in context["accounts"]:
+        token = client.post("/login", json={"login": login, "password": PASSWORD}).json["token_accessed"]
+        headers[login] = {"Authorization": "Bearer " + token}
+
+    # Cada conta empresta e devolve itens de outros donos; o item volta disponível a cada par
+    def loan(index):
+        return client.post("/loans", json={"item_id": index + 1}, headers=headers[context["accounts"][index % len(headers)]]).status_code == 201
+
+    def devolution(index):
+        return client.post("/devolution", json={"item_id": index + 1}, headers=headers[context["accounts"][index % len(headers)]]).status_code == 201
+
+    requests = min(options.requests, context["items"])
+    timed("POST /loans", requests, loan)
+    timed("POST /devolution", requests, devolution)
+    timed("POST /login", options.login_requests, lambda index: client.post(
+        "/login", json={"login": context["accounts"][index % len(headers)], "password": PASSWORD}).status_code == 200)
+    return results
+
+
+async def http(port, method, path, body=None, headers=None):
+    # HTTP/1.1 mínimo, uma conexão por requisição: devolve (status, corpo)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    lines = ["{} {} HTTP/1.1".format(method, path), "Host: localhost", "Connection: close",
+             "Content-Length: {}".format(len(payload))]
+    if body is not None:
+        lines.append("Content-Type: application/json")
+    lines.extend("{}: {}".format(key, value) for key, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), content
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await http(port, "GET", "/stats")
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load(concurrency, requests, call):
+    """ Dispara 'requests' chamadas com 'concurrency' em paralelo; 'call(index)' devolve True se deu certo. """
+
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            began = time.perf_counter()
+            try:
+                ok = await call(index)
+            except OSError:
+                ok = False
+            latencies.append(time.perf_counter() - began)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summary(latencies, errors, time.perf_counter() - start)
+
+
+async def run_server(port, context, options, rng):
+    """ Mede cada endpoint contra o servidor local, com 'options.concurrency' requisições simultâneas. """
+
+    await wait_ready(port)
+    results = {}
+
+    for name, path in read_endpoints(context):
+        async def read(index, path=path):
+            return (await http(port, "GET", path(rng)))[0] == 200
+        results[name] = await load(options.concurrency, options.requests, read)
+
+    headers = {}
+    for login in context["accounts"]:
+        _, content = await http(port, "POST", "/login", {"login": login, "password": PASSWORD})
+        headers[login] = {"Authorization": "Bearer " + json.loads(content)["token_accessed"]}
+
+    # Um item por requisição, então empréstimos simultâneos não disputam o mesmo item
+    async def loan(index):
+        account = context["accounts"][index % len(headers)]
+        return (await http(port, "POST", "/loans", {"item_id": index + 1}, headers[account]))[0] == 201
+
+    async def devolution(index):
+        account = context["accounts"][index % len(headers)]
+        return (await http(port, "POST", "/devolution", {"item_id": index + 1}, headers[account]))[0] == 201
+
+    async def login(index):
+        account = context["accounts"][index % len(headers)]
+        return (await http(port, "POST", "/login", {"login": account, "password": PASSWORD}))[0] == 200
+
+    requests = min(options.requests, context["items"])
+    results["POST /loans"] = await load(options.concurrency, requests, loan)
+    results["POST /devolution"] = await load(options.concurrency, requests, devolution)
+    results["POST /login"] = await load(options.concurrency, options.login_requests, login)
+    return results
+
+
+def server_command(options):
+    if options.server == "asgi":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(options.port), "--log-level", "warning"]
+    return [sys.executable, "-m", "flask", "--app", "app", "run", "--with-threads", "--port", str(options.port)]
+
+
+def commit():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, dirty
+
+
+def print_results(target, results):
+    print("\n[{}]".format(target))
+    for name, result in results.items():
+        print("{:<40} {:>9.1f} req/s   p50 {:>8.2f} ms   p99 {:>8.2f} ms   errors {}".format(
+            name, result["throughput"], result["p50_ms"], result["p99_ms"], result["errors"]))
+
+
+def compare(base_path, new_path):
+    """ Imprime, por alvo e endpoint, a variação de vazão e de p50/p99 entre dois resultados. """
+
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+
+    print("base: {} ({})   novo: {} ({})".format(
+        base["meta"]["commit"], base["meta"]["timestamp"], new["meta"]["commit"], new["meta"]["timestamp"]))
+
+    def change(before, after):
+        return "{:+7.1f}%".format((after - before) / before * 100) if before else "      -"
+
+    for target, results in new["results"].items():
+        print("\n[{}]".format(target))
+        for name, result in results.items():
+            before = base["results"].get(target, {}).get(name)
+            if before is None:
+                print("{:<40} (novo)".format(name))
+                continue
+            print("{:<40} req/s {}   p50 {}   p99 {}".format(
+                name, change(before["throughput"], result["throughput"]),
+                change(before["p50_ms"], result["p50_ms"]), change(before["p99_ms"], result["p99_ms"])))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=("client", "server", "both"), default="both")
+    parser.add_argument("--server", choices=("sync", "asgi"), default="sync")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--accounts", type=int, default=8)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NOVO"))
+    options = parser.parse_args()
+
+    if options.compare:
+        compare(*options.compare)
+        return
+
+    rng = random.Random(options.seed)
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    uri = "sqlite:///" + database
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+
+    with app.app_context():
+        start = time.perf_counter()
+        context = seed(app.test_client(), options, rng)
+        print("seed: {} usuários, {} itens, {} transações em {:.1f} s".format(
+            options.users + options.accounts, options.items, options.transactions, time.perf_counter() - start))
+
+    # Cada alvo parte de uma cópia do banco semeado, com todos os itens disponíveis
+    snapshot = database + ".seed"
+    with sqlite3.connect(database) as source, sqlite3.connect(snapshot) as target:
+        source.backup(target)
+
+    revision, dirty = commit()
+    output = {
+        "meta": {
+            "commit": revision, "dirty": dirty, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "server": options.server,
+            "scale": {"users": options.users + options.accounts, "items": options.items, "transactions": options.transactions},
+            "requests": options.requests, "concurrency": options.concurrency,
+        },
+        "results": {},
+    }
+
+    if options.target in ("client", "both"):
+        with app.app_context():
+            output["results"]["client"] = run_client(app, context, options, rng)
+        print_results("client", output["results"]["client"])
+
+    if options.target in ("server", "both"):
+        with app.app_context():
+            data.engine.dispose()
+        with sqlite3.connect(snapshot) as source, sqlite3.connect(database) as target:
+            source.backup(target)
+
+        env = dict(os.environ, DATABASE_URL=uri, FLASK_SCHEMA_SETUP_ON_STARTUP="false", FLASK_METRICS_ENABLED="false")
+        process = subprocess.Popen(server_command(options), cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            output["results"]["server"] = asyncio.run(run_server(options.port, context, options, rng))
+        finally:
+            process.terminate()
+            process.wait()
+        print_results("server ({})".format(options.server), output["results"]["server"])
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(output, file, indent=2)
+        print("\nresultado: {}".format(options.output))
+
+
+if __name__ == "__main__":
+    main()
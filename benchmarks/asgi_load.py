@@ -0,0 +1,127 @@
+""" Teste de carga: servidor síncrono (Flask com threads) contra o modo ASGI (uvicorn).
+
+    Sobe os dois servidores sobre o mesmo banco semeado e dispara muitas leituras
+    simultâneas em 'GET /items' e '/transactions', medindo requisições por segundo e
+    latências p50/p99. O cliente é assíncrono (asyncio), para que a concorrência do lado
+    do cliente não limite a medição.
+
+    Requer: uvicorn, a2wsgi, aiosqlite.
+
+    Uso:
+        python benchmarks/asgi_load.py [--rows 5000] [--requests 4000] [--concurrency 200] """
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import ROOT, disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+PATHS = ["/items?limit=50", "/items?is_available=true&limit=20", "/transactions?limit=50", "/items/1"]
+
+
+def seed(uri, rows):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True})
+    with app.app_context():
+        connection = data.engine.raw_connection()
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO items (item_id, description, is_available, date, owner_id) VALUES (?, ?, ?, ?, ?)",
+            [(i, "item {}".format(i % 100), i % 2, "07/06/2025 14:30:25", i % 50) for i in range(1, rows + 1)])
+        cursor.executemany(
+            "INSERT INTO transactions (transaction_id, item_id, from_user_id, to_user_id, is_available, date) VALUES (?, ?, ?, ?, ?, ?)",
+            [(i, i, i % 50, (i + 1) % 50, 0, "07/06/2025 14:30:25") for i in range(1, rows + 1)])
+        connection.commit()
+        connection.close()
+
+
+def start_server(command, uri):
+    env = dict(os.environ, DATABASE_URL=uri, FLASK_SCHEMA_SETUP_ON_STARTUP="false")
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write("GET {} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".format(path).encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await get(port, "/items/1")
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def load(port, requests, concurrency):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                status = await get(port, PATHS[index % len(PATHS)])
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--sync-port", type=int, default=8765)
+    parser.add_argument("--asgi-port", type=int, default=8766)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed(uri, options.rows)
+
+    servers = {
+        "sync (flask run --with-threads)": (options.sync_port, [
+            sys.executable, "-m", "flask", "--app", "app", "run", "--with-threads", "--port", str(options.sync_port)]),
+        "asgi (uvicorn asgi:app)": (options.asgi_port, [
+            sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(options.asgi_port), "--log-level", "warning"]),
+    }
+
+    for label, (port, command) in servers.items():
+        process = start_server(command, uri)
+        try:
+            asyncio.run(wait_ready(port))
+            rate, p50, p99, errors = asyncio.run(load(port, options.requests, options.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+
+        print("{:<34} {:>9.1f} req/s   p50 {:>7.1f} ms   p99 {:>7.1f} ms   errors {}".format(
+            label, rate, p50 * 1000, p99 * 1000, errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+""" Benchmark de carga de itens: 'POST /items/<id>' um a um contra 'POST /items/bulk'.
+
+    Uso:
+        python benchmarks/bulk_items.py [--items 5000] [--chunk-size 500] """
+
+import argparse
+import os
+import tempfile
+import time
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+
+
+def login(client, name):
+    client.post("/signup", json={"login": name, "username": name, "password": "bench"})
+    token = client.post("/login", json={"login": name, "password": "bench"}).json["token_accessed"]
+    return {"Authorization": "Bearer " + token}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True})
+    client = app.test_client()
+    headers = login(client, "bench")
+
+    start = time.perf_counter()
+    for item_id in range(1, options.items + 1):
+        client.post("/items/{}".format(item_id), json={"description": "item", "is_available": True}, headers=headers)
+    single = time.perf_counter() - start
+    print("{:<30} {:>10.1f} items/s".format("POST /items/<id>", options.items / single))
+
+    rows = [{"item_id": item_id, "description": "item", "is_available": True}
+            for item_id in range(options.items + 1, 2 * options.items + 1)]
+
+    start = time.perf_counter()
+    response = client.post("/items/bulk?chunk_size={}".format(options.chunk_size), json=rows, headers=headers)
+    bulk = time.perf_counter() - start
+    print("{:<30} {:>10.1f} items/s ({} created)".format("POST /items/bulk", options.items / bulk, response.json["created"]))
+
+
+if __name__ == "__main__":
+    main()
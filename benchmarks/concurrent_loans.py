@@ -0,0 +1,77 @@
+""" Teste de estresse de concorrência em '/loans' e '/devolution'.
+
+    Dispara centenas de empréstimos simultâneos do mesmo item, vindos de usuários
+    diferentes, e confere que exatamente um é aceito; depois repete com devoluções
+    simultâneas do usuário que ficou com o item. Sai com código 1 se a contagem falhar.
+
+    Uso:
+        python benchmarks/concurrent_loans.py [--requests 300] [--users 30] [--rounds 5] """
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+
+
+def login(client, name):
+    client.post("/signup", json={"login": name, "username": name, "password": "bench"})
+    token = client.post("/login", json={"login": name, "password": "bench"}).json["token_accessed"]
+    return {"Authorization": "Bearer " + token}
+
+
+def fire(app, endpoint, item_id, headers, requests):
+    def call(index):
+        response = app.test_client().post(endpoint, json={"item_id": item_id}, headers=headers[index % len(headers)])
+        return response.status_code, response.json.get("to_user")
+
+    with ThreadPoolExecutor(max_workers=min(requests, 64)) as pool:
+        return list(pool.map(call, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=5)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True,
+                      "DATABASE_POOL_SIZE": 16, "DATABASE_MAX_OVERFLOW": 48})
+    client = app.test_client()
+
+    owner = login(client, "owner")
+    borrowers = [login(client, "user{}".format(index)) for index in range(options.users)]
+    client.post("/items/1", json={"description": "item", "is_available": True}, headers=owner)
+
+    failed = False
+
+    for round_number in range(1, options.rounds + 1):
+        start = time.perf_counter()
+        results = fire(app, "/loans", 1, borrowers, options.requests)
+        elapsed = time.perf_counter() - start
+        statuses = Counter(status for status, _ in results)
+        print("round {} /loans      {} in {:.2f}s".format(round_number, dict(statuses), elapsed))
+        failed = failed or statuses[201] != 1
+
+        holder_id = next(to_user for status, to_user in results if status == 201)
+        holder = borrowers[holder_id - 2] # ids: 1 = owner, 2.. = borrowers na ordem de criação
+
+        results = fire(app, "/devolution", 1, [holder], options.requests)
+        statuses = Counter(status for status, _ in results)
+        print("round {} /devolution {}".format(round_number, dict(statuses)))
+        failed = failed or statuses[201] != 1
+
+    print("FAILED" if failed else "OK: exactly one success per round")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
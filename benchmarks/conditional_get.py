@@ -0,0 +1,83 @@
+""" Listagens com compressão negociada e com GET condicional (ETag da versão da coleção).
+
+    Semeia 'items' e 'transactions' e mede, pelo cliente de teste do Flask, o tamanho do
+    corpo e o p50 de uma página grande de cada listagem em quatro variantes: sem
+    compressão, gzip, br (só com o pacote 'brotli' instalado) e revalidação com
+    'If-None-Match' (304, sem consulta nem serialização).
+
+    Uso:
+        python benchmarks/conditional_get.py [--rows 50000] [--limit 1000] [--requests 300] """
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from compression import brotli  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+USERS = 1000
+WORDS = ("livro", "caneta", "cadeira", "mesa", "notebook", "projetor", "cabo", "azul", "verde", "usado", "novo")
+
+
+def seed(rows, rng):
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO users (user_id, username, login, password) VALUES (?, ?, ?, ?)",
+                       [(user_id, "user", "user{}".format(user_id), "x") for user_id in range(1, USERS + 1)])
+    cursor.executemany("INSERT INTO items (item_id, description, is_available, owner_id, date) VALUES (?, ?, ?, ?, ?)",
+                       [(item_id, " ".join(rng.sample(WORDS, 3)), item_id % 2, rng.randint(1, USERS), "17/10/2026 10:00:00")
+                        for item_id in range(1, rows + 1)])
+    cursor.executemany("INSERT INTO transactions (item_id, from_user_id, to_user_id, is_available, date) VALUES (?, ?, ?, ?, ?)",
+                       [(rng.randint(1, rows), rng.randint(1, USERS), rng.randint(1, USERS), number % 2, "17/10/2026 10:00:00")
+                        for number in range(rows)])
+    connection.commit()
+    connection.close()
+
+
+def measure(client, path, headers, requests, status):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == status, response.status_code
+    latencies.sort()
+    return len(response.data), latencies[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+    client = app.test_client()
+    with app.app_context():
+        seed(options.rows, random.Random(7))
+
+    print("{:<38} {:>12} {:>10}".format("listagem", "bytes", "p50"))
+    for collection in ("items", "transactions"):
+        path = "/{}?limit={}".format(collection, options.limit)
+        etag = client.get(path).headers["ETag"]
+
+        variants = [("sem compressão", {}, 200), ("gzip", {"Accept-Encoding": "gzip"}, 200)]
+        if brotli is not None:
+            variants.append(("br", {"Accept-Encoding": "br, gzip"}, 200))
+        variants.append(("If-None-Match (304)", {"If-None-Match": etag, "Accept-Encoding": "br, gzip"}, 304))
+
+        for label, headers, status in variants:
+            size, latency = measure(client, path, headers, options.requests, status)
+            print("{:<38} {:>12} {:>7.2f} ms".format("{} {}".format(path.split("?")[0], label), size, latency * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+""" Preparação comum dos benchmarks, importada antes de qualquer módulo do projeto.
+
+    Ao ser importado, põe a raiz do projeto no 'sys.path' e desliga a criação do banco
+    padrão na importação do 'app' ('FLASK_SCHEMA_SETUP_ON_STARTUP'): cada benchmark cria
+    o seu próprio banco com 'create_app'.
+
+    Uso (no topo do benchmark, antes de importar o 'app'):
+        from harness import disable_admission
+        disable_admission() """
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+os.environ["FLASK_SCHEMA_SETUP_ON_STARTUP"] = "false"
+
+
+def disable_admission():
+    """ Desliga o limite de taxa e o de concorrência, para medir os endpoints e não o controle de admissão.
+
+        As variáveis de ambiente valem para o 'app' importado depois e para os servidores
+        que o benchmark inicia em subprocessos. """
+
+    os.environ["FLASK_RATE_LIMIT_ENABLED"] = "false"
+    os.environ["FLASK_MAX_CONCURRENT_REQUESTS"] = "0"
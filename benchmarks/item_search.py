@@ -0,0 +1,108 @@
+""" Latência da busca textual ('GET /items?q=') em um catálogo grande (padrão: 1M de itens).
+
+    Semeia o banco com descrições de 2 a 5 palavras sorteadas de um vocabulário com
+    frequências desiguais (palavras comuns e raras), passando pelos triggers do índice
+    FTS5, e mede p50/p99 de buscas pela aplicação (cliente de teste do Flask):
+    palavra comum, palavra rara, prefixos de 2 e 3 letras e duas palavras, ordenadas
+    por relevância (padrão) e por 'item_id' ('sort=asc'). Para comparação, mede também
+    um LIKE '%palavra%' direto no SQLite, que é o que sobra sem o índice.
+
+    Uso:
+        python benchmarks/item_search.py [--rows 1000000] [--requests 200] """
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+SYLLABLES = ["ca", "de", "li", "vro", "me", "sa", "pa", "to", "ra", "ne", "lu", "mi", "so", "te", "ba", "co", "fe", "gi", "ju", "xo"]
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+def seed(rows, words, rng, batch_size=20000):
+    # Frequência de Zipf: as primeiras palavras aparecem muito, as últimas quase nunca
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    for start in range(1, rows + 1, batch_size):
+        batch = []
+        for item_id in range(start, min(start + batch_size, rows + 1)):
+            description = " ".join(rng.choices(words, weights, k=rng.randint(2, 5)))[:40]
+            batch.append((item_id, description, item_id % 2, item_id % 1000))
+        cursor.executemany("INSERT INTO items (item_id, description, is_available, owner_id) VALUES (?, ?, ?, ?)", batch)
+    connection.commit()
+    connection.close()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def measure(client, label, path, requests):
+    latencies = []
+    found = client.get(path).json["items"]
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    p50, p99 = percentiles(latencies)
+    print("{:<44} {:>8.2f} ms p50 {:>8.2f} ms p99   {:>3} na página".format(label, p50 * 1000, p99 * 1000, len(found)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    options = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    words = vocabulary(2000, rng)
+    common, rare = words[0], words[-1]
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+    client = app.test_client()
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed(options.rows, words, rng)
+        print("seed: {} itens em {:.1f} s (com os triggers do FTS5)".format(options.rows, time.perf_counter() - start))
+
+        connection = data.engine.raw_connection()
+        for label, word in (("LIKE palavra comum (sem índice)", common), ("LIKE palavra rara (sem índice)", rare)):
+            start = time.perf_counter()
+            connection.execute("SELECT item_id FROM items WHERE description LIKE ? ORDER BY item_id LIMIT 51",
+                               ("%" + word + "%",)).fetchall()
+            print("{:<44} {:>8.2f} ms".format(label, (time.perf_counter() - start) * 1000))
+        connection.close()
+
+    cases = [
+        ("q palavra comum ('{}')".format(common), "/items?q=" + common),
+        ("q palavra rara ('{}')".format(rare), "/items?q=" + rare),
+        ("q prefixo 2 letras ('{}')".format(rare[:2]), "/items?q=" + rare[:2]),
+        ("q prefixo 3 letras ('{}')".format(rare[:3]), "/items?q=" + rare[:3]),
+        ("q duas palavras", "/items?q={}+{}".format(common, words[len(words) // 2])),
+    ]
+    for label, path in cases:
+        measure(client, label + " relevância", path, options.requests)
+        measure(client, label + " sort=asc", path + "&sort=asc", options.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+""" Custo da autenticação por requisição: 'jwt_required()' contra 'login_required' (cache de tokens).
+
+    Mede de dois jeitos, com o mesmo token:
+    - Só a verificação, em um contexto de requisição: 'verify_jwt_in_request' seguido de
+      'int(get_jwt_identity())' (o caminho antigo dos handlers) contra 'authenticate()' com
+      o token já no cache.
+    - A requisição inteira pelo cliente de teste do Flask, em três rotas que só devolvem a
+      identidade: sem autenticação (base), com 'jwt_required()' e com 'login_required'. A
+      diferença para a base é o custo da autenticação.
+
+    Uso:
+        python benchmarks/jwt_auth.py [--calls 20000] [--requests 5000] """
+
+import argparse
+import os
+import tempfile
+import time
+
+from harness import disable_admission
+disable_admission()
+
+from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request  # noqa: E402
+from app import create_app  # noqa: E402
+from auth import authenticate, current_user, login_required  # noqa: E402
+
+
+def per_call(calls, function):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+def per_request(client, path, headers, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+    latencies.sort()
+    return latencies[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+
+    @app.route("/bench/none")
+    def no_auth():
+        return {"user_id": 1}
+
+    @app.route("/bench/jwt")
+    @jwt_required()
+    def with_jwt_required():
+        return {"user_id": int(get_jwt_identity())}
+
+    @app.route("/bench/cached")
+    @login_required
+    def with_login_required():
+        return {"user_id": current_user().user_id}
+
+    client = app.test_client()
+    client.post("/signup", json={"login": "bench", "username": "bench", "password": "bench"})
+    token = client.post("/login", json={"login": "bench", "password": "bench"}).json["token_accessed"]
+    headers = {"Authorization": "Bearer " + token}
+
+    def full_verification():
+        verify_jwt_in_request()
+        return int(get_jwt_identity())
+
+    with app.test_request_context(headers=headers):
+        authenticate()
+        verify = per_call(options.calls, full_verification)
+        cached = per_call(options.calls, authenticate)
+
+    print("verificação ({} chamadas)".format(options.calls))
+    print("{:<36} {:>8.1f} µs".format("jwt_required (decodifica e confere)", verify * 1e6))
+    print("{:<36} {:>8.1f} µs".format("login_required (token no cache)", cached * 1e6))
+
+    base = per_request(client, "/bench/none", headers, options.requests)
+    print("requisição inteira, p50 ({} requisições)".format(options.requests))
+    print("{:<36} {:>8.1f} µs".format("sem autenticação", base * 1e6))
+    for label, path in (("jwt_required", "/bench/jwt"), ("login_required", "/bench/cached")):
+        latency = per_request(client, path, headers, options.requests)
+        print("{:<36} {:>8.1f} µs  (+{:.1f} µs de autenticação)".format(label, latency * 1e6, (latency - base) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
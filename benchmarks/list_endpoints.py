@@ -0,0 +1,84 @@
+""" Benchmark das listagens '/items' e '/transactions'.
+
+    Compara o caminho antigo (um 'sqlite3.connect' por requisição) com o pool
+    compartilhado do engine 'data', medindo requisições por segundo.
+
+    Uso:
+        python benchmarks/list_endpoints.py [--rows 5000] [--requests 2000] """
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+
+def seed(rows):
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.executemany(
+        "INSERT INTO items (item_id, description, is_available, date, owner_id) VALUES (?, ?, ?, ?, ?)",
+        [(i, "item {}".format(i % 100), i % 2, "07/06/2025 14:30:25", i % 50) for i in range(1, rows + 1)])
+    cursor.executemany(
+        "INSERT INTO transactions (transaction_id, item_id, from_user_id, to_user_id, is_available, date) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i, i, i % 50, (i + 1) % 50, 0, "07/06/2025 14:30:25") for i in range(1, rows + 1)])
+    connection.commit()
+    connection.close()
+
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+
+def legacy_list(db_path, table):
+    # Reproduz o caminho anterior: abre, consulta e fecha a conexão a cada chamada
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    rows = cursor.execute("SELECT * FROM {} LIMIT ? OFFSET ?".format(table), (50, 0)).fetchall()
+    connection.close()
+    return rows
+
+
+def measure(label, calls, function):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:>10.1f} req/s".format(label, calls / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    options = parser.parse_args()
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + DB_PATH, "SCHEMA_SETUP_ON_STARTUP": True})
+
+    with app.app_context():
+        seed(options.rows)
+
+    client = app.test_client()
+
+    with app.app_context():
+        engine = data.engine
+
+    for table, endpoint in (("items", "/items"), ("transactions", "/transactions")):
+        measure("legacy sqlite3.connect {}".format(table), options.requests, lambda: legacy_list(DB_PATH, table))
+
+        def pooled():
+            with engine.connect() as connection:
+                connection.execute(text("SELECT * FROM {} LIMIT 50 OFFSET 0".format(table))).fetchall()
+
+        measure("pooled engine {}".format(table), options.requests, pooled)
+        measure("GET {}".format(endpoint), options.requests, lambda: client.get(endpoint))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+""" Benchmark de '/signup' e '/login' com diferentes custos de hash de senha.
+
+    Para cada configuração, cadastra e autentica usuários a partir de várias threads
+    (como um servidor com threads) e mede requisições por segundo. Mostra também
+    quantas requisições foram recusadas com 503 pelo limite da fila do pool.
+
+    Uso:
+        python benchmarks/password_hashing.py [--users 200] [--concurrency 32] """
+
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+
+SETTINGS = [
+    ("pbkdf2_sha256 100k", {"PASSWORD_HASH_ALGORITHM": "pbkdf2_sha256", "PASSWORD_PBKDF2_ITERATIONS": 100000}),
+    ("pbkdf2_sha256 600k", {"PASSWORD_HASH_ALGORITHM": "pbkdf2_sha256", "PASSWORD_PBKDF2_ITERATIONS": 600000}),
+    ("scrypt n=2^14", {"PASSWORD_HASH_ALGORITHM": "scrypt", "PASSWORD_SCRYPT_N": 2 ** 14}),
+    ("scrypt n=2^15", {"PASSWORD_HASH_ALGORITHM": "scrypt", "PASSWORD_SCRYPT_N": 2 ** 15}),
+]
+
+
+def run(app, endpoint, users, concurrency):
+    def call(index):
+        name = "user{}".format(index)
+        return app.test_client().post(endpoint, json={"login": name, "username": name, "password": "bench"}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = Counter(pool.map(call, range(users)))
+    return users / (time.perf_counter() - start), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    options = parser.parse_args()
+
+    print("CPUs: {}".format(os.cpu_count()))
+    for label, config in SETTINGS:
+        uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+        app = create_app(dict(config, SQLALCHEMY_DATABASE_URI=uri, SCHEMA_SETUP_ON_STARTUP=True,
+                              DATABASE_POOL_SIZE=options.concurrency))
+
+        for endpoint in ("/signup", "/login"):
+            rate, statuses = run(app, endpoint, options.users, options.concurrency)
+            print("{:<22} {:<8} {:>8.1f} req/s   {}".format(label, endpoint, rate, dict(statuses)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+""" Microbenchmark da leitura de argumentos + montagem da consulta de '/transactions'.
+
+    Compara, por chamada, o caminho anterior ('reqparse' + SQL concatenado a cada
+    requisição) com o atual ('ArgumentSchema' + 'ListQuery', SQL memorizado por
+    combinação de filtros). Não executa a consulta.
+
+    Uso:
+        python benchmarks/query_building.py [--calls 20000] """
+
+import argparse
+import time
+
+import harness  # noqa: F401 (raiz do projeto no 'sys.path' e ambiente dos benchmarks)
+
+from flask import request  # noqa: E402
+from flask_restful import reqparse  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from app import create_app  # noqa: E402
+from bool_format import str_to_bool  # noqa: E402
+from export import format_name  # noqa: E402
+from pagination import sort_order  # noqa: E402
+from resourcers.transaction_resourcers import arguments, normalize_arguments, TRANSACTION_QUERY  # noqa: E402
+
+QUERY_STRINGS = [
+    "",
+    "item_id=3&limit=20",
+    "from_user_id=1&to_user_id=2&is_available=true&sort=desc",
+    "transaction_id=4&item_id=3&from_user_id=1&to_user_id=2&is_available=0&limit=10&offset=30",
+]
+
+legacy_arguments = reqparse.RequestParser()
+for name, kind in [("transaction_id", int), ("item_id", int), ("from_user_id", int), ("to_user_id", int),
+                   ("is_available", str_to_bool), ("date", str), ("limit", int), ("offset", int),
+                   ("cursor", str), ("sort", sort_order), ("format", format_name)]:
+    legacy_arguments.add_argument(name, type=kind, location="args")
+
+
+def legacy_path():
+    # Reproduz o caminho anterior: reqparse e SQL montado por concatenação a cada chamada
+    args = legacy_arguments.parse_args()
+    parameters = normalize_arguments(**{key: value for key, value in args.items() if value is not None})
+    query = "SELECT * FROM transactions"
+    filters = []
+    values = {}
+    for name in ("transaction_id", "item_id", "from_user_id", "to_user_id", "is_available"):
+        if name in parameters:
+            filters.append("{0} = :{0}".format(name))
+            values[name] = int(parameters[name])
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY transaction_id {} LIMIT :limit OFFSET :offset".format(parameters["sort"].upper())
+    values["limit"] = parameters["limit"] + 1
+    values["offset"] = parameters["offset"]
+    return text(query), values
+
+
+def current_path():
+    parameters = normalize_arguments(**arguments.parse(request.args))
+    return TRANSACTION_QUERY.build(parameters)
+
+
+def measure(app, label, function, calls):
+    total = 0.0
+    for query_string in QUERY_STRINGS:
+        with app.test_request_context("/transactions?" + query_string):
+            start = time.perf_counter()
+            for _ in range(calls):
+                function()
+            total += time.perf_counter() - start
+    print("{:<36} {:>8.2f} us/call".format(label, total / (calls * len(QUERY_STRINGS)) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    options = parser.parse_args()
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "METRICS_ENABLED": False})
+    measure(app, "reqparse + string building", legacy_path, options.calls)
+    measure(app, "ArgumentSchema + ListQuery", current_path, options.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+""" Microbenchmark da serialização das respostas: objetos ORM + 'json' contra linhas + 'dumps'.
+
+    Para uma página de '/items' e para um único item ('GET /items/<id>'), compara o
+    caminho anterior (carregar 'ItemModel', chamar '.json()' e serializar com 'json.dumps')
+    com o atual (buscar só as colunas de 'ITEM_FIELDS', montar o dicionário com
+    'item_record' e serializar com 'serialization.dumps', orjson quando instalado).
+    Mede o tempo de CPU por resposta, incluindo a consulta, e a memória alocada
+    (pico do 'tracemalloc').
+
+    Uso:
+        python benchmarks/serialization.py [--rows 5000] [--page 50] [--calls 2000] """
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import harness  # noqa: F401 (raiz do projeto no 'sys.path' e ambiente dos benchmarks)
+
+from sqlalchemy import select  # noqa: E402
+from app import create_app  # noqa: E402
+from models.item_models import ItemModel  # noqa: E402
+from serialization import ITEM_FIELDS, dumps, item_record, orjson  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+
+def seed(rows):
+    connection = data.engine.raw_connection()
+    connection.cursor().executemany(
+        "INSERT INTO items (item_id, description, is_available, date, owner_id) VALUES (?, ?, ?, ?, ?)",
+        [(i, "item {}".format(i % 100), i % 2, "07/06/2025 14:30:25", i % 50) for i in range(1, rows + 1)])
+    connection.commit()
+    connection.close()
+
+
+def orm_page(page):
+    items = ItemModel.query.order_by(ItemModel.item_id).limit(page).all()
+    return json.dumps({"items": [item.json() for item in items]}).encode()
+
+
+def record_page(page):
+    columns = [getattr(ItemModel, name) for name in ITEM_FIELDS]
+    rows = data.session.execute(select(*columns).order_by(ItemModel.item_id).limit(page))
+    return dumps({"items": [item_record(row) for row in rows]})
+
+
+def orm_single(page):
+    return json.dumps(ItemModel.find_item(page).json()).encode()
+
+
+def record_single(page):
+    return dumps(ItemModel.find_record(page))
+
+
+def measure(label, function, page, calls):
+    function(page)
+    data.session.remove()
+
+    start = time.process_time()
+    for _ in range(calls):
+        function(page)
+        data.session.remove()
+    cpu = (time.process_time() - start) / calls
+
+    tracemalloc.start()
+    function(page)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    data.session.remove()
+
+    print("{:<34} {:>9.1f} us/response   {:>8.1f} KiB peak".format(label, cpu * 1e6, peak / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=2000)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+
+    with app.app_context():
+        seed(options.rows)
+        print("encoder: {}".format("orjson" if orjson is not None else "json (orjson não instalado)"))
+        measure("page  ORM + .json() + json", orm_page, options.page, options.calls)
+        measure("page  rows + item_record + dumps", record_page, options.page, options.calls)
+        measure("item  ORM + .json() + json", orm_single, 1, options.calls)
+        measure("item  row + item_record + dumps", record_single, 1, options.calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+""" Benchmark da inicialização e do custo por requisição da criação de schema.
+
+    Mede o tempo de 'create_app' (banco novo e banco existente) e compara a latência
+    de 'GET /items/<id>' com o antigo '@app.before_request data.create_all()' e sem ele.
+
+    Uso:
+        python benchmarks/startup.py [--requests 2000] """
+
+import argparse
+import os
+import tempfile
+import time
+
+import harness  # noqa: F401 (raiz do projeto no 'sys.path' e ambiente dos benchmarks)
+
+from app import create_app  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def per_request(app, requests):
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get("/items/1")
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    config = {"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True}
+
+    app, elapsed = timed(lambda: create_app(config))
+    print("{:<45} {:>10.2f} ms".format("create_app (banco novo)", elapsed * 1000))
+
+    _, elapsed = timed(lambda: create_app(config))
+    print("{:<45} {:>10.2f} ms".format("create_app (banco existente)", elapsed * 1000))
+
+    print("{:<45} {:>10.1f} us".format("GET /items/1 (schema na inicialização)", per_request(app, options.requests) * 1e6))
+
+    legacy = create_app(config)
+
+    @legacy.before_request
+    def create_data():
+        data.create_all()
+
+    print("{:<45} {:>10.1f} us".format("GET /items/1 (create_all por requisição)", per_request(legacy, options.requests) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+""" Listagens de '/transactions' com o histórico em uma tabela só e particionado por mês.
+
+    Semeia 'transactions' com linhas espalhadas pelos últimos meses (padrão: 2M em 24
+    meses) e mede p50/p99 de listagens pela aplicação (cliente de teste do Flask) duas
+    vezes: com tudo na tabela quente e depois de 'rotate_partitions' (só os 2 meses mais
+    recentes ficam nela). No fim arquiva os meses fora dos 12 mais recentes e mostra o
+    tamanho dos arquivos comprimidos e do banco.
+
+    Uso:
+        python benchmarks/transaction_partitions.py [--rows 2000000] [--months 24] [--requests 200] """
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from harness import disable_admission
+disable_admission()
+
+from app import create_app  # noqa: E402
+from partitions import archive_partitions, recent_months_start, rotate_partitions  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+USERS = 1000
+
+
+def seed(rows, start, now, rng, batch_size=50000):
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO users (user_id, username, login, password) VALUES (?, ?, ?, ?)",
+                       [(user_id, "user", "user{}".format(user_id), "x") for user_id in range(1, USERS + 1)])
+    step = (now - start) / rows
+    for first in range(0, rows, batch_size):
+        cursor.executemany(
+            "INSERT INTO transactions (item_id, from_user_id, to_user_id, is_available, created_at, date) VALUES (?, ?, ?, ?, ?, ?)",
+            [(rng.randint(1, 100000), rng.randint(1, USERS), rng.randint(1, USERS), number % 2, int(start + number * step), "")
+             for number in range(first, min(first + batch_size, rows))])
+    connection.commit()
+    connection.close()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def measure(client, path, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.json
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--requests", type=int, default=200)
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + path, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+    client = app.test_client()
+
+    now = int(datetime.now(timezone.utc).timestamp())
+    start = recent_months_start(options.months, now)
+    middle = datetime.fromtimestamp((start + now) // 2, timezone.utc).strftime("%Y-%m")
+    with app.app_context():
+        seed(options.rows, start, now, random.Random(7))
+
+    last = client.get("/transactions?sort=desc&limit=1").json["transactions"][0]["transaction_id"]
+    cases = [
+        ("um mês no meio ({})".format(middle), "/transactions?date_from={0}-01&date_to={0}-20".format(middle)),
+        ("um mês no meio, desc", "/transactions?date_from={0}-01&date_to={0}-20&sort=desc".format(middle)),
+        ("últimos 7 dias, desc", "/transactions?date_from={}&sort=desc".format(now - 7 * 86400)),
+        ("from_user_id, desc", "/transactions?from_user_id=7&sort=desc"),
+        ("transaction_id antigo", "/transactions?transaction_id={}".format(last // 10)),
+        ("página recente (desc)", "/transactions?sort=desc"),
+    ]
+
+    results = {}
+    for phase in ("uma tabela", "particionado"):
+        if phase == "particionado":
+            with app.app_context(), data.engine.begin() as connection:
+                begin = time.perf_counter()
+                moved = rotate_partitions(connection, hot_months=2)
+                print("rotate: {} meses, {} linhas em {:.1f} s".format(len(moved), sum(rows for _, rows in moved), time.perf_counter() - begin))
+        for label, case_path in cases:
+            results[label, phase] = measure(client, case_path, options.requests)
+
+    print("{:<32} {:>22} {:>22}".format("listagem", "uma tabela p50/p99", "particionado p50/p99"))
+    for label, _ in cases:
+        single, partitioned = results[label, "uma tabela"], results[label, "particionado"]
+        print("{:<32} {:>9.2f} /{:>8.2f} ms {:>9.2f} /{:>8.2f} ms".format(
+            label, single[0] * 1000, single[1] * 1000, partitioned[0] * 1000, partitioned[1] * 1000))
+
+    with app.app_context(), data.engine.begin() as connection:
+        archived = archive_partitions(connection, os.path.join(directory, "archive"), online_months=12)
+    with app.app_context(), data.engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+    archive_size = sum(os.path.getsize(archive) for _, archive in archived)
+    print("arquivados: {} meses, {:.1f} MiB comprimidos; banco com {:.1f} MiB".format(
+        len(archived), archive_size / 1048576, os.path.getsize(path) / 1048576))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+""" Benchmark da exclusão de um usuário com muitas transações ('DELETE /users/<id>').
+
+    Semeia um usuário com 100k transações (metade como quem empresta, metade como quem
+    recebe), itens de que é dono (alguns emprestados a outros) e itens de outros
+    emprestados a ele, e mede a requisição de exclusão pelo cliente de teste do Flask:
+    tempo, quantidade de comandos SQL, objetos ORM carregados e pico de memória
+    ('tracemalloc'). No fim confere os contadores de '/stats' contra o recálculo
+    completo ('compute_stats').
+
+    Uso:
+        python benchmarks/user_deletion.py [--transactions 100000] [--items 10000] """
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import harness  # noqa: F401 (raiz do projeto no 'sys.path' e ambiente dos benchmarks)
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from app import create_app  # noqa: E402
+from models.stats_models import compute_stats, rebuild_stats, stored_stats  # noqa: E402
+from sql_alchemy import data  # noqa: E402
+
+OTHER_USERS = 1000
+
+
+def seed(user_id, transactions, items):
+    connection = data.engine.raw_connection()
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO users (user_id, username, login, password) VALUES (?, ?, ?, ?)",
+                       [(other, "user", "user{}".format(other), "x") for other in range(user_id + 1, user_id + OTHER_USERS + 1)])
+
+    # Itens do usuário (um em cada dez emprestado a outro) e, em seguida, itens de outros com ele
+    rows = []
+    for item_id in range(1, items + 1):
+        holder = user_id + 1 + item_id % OTHER_USERS if item_id % 10 == 0 else None
+        rows.append((item_id, "item {}".format(item_id), holder is None, user_id, holder))
+    for item_id in range(items + 1, items + items // 10 + 1):
+        rows.append((item_id, "item {}".format(item_id), False, user_id + 1 + item_id % OTHER_USERS, user_id))
+    cursor.executemany("INSERT INTO items (item_id, description, is_available, owner_id, current_holder_id) VALUES (?, ?, ?, ?, ?)", rows)
+
+    cursor.executemany(
+        "INSERT INTO transactions (item_id, from_user_id, to_user_id, is_available) VALUES (?, ?, ?, ?)",
+        [(number % items + 1, user_id, user_id + 1 + number % OTHER_USERS, False) if number % 2 else
+         (number % items + 1, user_id + 1 + number % OTHER_USERS, user_id, True) for number in range(transactions)])
+    connection.commit()
+    connection.close()
+
+    with data.engine.begin() as connection:
+        rebuild_stats(connection)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--items", type=int, default=10000)
+    options = parser.parse_args()
+
+    uri = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SCHEMA_SETUP_ON_STARTUP": True, "METRICS_ENABLED": False})
+    client = app.test_client()
+
+    client.post("/signup", json={"login": "bench", "username": "bench", "password": "bench"})
+    token = client.post("/login", json={"login": "bench", "password": "bench"}).json["token_accessed"]
+    user_id = client.get("/stats").json["users"]
+
+    statements = []
+    loaded = []
+    with app.app_context():
+        seed(user_id, options.transactions, options.items)
+        event.listen(data.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    event.listen(Session, "loaded_as_persistent", lambda session, instance: loaded.append(type(instance).__name__))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.delete("/users/{}".format(user_id), headers={"Authorization": "Bearer " + token})
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert response.status_code == 200, response.json
+
+    print("DELETE /users/<id> ({} transações, {} itens do usuário, {} com ele)".format(
+        options.transactions, options.items, options.items // 10))
+    print("{:<24} {:>10.1f} ms".format("tempo", elapsed * 1000))
+    print("{:<24} {:>10}".format("comandos SQL", len(statements)))
+    print("{:<24} {:>10}".format("objetos ORM carregados", len(loaded)))
+    print("{:<24} {:>10.1f} KiB".format("pico de memória", peak / 1024))
+
+    with app.app_context(), data.engine.connect() as connection:
+        print("{:<24} {:>10}".format("contadores /stats", "ok" if compute_stats(connection) == stored_stats(connection) else "DIVERGENTES"))
+
+
+if __name__ == "__main__":
+    main()
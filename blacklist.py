@@ -1 +1,178 @@
-BLACKLIST = set()
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+from metrics import TracedConnection
+
+""" Armazenamento dos tokens JWT revogados (logout).
+
+    Todos os backends guardam o 'jti' junto com o 'exp' do token: depois que o token
+    expira ele já seria recusado pelo próprio JWT, então a entrada pode ser descartada.
+    Assim a memória/espaço fica limitada aos tokens revogados que ainda não expiraram.
+
+    Backends:
+    - MemoryBlacklist: dicionário local ao processo (um único worker).
+    - SQLiteBlacklist: arquivo SQLite compartilhado entre os workers da mesma máquina.
+    - RedisBlacklist: qualquer cliente compatível com Redis ('set' com 'ex' e 'exists'). """
+
+
+class MemoryBlacklist:
+    """ Blacklist em memória com expiração alinhada ao 'exp' de cada token.
+
+        A consulta é um acesso a dicionário (O(1)); os expirados saem por um heap
+        ordenado por expiração, varrido a cada inserção. """
+
+    def __init__(self):
+        self._tokens = {}
+        self._expirations = []
+        self._lock = threading.Lock()
+
+
+    def add(self, jti, expires_at=None):
+        # Tokens sem 'exp' ficam na lista até o processo reiniciar
+        with self._lock:
+            self._tokens[jti] = expires_at
+            if expires_at is not None:
+                heapq.heappush(self._expirations, (expires_at, jti))
+            self._purge(time.time())
+
+
+    def __contains__(self, jti):
+        expires_at = self._tokens.get(jti, False)
+        if expires_at is False:
+            return False
+        return expires_at is None or expires_at > time.time()
+
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+    def _purge(self, now):
+        while self._expirations and self._expirations[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expirations)
+            if self._tokens.get(jti) == expires_at:
+                del self._tokens[jti]
+
+
+
+class SQLiteBlacklist:
+    """ Blacklist em um arquivo SQLite, visível para todos os processos que usam o mesmo arquivo.
+
+        A consulta é feita pela chave primária ('jti'); os expirados são apagados a cada
+        'purge_every' inserções. """
+
+    def __init__(self, path, purge_every=100):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._added = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens (jti TEXT PRIMARY KEY, expires_at REAL) WITHOUT ROWID")
+        connection.commit()
+
+
+    def _connection(self):
+        # Uma conexão por thread, reaproveitada entre requisições
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, factory=TracedConnection)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = connection
+        return connection
+
+
+    def add(self, jti, expires_at=None):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)", (jti, expires_at))
+
+        self._added += 1
+        if self._added % self.purge_every == 0:
+            connection.execute(
+                "DELETE FROM revoked_tokens WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        connection.commit()
+
+
+    def __contains__(self, jti):
+        row = self._connection().execute(
+            "SELECT 1 FROM revoked_tokens WHERE jti = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (jti, time.time())).fetchone()
+        return row is not None
+
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM revoked_tokens").fetchone()[0]
+
+
+
+class RedisBlacklist:
+    """ Blacklist em Redis (ou em um cliente falso com a mesma interface).
+
+        Cada 'jti' vira uma chave com TTL igual ao tempo restante do token, então o
+        próprio Redis descarta as entradas expiradas. """
+
+    def __init__(self, client, prefix="revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+
+    def add(self, jti, expires_at=None):
+        if expires_at is None:
+            self.client.set(self.prefix + jti, 1)
+            return
+
+        ttl = int(expires_at - time.time()) + 1
+        if ttl > 0:
+            self.client.set(self.prefix + jti, 1, ex=ttl)
+
+
+    def __contains__(self, jti):
+        return bool(self.client.exists(self.prefix + jti))
+
+
+
+def init_blacklist(app):
+    """ Cria o backend da blacklist a partir do config e o registra em 'app.extensions'.
+
+        Config:
+            BLACKLIST_BACKEND: 'memory' (padrão), 'sqlite' ou 'redis'.
+            BLACKLIST_SQLITE_PATH: arquivo do backend 'sqlite' (padrão: instance/revoked_tokens.db).
+            BLACKLIST_REDIS_URL: URL do backend 'redis' (requer o pacote 'redis').
+            BLACKLIST_REDIS_CLIENT: cliente já construído (ex.: um fake local); tem prioridade sobre a URL. """
+
+    backend = app.config.get("BLACKLIST_BACKEND", "memory")
+
+    if backend == "memory":
+        store = MemoryBlacklist()
+
+    elif backend == "sqlite":
+        path = app.config.get("BLACKLIST_SQLITE_PATH") or os.path.join(app.instance_path, "revoked_tokens.db")
+        store = SQLiteBlacklist(path)
+
+    elif backend == "redis":
+        client = app.config.get("BLACKLIST_REDIS_CLIENT")
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(app.config["BLACKLIST_REDIS_URL"])
+        store = RedisBlacklist(client)
+
+    else:
+        raise ValueError("Unknown BLACKLIST_BACKEND '{}'.".format(backend))
+
+    app.extensions["blacklist"] = store
+    return store
+
+
+def get_blacklist():
+    """ Retorna o backend da blacklist da aplicação atual. """
+
+    return current_app.extensions["blacklist"]
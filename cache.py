@@ -0,0 +1,230 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request, Response
+from werkzeug.http import quote_etag
+from serialization import dumps
+
+""" Cache de leitura (read-through) para 'GET /items/<id>' e 'GET /users/<id>'.
+
+    Cada entrada guarda o JSON já montado do objeto e o ETag (hash do JSON). Assim um
+    'If-None-Match' válido é respondido com 304 sem consultar o banco nem montar o JSON.
+    Como o ETag depende só do conteúdo, ele é o mesmo em todos os workers e continua
+    igual quando a entrada é recarregada depois do TTL. Não há 'Last-Modified': o
+    instante em que a entrada foi carregada não diz quando a linha mudou.
+
+    As escritas nos modelos ('save_item', 'update_item', 'delete_item', 'delete_user',
+    empréstimos e devoluções) removem a entrada depois do commit.
+
+    Backends:
+    - MemoryCache: LRU com TTL, local ao processo. Com vários workers, cada um tem o seu
+      cache e uma escrita só invalida o do próprio worker; os demais ficam com a versão
+      antiga por no máximo 'CACHE_TTL' segundos.
+    - RedisCache: compartilhado entre processos; invalidação vale para todos.
+    - NullCache: desativa o cache ('CACHE_BACKEND' = 'none'). """
+
+
+class MemoryCache:
+    """ Cache LRU com expiração por TTL.
+
+        Parâmetros:
+            max_entries (int): Quantidade máxima de entradas; a menos usada sai primeiro.
+            ttl (float): Segundos de validade de cada entrada. """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None or found[0] <= time.monotonic():
+                if found is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return found[1]
+
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+    def stats(self):
+        return {"backend": "memory", "hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+
+class RedisCache:
+    """ Cache compartilhado em um cliente compatível com Redis ('get', 'set' com 'ex', 'delete').
+
+        Os contadores de acertos/faltas são do processo atual. """
+
+    def __init__(self, client, ttl=30, prefix="cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses, "entries": None}
+
+
+
+class NullCache:
+    """ Backend vazio: toda leitura vai ao banco. """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def stats(self):
+        return {"backend": "none", "hits": 0, "misses": 0, "entries": 0}
+
+
+
+def init_cache(app):
+    """ Cria o backend do cache a partir do config e o registra em 'app.extensions'.
+
+        Config:
+            CACHE_BACKEND: 'memory' (padrão), 'redis' ou 'none'.
+            CACHE_MAX_ENTRIES (int): Tamanho do LRU em memória. Padrão é 1024.
+            CACHE_TTL (float): Validade das entradas, em segundos. Padrão é 30.
+            CACHE_REDIS_URL: URL do backend 'redis' (requer o pacote 'redis').
+            CACHE_REDIS_CLIENT: cliente já construído; tem prioridade sobre a URL. """
+
+    backend = app.config.get("CACHE_BACKEND", "memory")
+    ttl = app.config.get("CACHE_TTL", 30)
+
+    if backend == "memory":
+        store = MemoryCache(app.config.get("CACHE_MAX_ENTRIES", 1024), ttl)
+
+    elif backend == "redis":
+        client = app.config.get("CACHE_REDIS_CLIENT")
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(app.config["CACHE_REDIS_URL"])
+        store = RedisCache(client, ttl)
+
+    elif backend == "none":
+        store = NullCache()
+
+    else:
+        raise ValueError("Unknown CACHE_BACKEND '{}'.".format(backend))
+
+    app.extensions["cache"] = store
+    return store
+
+
+def get_cache():
+    """ Retorna o backend do cache da aplicação atual. """
+
+    return current_app.extensions["cache"]
+
+
+def item_key(item_id):
+    return "item:{}".format(item_id)
+
+
+def user_key(user_id):
+    return "user:{}".format(user_id)
+
+
+def invalidate(*keys):
+    # Chamado pelos modelos depois do commit; fora de uma aplicação (ex.: scripts) não há cache
+    if current_app:
+        get_cache().delete(*keys)
+
+
+def read_through(key, find):
+    """ Busca a entrada no cache e, se faltar, carrega o objeto do banco e guarda.
+
+        Parâmetros:
+            key (str): Chave do objeto ('item_key', 'user_key').
+            find (callable): Função sem argumentos que retorna o objeto no formato da API
+                ('ItemModel.find_record', ...) ou None.
+
+        Retorna:
+            dict | None: {'body', 'etag'}, ou None se o objeto não existir. """
+
+    cache = get_cache()
+    entry = cache.get(key)
+
+    if entry is None:
+        body = find()
+        if body is None:
+            return None
+
+        entry = cache_entry(body)
+        cache.set(key, entry)
+
+    return entry
+
+
+def cache_entry(body):
+    # Entrada do cache para um objeto no formato da API; o ETag é o hash do JSON
+    return {"body": body, "etag": hashlib.sha1(dumps(body)).hexdigest()}
+
+
+def conditional_response(entry):
+    """ Monta a resposta de um objeto do cache, respeitando 'If-None-Match'.
+
+        Parâmetros:
+            entry (dict): Entrada retornada por 'read_through'.
+
+        Retorna:
+            tuple | Response: (JSON, 200, cabeçalhos) ou uma resposta 304 sem corpo. """
+
+    headers = {"ETag": quote_etag(entry["etag"])}
+
+    if request.if_none_match and request.if_none_match.contains_weak(entry["etag"]):
+        return Response(status=304, headers=headers)
+
+    return entry["body"], 200, headers
@@ -0,0 +1,182 @@
+import os
+import click
+import migrations
+import partitions
+from sqlalchemy import text
+from sql_alchemy import data
+from models.transaction_models import TransactionModel
+from models.user_models import UserModel
+from models.stats_models import USER_COUNTERS, compute_stats, rebuild_stats, stored_stats
+from passwords import get_hasher, is_hashed
+
+
+def register_commands(app):
+    """ Registra os comandos de manutenção no CLI do Flask ('flask --app app <comando>').
+
+        Comandos:
+            init-db: cria as tabelas que faltam e aplica as migrações pendentes.
+            migrate: aplica as migrações de schema pendentes.
+            explain-queries: verifica se as consultas dos endpoints usam índice.
+            backfill-holdings: recalcula o detentor atual de cada item a partir das transações.
+            hash-passwords: troca as senhas legadas em texto puro pelo hash.
+            stats-check: confere os contadores de '/stats' contra as tabelas (e os refaz com --fix).
+            transactions-rotate: move os meses fechados de 'transactions' para as partições mensais.
+            transactions-archive: grava as partições antigas em arquivos comprimidos e as tira do banco.
+            transactions-restore: traz um mês arquivado de volta ao banco.
+            transactions-partitions: lista as partições e o estado de cada uma. """
+
+    @app.cli.command('init-db')
+    def init_db():
+        """ Cria as tabelas que faltam e aplica as migrações pendentes. """
+
+        try:
+            applied = migrations.init_schema()
+        except ValueError as error:
+            raise click.ClickException(str(error))
+
+        for name in applied:
+            click.echo('Applied {}'.format(name))
+        click.echo('Schema at version {}.'.format(migrations.current_version()))
+
+
+    @app.cli.command('migrate')
+    @click.option('--target', type=int, default=None, help='Versão máxima a aplicar.')
+    def migrate(target):
+        """ Aplica as migrações de schema pendentes. """
+
+        try:
+            applied = migrations.upgrade(target)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+
+        for name in applied:
+            click.echo('Applied {}'.format(name))
+        click.echo('Schema at version {}.'.format(migrations.current_version()))
+
+
+    @app.cli.command('explain-queries')
+    def explain_queries():
+        """ Mostra o plano de cada consulta dos endpoints e falha se alguma não usar índice. """
+
+        failed = False
+        for description, plan, uses_index in migrations.explain_endpoint_queries():
+            click.echo('[{}] {}: {}'.format('ok' if uses_index else 'SCAN', description, plan))
+            failed = failed or not uses_index
+
+        if failed:
+            raise SystemExit(1)
+
+
+    @app.cli.command('backfill-holdings')
+    def backfill_holdings():
+        """ Recalcula 'current_holder_id' e 'last_transaction_id' de todos os itens. """
+
+        with data.engine.begin() as connection:
+            updated = TransactionModel.backfill_holdings(connection)
+        click.echo('Updated {} items.'.format(updated))
+
+
+    @app.cli.command('hash-passwords')
+    @click.option('--batch-size', type=int, default=500, help='Usuários por commit.')
+    def hash_passwords(batch_size):
+        """ Troca as senhas legadas em texto puro pelo hash, sem esperar o próximo login. """
+
+        hasher = get_hasher()
+        users = UserModel.__table__
+        legacy = [(user_id, password) for user_id, password
+                  in data.session.execute(data.select(users.c.user_id, users.c.password))
+                  if not is_hashed(password)]
+
+        for start in range(0, len(legacy), batch_size):
+            batch = legacy[start:start + batch_size]
+            hashes = hasher.hash_many([password or '' for _, password in batch])
+            data.session.execute(
+                users.update().where(users.c.user_id == data.bindparam('b_user_id')).values(password=data.bindparam('b_password')),
+                [{'b_user_id': user_id, 'b_password': password} for (user_id, _), password in zip(batch, hashes)])
+            data.session.commit()
+
+        click.echo('Hashed {} passwords.'.format(len(legacy)))
+
+
+    @app.cli.command('stats-check')
+    @click.option('--fix', is_flag=True, help='Regrava os contadores com os valores recalculados.')
+    def stats_check(fix):
+        """ Recalcula os contadores de '/stats' do zero e mostra as diferenças para os gravados. """
+
+        with data.engine.begin() as connection:
+            totals, users = compute_stats(connection)
+            stored_totals, stored_users = stored_stats(connection)
+
+            differences = ['global {}: stored {}, computed {}'.format(name, stored_totals[name], value)
+                           for name, value in totals.items() if stored_totals[name] != value]
+
+            zero = dict.fromkeys(USER_COUNTERS, 0)
+            for user_id in sorted(set(users) | set(stored_users)):
+                computed = users.get(user_id, zero)
+                stored = stored_users.get(user_id, zero)
+                differences += ['user {} {}: stored {}, computed {}'.format(user_id, name, stored[name], value)
+                                for name, value in computed.items() if stored[name] != value]
+
+            for line in differences:
+                click.echo(line)
+
+            if fix:
+                rebuild_stats(connection)
+
+        if not differences:
+            click.echo('Stats are consistent.')
+        elif fix:
+            click.echo('Rebuilt stats ({} differences fixed).'.format(len(differences)))
+        else:
+            raise SystemExit(1)
+
+
+    @app.cli.command('transactions-rotate')
+    @click.option('--hot-months', type=int, default=2, help='Meses mais recentes que ficam em "transactions" (o atual conta como um).')
+    def transactions_rotate(hot_months):
+        """ Move os meses fechados mais antigos de 'transactions' para as partições mensais. """
+
+        with data.engine.begin() as connection:
+            moved = partitions.rotate_partitions(connection, hot_months)
+        for month, rows in moved:
+            click.echo('Moved {} transactions to {}.'.format(rows, partitions.table_name(month)))
+        click.echo('Rotated {} months.'.format(len(moved)))
+
+
+    @app.cli.command('transactions-archive')
+    @click.option('--online-months', type=int, default=12, help='Meses mais recentes que continuam no banco.')
+    @click.option('--directory', default=None, help='Pasta dos arquivos (padrão: TRANSACTION_ARCHIVE_DIR).')
+    def transactions_archive(online_months, directory):
+        """ Grava as partições fora dos meses mais recentes em arquivos SQLite comprimidos e as tira do banco. """
+
+        directory = directory or app.config.get('TRANSACTION_ARCHIVE_DIR') or os.path.join(app.instance_path, 'transaction_archive')
+        with data.engine.begin() as connection:
+            archived = partitions.archive_partitions(connection, directory, online_months)
+        for month, path in archived:
+            click.echo('Archived {} to {}.'.format(month, path))
+        click.echo('Archived {} months.'.format(len(archived)))
+
+
+    @app.cli.command('transactions-restore')
+    @click.argument('month')
+    def transactions_restore(month):
+        """ Traz o mês arquivado MONTH ('YYYY-MM') de volta para uma partição no banco. """
+
+        try:
+            with data.engine.begin() as connection:
+                restored = partitions.restore_partition(connection, month)
+        except LookupError as error:
+            raise click.ClickException(str(error))
+        click.echo('Restored {} transactions to {}.'.format(restored, partitions.table_name(month)))
+
+
+    @app.cli.command('transactions-partitions')
+    def transactions_partitions():
+        """ Lista as partições de 'transactions': mês, estado, linhas e intervalo de chaves. """
+
+        with data.engine.connect() as connection:
+            rows = connection.execute(text(
+                "SELECT month, state, rows, first_id, last_id, archive_path FROM transaction_partitions ORDER BY starts_at")).fetchall()
+        for month, state, count, first_id, last_id, path in rows:
+            click.echo('{} {:<8} {:>10} rows  ids {}..{}{}'.format(month, state, count, first_id, last_id, '  ' + path if path else ''))
+        click.echo('{} partitions.'.format(len(rows)))
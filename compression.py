@@ -0,0 +1,121 @@
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError: # Opcional: sem ele, só gzip
+    brotli = None
+
+""" Compressão negociada das respostas ('Accept-Encoding': br ou gzip).
+
+    As listagens em JSON repetem os mesmos nomes de campo em toda linha e comprimem bem
+    (uma página de 1000 itens cai para cerca de um décimo). Corpos pequenos não valem o
+    custo da compressão e seguem como estão ('COMPRESSION_MIN_SIZE').
+
+    O brotli é usado quando o pacote 'brotli' está instalado e o cliente o aceita com
+    qualidade pelo menos igual à do gzip; a qualidade padrão (4) é a de compressão
+    dinâmica, mais rápida que o gzip nível 6 com taxa parecida. O gzip usa o 'zlib' da
+    biblioteca padrão.
+
+    Não são comprimidas: respostas em streaming (exportação NDJSON/CSV), 304/204, corpos
+    já codificados e tipos fora de 'COMPRESSIBLE_TYPES'. As respostas que poderiam ser
+    comprimidas levam 'Vary: Accept-Encoding', e um ETag forte vira fraco na versão
+    comprimida (os bytes mudam, o conteúdo não). """
+
+
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+
+
+class Compressor:
+    """ Escolhe a codificação pelo 'Accept-Encoding' e comprime o corpo.
+
+        Atributos:
+            min_size (int): Corpos menores que isso (em bytes) não são comprimidos.
+            gzip_level (int): Nível do gzip (1 a 9).
+            brotli_quality (int): Qualidade do brotli (0 a 11). """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+
+    def choose(self, accept_encoding):
+        """ Codificação da resposta para o cabeçalho 'Accept-Encoding' do cliente.
+
+            Parâmetros:
+                accept_encoding (str | None): Valor do cabeçalho.
+
+            Retorna:
+                str | None: 'br', 'gzip' ou None (sem compressão). """
+
+        if not accept_encoding:
+            return None
+
+        accepted = parse_accept_header(accept_encoding)
+        gzip_quality = accepted["gzip"]
+        if brotli is not None and accepted["br"] and accepted["br"] >= gzip_quality:
+            return "br"
+        return "gzip" if gzip_quality else None
+
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # wbits=31: formato gzip (cabeçalho e CRC), não o zlib cru
+        return zlib.compress(body, self.gzip_level, wbits=31)
+
+
+    def encode(self, body, accept_encoding):
+        """ Comprime 'body' se ele passar do tamanho mínimo e o cliente aceitar alguma codificação.
+
+            Retorna:
+                tuple: (corpo, codificação), com codificação None quando o corpo segue como está. """
+
+        if len(body) < self.min_size:
+            return body, None
+        encoding = self.choose(accept_encoding)
+        if encoding is None:
+            return body, None
+        return self.compress(body, encoding), encoding
+
+
+
+def init_compression(app):
+    """ Liga a compressão das respostas e registra o 'Compressor' em 'app.extensions'.
+
+        Config:
+            COMPRESSION_ENABLED (bool): Padrão é True.
+            COMPRESSION_MIN_SIZE (int): Bytes a partir dos quais o corpo é comprimido. Padrão é 1024.
+            COMPRESSION_GZIP_LEVEL (int): Padrão é 6.
+            COMPRESSION_BROTLI_QUALITY (int): Padrão é 4. """
+
+    if not app.config.get("COMPRESSION_ENABLED", True):
+        return None
+
+    compressor = Compressor(app.config.get("COMPRESSION_MIN_SIZE", 1024), app.config.get("COMPRESSION_GZIP_LEVEL", 6),
+                            app.config.get("COMPRESSION_BROTLI_QUALITY", 4))
+    app.extensions["compression"] = compressor
+
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+                or response.status_code in (204, 304) or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        body, encoding = compressor.encode(response.get_data(), request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return compressor
@@ -1,7 +1,16 @@
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+
+# Formato de exibição das datas na API (horário local do servidor)
+DISPLAY_FORMAT = "%d/%m/%Y %H:%M:%S"
+
 
 class Time(datetime):
-    """ Classe que estende datetime para operações relacionadas a tempo formatado. """
+    """ Classe que estende datetime para operações relacionadas a tempo formatado.
+
+        As datas são gravadas em 'created_at' como segundos desde a época (UTC), que ordenam
+        pelo tempo e são indexadas; o texto 'dd/mm/yyyy HH:MM:SS' da coluna 'date' é a
+        exibição do mesmo instante no horário local. """
 
     @staticmethod
     def register_time():
@@ -9,8 +18,102 @@ class Time(datetime):
 
             Retorna:
                 str: Data e hora atual formatadas, por exemplo, '07/06/2025 14:30:25'. """
-        
+
         time = datetime.now()
-        time_format = time.strftime("%d/%m/%Y %H:%M:%S")
+        time_format = time.strftime(DISPLAY_FORMAT)
         time_format = str(time_format)
-        return time_format
\ No newline at end of file
+        return time_format
+
+
+    @staticmethod
+    def epoch():
+        """ Retorna o instante atual em segundos inteiros desde a época (UTC). """
+
+        return int(time.time())
+
+
+    @staticmethod
+    def format_epoch(seconds):
+        """ Formata segundos desde a época no padrão 'dd/mm/yyyy HH:MM:SS' (horário local).
+
+            Parâmetros:
+                seconds (int): Instante em segundos desde a época.
+
+            Retorna:
+                str: Data e hora formatadas, por exemplo, '07/06/2025 14:30:25'. """
+
+        return datetime.fromtimestamp(seconds).strftime(DISPLAY_FORMAT)
+
+
+    @staticmethod
+    def parse_display(value):
+        """ Converte o texto 'dd/mm/yyyy HH:MM:SS' (horário local) em segundos desde a época.
+
+            Retorna:
+                int | None: O instante, ou None se o texto não estiver no formato. """
+
+        try:
+            return int(datetime.strptime(value, DISPLAY_FORMAT).timestamp())
+        except (TypeError, ValueError):
+            return None
+
+
+    @staticmethod
+    def range_start(value):
+        """ Converte o argumento 'date_from' no primeiro segundo incluído no intervalo.
+
+            Aceita 'dd/mm/yyyy', 'dd/mm/yyyy HH:MM:SS', ISO 8601 ('2025-06-07',
+            '2025-06-07T14:30:25Z', ...) ou segundos desde a época. Datas sem fuso são
+            lidas no horário local, o mesmo da exibição.
+
+            Levanta:
+                ValueError: Se o valor não estiver em nenhum dos formatos. """
+
+        return read_moment(value)[0]
+
+
+    @staticmethod
+    def range_end(value):
+        """ Converte o argumento 'date_to' no primeiro segundo depois do intervalo (limite exclusivo).
+
+            O 'date_to' é inclusivo: só a data ('07/06/2025') cobre o dia inteiro; com a hora,
+            cobre até aquele segundo. Aceita os mesmos formatos de 'range_start'.
+
+            Levanta:
+                ValueError: Se o valor não estiver em nenhum dos formatos. """
+
+        moment, whole_day = read_moment(value)
+        if whole_day:
+            return int((datetime.fromtimestamp(moment) + timedelta(days=1)).timestamp())
+        return moment + 1
+
+
+    @staticmethod
+    def day_range(value):
+        """ Converte o argumento 'date' (um dia) no intervalo [início, fim) desse dia.
+
+            Levanta:
+                ValueError: Se o valor não estiver em nenhum dos formatos. """
+
+        return Time.range_start(value), Time.range_end(value)
+
+
+
+def read_moment(value):
+    # (segundos desde a época, True se o valor é só uma data)
+    value = value.strip()
+
+    if value.isdigit():
+        return int(value), False
+
+    for layout, whole_day in (("%d/%m/%Y", True), (DISPLAY_FORMAT, False)):
+        try:
+            return int(datetime.strptime(value, layout).timestamp()), whole_day
+        except ValueError:
+            pass
+
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError("Invalid date '{}': use dd/mm/yyyy, dd/mm/yyyy HH:MM:SS, ISO 8601 or epoch seconds.".format(value))
+    return int(moment.timestamp()), len(value) == 10
@@ -0,0 +1,89 @@
+import csv
+import io
+from flask import Response, request, stream_with_context
+from werkzeug.exceptions import BadRequest
+from serialization import dumps
+
+""" Exportação em streaming das listagens ('/items', '/transactions').
+
+    As linhas são lidas do cursor aos poucos e escritas na resposta conforme chegam,
+    então a memória usada não depende do tamanho do resultado. """
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def format_name(value):
+    """ Valida o parâmetro 'format' da query string.
+
+        Parâmetros:
+            value (str): 'json', 'ndjson' ou 'csv'.
+
+        Retorna:
+            str: O formato em minúsculas.
+
+        Levanta:
+            BadRequest: Se o formato não for suportado. """
+
+    if isinstance(value, str) and value.lower() in ("json", "ndjson", "csv"):
+        return value.lower()
+    raise BadRequest("The value must be 'json', 'ndjson' or 'csv'.")
+
+
+def export_format(format=None):
+    """ Decide se a requisição pede exportação em streaming.
+
+        O parâmetro 'format' tem prioridade; sem ele, usa o cabeçalho 'Accept'
+        ('application/x-ndjson' ou 'text/csv'). JSON continua sendo o padrão.
+
+        Retorna:
+            str | None: 'ndjson', 'csv' ou None para a resposta JSON comum. """
+
+    if format is not None:
+        return None if format == "json" else format
+
+    best = request.accept_mimetypes.best_match(["application/json"] + list(EXPORT_FORMATS.values()))
+    for name, mimetype in EXPORT_FORMATS.items():
+        if best == mimetype:
+            return name
+    return None
+
+
+def stream_export(fmt, columns, rows, filename):
+    """ Monta a resposta em streaming com as linhas no formato pedido.
+
+        Parâmetros:
+            fmt (str): 'ndjson' ou 'csv'.
+            columns (list): Nomes das colunas (cabeçalho do CSV).
+            rows (iterable): Gerador de dicionários, consumido sob demanda.
+            filename (str): Nome base do arquivo sugerido ao cliente.
+
+        Retorna:
+            Response: Resposta com corpo gerado linha a linha. """
+
+    if fmt == "csv":
+        generate = _csv_lines(columns, rows)
+    else:
+        generate = (dumps(row) + b"\n" for row in rows)
+
+    response = Response(stream_with_context(generate), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = "attachment; filename={}.{}".format(filename, fmt)
+    return response
+
+
+def _csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
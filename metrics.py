@@ -0,0 +1,264 @@
+import bisect
+import sqlite3
+import threading
+import time
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sql_alchemy import data
+
+""" Métricas da aplicação no formato de exposição do Prometheus ('GET /metrics').
+
+    - Latência das requisições por classe de recurso ('Items', 'Item', 'LoanTransaction', ...),
+      método e status, em histogramas.
+    - Quantidade e duração das consultas SQL, agrupadas pelo recurso que as executou:
+      as do engine SQLAlchemy (eventos 'before/after_cursor_execute') e as das conexões
+      'sqlite3' diretas que usam 'TracedConnection' (ex.: a blacklist em SQLite).
+    - Consultas por requisição, para achar endpoints com N+1.
+
+    Cada observação custa um 'perf_counter', uma busca binária no histograma e um lock
+    curto, então as métricas podem ficar ligadas em produção. Os valores são do processo:
+    com vários workers, cada um expõe os seus. """
+
+
+# Limites (em segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Limites dos histogramas de consultas por requisição
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    """ Histograma com limites fixos; 'counts[i]' conta as observações em (limite[i-1], limite[i]]. """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def samples(self):
+        # Pares (le, acumulado) no formato do Prometheus, terminando em +Inf
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield format_value(bound), total
+        yield "+Inf", self.count
+
+
+
+class Metrics:
+    """ Registro das métricas de um processo.
+
+        Atributos:
+            requests (dict): (recurso, método, status) -> total de requisições.
+            latency (dict): (recurso, método) -> Histogram da duração das requisições.
+            queries (dict): (recurso, driver) -> Histogram da duração das consultas SQL.
+            queries_per_request (dict): recurso -> Histogram de consultas por requisição. """
+
+    def __init__(self):
+        self.requests = {}
+        self.latency = {}
+        self.queries = {}
+        self.queries_per_request = {}
+        self._lock = threading.Lock()
+
+
+    def observe_request(self, resource, method, status, duration, query_count):
+        with self._lock:
+            key = (resource, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._histogram(self.latency, (resource, method), LATENCY_BUCKETS).observe(duration)
+            self._histogram(self.queries_per_request, resource, QUERY_COUNT_BUCKETS).observe(query_count)
+
+
+    def observe_query(self, resource, driver, duration):
+        with self._lock:
+            self._histogram(self.queries, (resource, driver), LATENCY_BUCKETS).observe(duration)
+
+
+    @staticmethod
+    def _histogram(table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+
+    def render(self, cache_stats=None):
+        """ Gera o texto no formato de exposição do Prometheus (versão 0.0.4). """
+
+        lines = []
+
+        with self._lock:
+            lines += header("inventory_requests_total", "counter", "Requests handled, by resource class, method and status.")
+            for (resource, method, status), total in sorted(self.requests.items()):
+                lines.append('inventory_requests_total{{{}}} {}'.format(
+                    labels(resource=resource, method=method, status=status), total))
+
+            lines += header("inventory_request_duration_seconds", "histogram", "Request latency by resource class and method.")
+            for (resource, method), histogram in sorted(self.latency.items()):
+                lines += histogram_lines("inventory_request_duration_seconds", histogram, resource=resource, method=method)
+
+            lines += header("inventory_sql_query_duration_seconds", "histogram", "SQL statement latency by resource class and driver.")
+            for (resource, driver), histogram in sorted(self.queries.items()):
+                lines += histogram_lines("inventory_sql_query_duration_seconds", histogram, resource=resource, driver=driver)
+
+            lines += header("inventory_sql_queries_per_request", "histogram", "SQL statements executed per request.")
+            for resource, histogram in sorted(self.queries_per_request.items()):
+                lines += histogram_lines("inventory_sql_queries_per_request", histogram, resource=resource)
+
+        if cache_stats is not None:
+            backend = cache_stats["backend"]
+            lines += header("inventory_cache_hits_total", "counter", "Read-through cache hits.")
+            lines.append('inventory_cache_hits_total{{{}}} {}'.format(labels(backend=backend), cache_stats["hits"]))
+            lines += header("inventory_cache_misses_total", "counter", "Read-through cache misses.")
+            lines.append('inventory_cache_misses_total{{{}}} {}'.format(labels(backend=backend), cache_stats["misses"]))
+
+        return "\n".join(lines) + "\n"
+
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def labels(**values):
+    return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                    for name, value in values.items())
+
+
+def header(name, kind, description):
+    return ["# HELP {} {}".format(name, description), "# TYPE {} {}".format(name, kind)]
+
+
+def histogram_lines(name, histogram, **label_values):
+    common = labels(**label_values)
+    lines = ['{}_bucket{{{},le="{}"}} {}'.format(name, common, bound, count) for bound, count in histogram.samples()]
+    lines.append("{}_sum{{{}}} {}".format(name, common, repr(histogram.sum)))
+    lines.append("{}_count{{{}}} {}".format(name, common, histogram.count))
+    return lines
+
+
+def resource_name():
+    # Nome da classe do recurso flask_restful que atende a requisição (ou o endpoint Flask)
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, "view_class", None)
+    if view_class is not None:
+        return view_class.__name__
+    return request.endpoint or "unmatched"
+
+
+def record_query(driver, duration):
+    """ Registra uma consulta SQL na aplicação atual, atribuída ao recurso da requisição. """
+
+    if not has_app_context():
+        return
+
+    metrics = current_app.extensions.get("metrics")
+    if metrics is None:
+        return
+
+    resource = "none"
+    if has_request_context():
+        resource = g.get("metrics_resource", "none")
+        g.metrics_queries = g.get("metrics_queries", 0) + 1
+    metrics.observe_query(resource, driver, duration)
+
+
+
+class TracedConnection(sqlite3.Connection):
+    """ Conexão 'sqlite3' que registra a duração de cada 'execute'/'executemany' nas métricas.
+
+        Uso: sqlite3.connect(path, factory=TracedConnection). """
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            record_query("sqlite3", time.perf_counter() - start)
+
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            record_query("sqlite3", time.perf_counter() - start)
+
+
+
+def instrument_engine(engine):
+    """ Registra os eventos que medem cada consulta executada pelo engine. """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(connection, cursor, statement, parameters, context, executemany):
+        start = connection.info["metrics_start"].pop()
+        record_query("sqlalchemy", time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(context):
+        # Descarta o início da consulta que falhou, para não desalinhar a pilha
+        starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def init_metrics(app):
+    """ Liga as métricas na aplicação e registra o endpoint '/metrics'.
+
+        Config:
+            METRICS_ENABLED (bool): Padrão é True. Desligado, nem os hooks nem '/metrics' são registrados. """
+
+    if not app.config.get("METRICS_ENABLED", True):
+        return None
+
+    metrics = Metrics()
+    app.extensions["metrics"] = metrics
+
+    with app.app_context():
+        instrument_engine(data.engine)
+
+
+    @app.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_resource = resource_name()
+        g.metrics_queries = 0
+
+    @app.after_request
+    def keep_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        # Respostas em streaming passam aqui de novo ao fim do gerador; só a primeira conta
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        # Sem 'after_request' (exceção não tratada) a resposta é um 500
+        metrics.observe_request(g.metrics_resource, request.method, g.get("metrics_status", 500),
+                                time.perf_counter() - start, g.metrics_queries)
+
+
+    def expose():
+        cache = app.extensions.get("cache")
+        body = metrics.render(cache.stats() if cache is not None else None)
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", expose)
+    return metrics
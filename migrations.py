@@ -0,0 +1,348 @@
+from sql_alchemy import data
+from sqlalchemy import inspect, text
+from models.item_models import ItemModel
+from models.transaction_models import TransactionModel
+from models.user_models import UserModel
+from models.stats_models import GlobalStatsModel, UserStatsModel, rebuild_stats
+from date import Time
+from search import create_search_index, rebuild_search_index
+from partitions import transaction_partitions, transaction_partition_users
+from versions import collection_versions, create_version_triggers
+from models.item_models import ITEMS_BY_HOLDER
+from resourcers import item_resources, transaction_resourcers
+from resourcers.item_resources import ITEM_QUERY
+from resourcers.transaction_resourcers import TRANSACTION_QUERY
+from pagination import encode_cursor
+
+
+""" Migrações versionadas do schema.
+
+    'data.create_all()' só cria tabelas que ainda não existem; ele não acrescenta índices
+    ou colunas novas em bancos já criados. Cada migração abaixo leva um banco existente
+    de uma versão para a seguinte e é idempotente (verifica antes de alterar), então
+    também pode ser aplicada sobre um banco recém-criado pelo 'create_all'.
+
+    A versão aplicada fica registrada na tabela 'schema_migrations'. """
+
+
+schema_migrations = data.Table(
+    'schema_migrations',
+    data.Column('version', data.Integer, primary_key=True),
+    data.Column('name', data.String(80)),
+    data.Column('applied_at', data.String(20)),
+)
+
+
+def create_index(connection, table, name):
+    """ Cria o índice declarado no modelo, caso ainda não exista no banco. """
+
+    existing = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+    if name in existing:
+        return
+
+    for index in table.indexes:
+        if index.name == name:
+            index.create(connection)
+            return
+
+    raise LookupError("Index '{}' is not declared on table '{}'.".format(name, table.name))
+
+
+def add_column(connection, table, name):
+    """ Acrescenta ao banco a coluna declarada no modelo, caso ainda não exista. """
+
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    if name in existing:
+        return
+
+    column = table.c[name]
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(table.name, name, column_type)))
+
+
+def duplicate_values(connection, table, column, limit=20):
+    """ Valores repetidos de 'column' (ignorando nulos), que impedem criar um índice único.
+
+        Retorna:
+            list: Tuplas (valor, quantidade), no máximo 'limit'. """
+
+    return connection.execute(text(
+        'SELECT {1}, COUNT(*) FROM {0} WHERE {1} IS NOT NULL GROUP BY {1} HAVING COUNT(*) > 1 ORDER BY {1} LIMIT :limit'.format(
+            table.name, column)), {'limit': limit}).fetchall()
+
+
+def check_unique(connection, table, name, column):
+    """ Confere, antes de criar o índice único 'name', que 'column' não tem valores repetidos.
+
+        Levanta:
+            ValueError: Com os valores repetidos, para serem corrigidos antes de migrar de novo. """
+
+    if name in {index['name'] for index in inspect(connection).get_indexes(table.name)}:
+        return
+
+    duplicates = duplicate_values(connection, table, column)
+    if duplicates:
+        raise ValueError("Cannot create the unique index '{}': {}.{} has repeated values ({}). "
+                         "Rename or remove the duplicated rows and run the migration again.".format(
+                             name, table.name, column, ", ".join("'{}' x{}".format(value, count) for value, count in duplicates)))
+
+
+def add_filter_indexes(connection):
+    # Índices das colunas filtradas pelas listagens, por 'find_by_login' e pela devolução;
+    # logins repetidos (o cadastro antigo não os impedia) param a migração antes do índice único
+    check_unique(connection, UserModel.__table__, 'ix_users_login', 'login')
+    create_index(connection, ItemModel.__table__, 'ix_items_owner_id')
+    create_index(connection, ItemModel.__table__, 'ix_items_is_available')
+    create_index(connection, ItemModel.__table__, 'ix_items_description')
+    create_index(connection, TransactionModel.__table__, 'ix_transactions_item_id_transaction_id')
+    create_index(connection, TransactionModel.__table__, 'ix_transactions_from_user_id')
+    create_index(connection, TransactionModel.__table__, 'ix_transactions_to_user_id')
+    create_index(connection, UserModel.__table__, 'ix_users_login')
+
+
+def add_item_holder_state(connection):
+    # Detentor atual e última transação de cada item, preenchidos a partir do histórico
+    add_column(connection, ItemModel.__table__, 'current_holder_id')
+    add_column(connection, ItemModel.__table__, 'last_transaction_id')
+    create_index(connection, ItemModel.__table__, 'ix_items_current_holder_id')
+    TransactionModel.backfill_holdings(connection)
+
+
+def widen_password_column(connection):
+    # A coluna passa a guardar o hash da senha; o SQLite não aplica o tamanho do VARCHAR
+    if connection.dialect.name == 'sqlite':
+        return
+    column_type = UserModel.__table__.c.password.type.compile(dialect=connection.dialect)
+    connection.execute(text('ALTER TABLE users ALTER COLUMN password TYPE {}'.format(column_type)))
+
+
+def convert_dates(connection, table, key, batch_size=5000):
+    """ Preenche 'created_at' a partir do texto 'dd/mm/yyyy HH:MM:SS' de 'date', em lotes pela chave.
+
+        Cada lote é lido em ordem da chave primária e gravado com um único executemany.
+        Textos fora do formato ficam com 'created_at' nulo (fora dos filtros por data).
+
+        Retorna:
+            int: Quantidade de linhas convertidas. """
+
+    select_batch = text('SELECT {0}, date FROM {1} WHERE {0} > :after AND created_at IS NULL ORDER BY {0} LIMIT :limit'.format(key, table.name))
+    update = text('UPDATE {} SET created_at = :created_at WHERE {} = :key'.format(table.name, key))
+
+    converted = 0
+    after = -1
+    while True:
+        rows = connection.execute(select_batch, {'after': after, 'limit': batch_size}).fetchall()
+        if not rows:
+            return converted
+
+        values = [{'key': row[0], 'created_at': Time.parse_display(row[1])} for row in rows]
+        values = [value for value in values if value['created_at'] is not None]
+        if values:
+            connection.execute(update, values)
+
+        converted += len(values)
+        after = rows[-1][0]
+
+
+def add_created_at(connection):
+    # Data em segundos desde a época (indexada), convertida do texto de 'date' das linhas existentes
+    for table, key in ((ItemModel.__table__, 'item_id'), (TransactionModel.__table__, 'transaction_id')):
+        add_column(connection, table, 'created_at')
+        convert_dates(connection, table, key)
+        create_index(connection, table, 'ix_{}_created_at'.format(table.name))
+
+
+def add_stats_tables(connection):
+    # Contadores de '/stats', preenchidos a partir dos dados existentes
+    GlobalStatsModel.__table__.create(connection, checkfirst=True)
+    UserStatsModel.__table__.create(connection, checkfirst=True)
+    rebuild_stats(connection)
+
+
+def add_item_search(connection):
+    # Índice FTS5 das descrições (e triggers), preenchido com os itens existentes
+    if connection.dialect.name != 'sqlite':
+        return
+    create_search_index(connection)
+    rebuild_search_index(connection)
+
+
+def partition_transactions(connection):
+    # Catálogo das partições mensais e 'transactions' refeita com AUTOINCREMENT: a rotação pode
+    # esvaziar a tabela quente, e sem ele o SQLite voltaria a numerar a partir da maior chave que sobrou
+    transaction_partitions.create(connection, checkfirst=True)
+    transaction_partition_users.create(connection, checkfirst=True)
+    if connection.dialect.name != 'sqlite':
+        return
+
+    ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'")).scalar()
+    if 'AUTOINCREMENT' in ddl.upper():
+        return
+
+    table = TransactionModel.__table__
+    for index in table.indexes:
+        connection.execute(text('DROP INDEX IF EXISTS {}'.format(index.name)))
+    connection.execute(text('ALTER TABLE transactions RENAME TO transactions_rebuild'))
+    table.create(connection)
+    columns = ', '.join(column.name for column in table.columns)
+    connection.execute(text('INSERT INTO transactions ({0}) SELECT {0} FROM transactions_rebuild'.format(columns)))
+    connection.execute(text('DROP TABLE transactions_rebuild'))
+
+
+def add_collection_versions(connection):
+    # Versões de '/items' e '/transactions' (ETag das listagens), mantidas por triggers
+    collection_versions.create(connection, checkfirst=True)
+    create_version_triggers(connection)
+
+
+# (versão, nome, função que recebe a conexão)
+MIGRATIONS = [
+    (1, 'add_filter_indexes', add_filter_indexes),
+    (2, 'add_item_holder_state', add_item_holder_state),
+    (3, 'widen_password_column', widen_password_column),
+    (4, 'add_created_at', add_created_at),
+    (5, 'add_stats_tables', add_stats_tables),
+    (6, 'add_item_search', add_item_search),
+    (7, 'partition_transactions', partition_transactions),
+    (8, 'add_collection_versions', add_collection_versions),
+]
+
+
+def current_version():
+    """ Retorna a maior versão de migração aplicada (0 se nenhuma). """
+
+    schema_migrations.create(data.engine, checkfirst=True)
+    with data.engine.connect() as connection:
+        version = connection.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def upgrade(target=None):
+    """ Aplica, em ordem, as migrações pendentes até 'target' (ou até a última).
+
+        Cada migração roda em sua própria transação junto com o registro da versão.
+        Deve ser chamada dentro de um contexto de aplicação.
+
+        Retorna:
+            list: Nomes das migrações aplicadas. """
+
+    version = current_version()
+    applied = []
+
+    for number, name, migration in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+
+        with data.engine.begin() as connection:
+            migration(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=number, name=name, applied_at=Time.register_time()))
+        applied.append(name)
+
+    return applied
+
+
+def stamp():
+    """ Marca todas as migrações como aplicadas (para bancos criados do zero pelo 'create_all'). """
+
+    version = current_version()
+    with data.engine.begin() as connection:
+        for number, name, migration in MIGRATIONS:
+            if number > version:
+                connection.execute(schema_migrations.insert().values(
+                    version=number, name=name, applied_at=Time.register_time()))
+
+
+def list_query(query, normalize, arguments, route=None):
+    # A consulta de uma listagem exatamente como o endpoint a monta, para os argumentos já convertidos
+    return lambda: query.build(normalize(**arguments), route=route)[:2]
+
+
+def partitioned(values, sort):
+    # Duas fontes com os mesmos índices, como o 'PartitionRouter' com uma partição online
+    return (("transactions", ()), ("transactions", ()))
+
+
+# Consultas dos endpoints que devem ser atendidas por índice: (descrição, função que devolve (consulta, parâmetros))
+ENDPOINT_QUERIES = [
+    ("GET /items?owner_id", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"owner_id": 1})),
+    ("GET /items?is_available", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"is_available": True})),
+    ("GET /items?description", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"description": "x"})),
+    ("GET /items?cursor (desc)", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"cursor": encode_cursor(100, "desc")})),
+    ("GET /transactions?item_id", list_query(TRANSACTION_QUERY, transaction_resourcers.normalize_arguments, {"item_id": 1})),
+    ("GET /transactions?from_user_id", list_query(TRANSACTION_QUERY, transaction_resourcers.normalize_arguments, {"from_user_id": 1})),
+    ("GET /transactions?to_user_id", list_query(TRANSACTION_QUERY, transaction_resourcers.normalize_arguments, {"to_user_id": 1})),
+    # Com partições, um ramo por tabela (todas com os mesmos índices), ordenados em merge
+    ("GET /transactions?from_user_id (partições)", list_query(
+        TRANSACTION_QUERY, transaction_resourcers.normalize_arguments, {"from_user_id": 1, "sort": "desc"}, route=partitioned)),
+    ("UserModel.find_by_login", lambda: (UserModel.query.filter_by(login="x").limit(1).statement, {})),
+    ("backfill-holdings (última transação do item)", lambda: (text(
+        "SELECT transaction_id FROM transactions WHERE item_id = :item_id ORDER BY transaction_id DESC LIMIT 1"), {"item_id": 1})),
+    ("GET /items?date_from&date_to", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"date_from": 0, "date_to": 86400})),
+    ("GET /transactions?date_from&date_to", list_query(
+        TRANSACTION_QUERY, transaction_resourcers.normalize_arguments, {"date_from": 0, "date_to": 86400})),
+    ("GET /items?q&sort=asc", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"q": '"livro"*', "sort": "asc"})),
+    ("GET /items?q (relevância)", list_query(ITEM_QUERY, item_resources.normalize_arguments, {"q": '"livro"*'})),
+    ("GET /items?q (fim do ranking)", lambda: (ITEM_QUERY.ranked_boundary, {"q": '"livro"*'})),
+    ("GET /users/<id>/holdings", lambda: (ITEMS_BY_HOLDER, {"user_id": 1})),
+]
+
+# Consultas cuja ordem não vem do índice usado: o intervalo de 'created_at' e a busca por
+# relevância (bm25); a B-tree temporária ordena só as linhas encontradas pelo índice
+SORTED_QUERIES = {"GET /items?date_from&date_to", "GET /transactions?date_from&date_to", "GET /items?q (relevância)"}
+
+# SCANs aceitos por consulta: a relevância percorre o resultado materializado da subconsulta
+# 'found', que o LIMIT dela mantém em no máximo MAX_RANKED_MATCHES linhas (não uma tabela)
+BOUNDED_SCANS = {"GET /items?q (relevância)": {"SCAN found"}}
+
+
+def explain_endpoint_queries():
+    """ Roda EXPLAIN QUERY PLAN (SQLite) em cada consulta de 'ENDPOINT_QUERIES'.
+
+        As listagens são montadas por 'ITEM_QUERY'/'TRANSACTION_QUERY' a partir dos argumentos,
+        como nos endpoints, então o plano conferido é o do SQL que eles executam. Uma
+        consulta é considerada sem índice quando o plano faz SCAN da tabela ou precisa de
+        uma B-tree temporária para o ORDER BY (exceto as de 'SORTED_QUERIES', que ordenam
+        só as linhas lidas pelo índice). Os SCANs de 'BOUNDED_SCANS' percorrem um resultado
+        intermediário de tamanho limitado e não contam.
+
+        Retorna:
+            list: Tuplas (descrição, plano em texto, usa índice: bool). """
+
+    report = []
+    with data.engine.connect() as connection:
+        for description, build in ENDPOINT_QUERIES:
+            query, parameters = build()
+            compiled = query.compile(dialect=connection.dialect)
+            values = compiled.construct_params(parameters)
+            rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled),
+                                              tuple(values[name] for name in compiled.positiontup)).fetchall()
+            details = [row[-1] for row in rows]
+            sorts_found = description in SORTED_QUERIES
+            bounded = BOUNDED_SCANS.get(description, ())
+            uses_index = all(
+                not (detail.startswith("SCAN") and "INDEX" not in detail and detail not in bounded)
+                and ("TEMP B-TREE" not in detail or sorts_found)
+                for detail in details
+            )
+            report.append((description, "; ".join(details), uses_index))
+    return report
+
+
+def init_schema():
+    """ Deixa o banco pronto para uso: cria as tabelas que faltam e aplica as migrações pendentes.
+
+        Em um banco vazio, o 'create_all' já cria tudo na versão atual, então as migrações
+        são apenas marcadas como aplicadas. Deve ser chamada uma vez, na inicialização ou
+        pelo comando 'flask init-db', dentro de um contexto de aplicação.
+
+        Retorna:
+            list: Nomes das migrações aplicadas. """
+
+    fresh = not inspect(data.engine).has_table(ItemModel.__tablename__)
+    data.create_all()
+
+    if fresh:
+        stamp()
+        return []
+    return upgrade()
@@ -1,5 +1,10 @@
 from sql_alchemy import data
+from sqlalchemy import bindparam, case, event, func, inspect, select
 from date import Time
+from cache import invalidate, item_key
+from serialization import ITEM_FIELDS, item_record
+from models.stats_models import GlobalStatsModel, UserStatsModel
+from search import create_search_index
 
 
 class ItemModel(data.Model):
@@ -7,10 +12,13 @@ class ItemModel(data.Model):
     __tablename__ = 'items'
 
     item_id = data.Column(data.Integer, primary_key=True)
-    description = data.Column(data.String(40))
-    is_available = data.Column(data.Boolean, default=True)
-    date = data.Column(data.String(20), default=lambda: Time.register_time()) 
-    owner_id = data.Column(data.Integer)
+    description = data.Column(data.String(40), index=True)
+    is_available = data.Column(data.Boolean, default=True, index=True)
+    created_at = data.Column(data.Integer, default=lambda: Time.epoch(), index=True) # Segundos desde a época (UTC), usados nos filtros por data
+    date = data.Column(data.String(20), default=lambda context: Time.format_epoch(context.get_current_parameters()['created_at'])) # Exibição de 'created_at' (dd/mm/yyyy HH:MM:SS)
+    owner_id = data.Column(data.Integer, index=True)
+    current_holder_id = data.Column(data.Integer, nullable=True, index=True) # Usuário com o item emprestado (None se está com o dono)
+    last_transaction_id = data.Column(data.Integer, nullable=True) # Última transação de empréstimo/devolução do item
 
 
     def __init__(self, item_id, description, is_available, owner_id):
@@ -39,16 +47,167 @@ class ItemModel(data.Model):
     
 
     def save_item(self):
+        if inspect(self).key is None:
+            # Item novo: entra nos contadores do dono e nos globais, no mesmo commit
+            available = int(bool(self.is_available))
+            UserStatsModel.add(self.owner_id, items=1, available=available)
+            GlobalStatsModel.add(items=1, available=available)
         data.session.add(self)
         data.session.commit()
+        invalidate(item_key(self.item_id))
 
 
     def update_item(self, description, is_available):
+        # Item emprestado: a disponibilidade só muda na devolução
+        if self.current_holder_id is not None:
+            is_available = self.is_available
+        change = int(bool(is_available)) - int(bool(self.is_available))
+        if change:
+            UserStatsModel.add(self.owner_id, available=change)
+            GlobalStatsModel.add(available=change)
         self.description = description
         self.is_available = is_available
         self.save_item()
 
 
     def delete_item(self):
+        available = int(bool(self.is_available))
+        lent = int(self.current_holder_id is not None)
+        UserStatsModel.add(self.owner_id, items=-1, available=-available, lent=-lent)
+        UserStatsModel.add(self.current_holder_id, holding=-1)
+        GlobalStatsModel.add(items=-1, available=-available, lent=-lent)
         data.session.delete(self)
-        data.session.commit()
\ No newline at end of file
+        data.session.commit()
+        invalidate(item_key(self.item_id))
+
+
+    @classmethod
+    def release_holdings(cls, user_id):
+        """ Devolve aos donos, de uma vez, todos os itens emprestados ao usuário (exclusão do usuário).
+
+            Não registra transações de devolução nem faz commit: é um passo de 'UserModel.delete_user'.
+
+            Retorna:
+                list: 'item_id' dos itens devolvidos, para invalidar o cache depois do commit. """
+
+        # Só os itens ainda indisponíveis passam a contar como disponíveis
+        UserStatsModel.add_grouped(
+            'SELECT owner_id AS user_id, SUM(is_available = 0) AS available, -COUNT(*) AS lent FROM items '
+            'WHERE current_holder_id = :user_id GROUP BY owner_id', ('available', 'lent'), {'user_id': user_id})
+
+        table = cls.__table__
+        lent, unavailable = data.session.execute(
+            select(func.count(), func.count().filter(table.c.is_available == False))
+            .where(table.c.current_holder_id == user_id)).one()
+        if not lent:
+            return []
+
+        GlobalStatsModel.add(available=unavailable, lent=-lent)
+        return data.session.execute(
+            table.update()
+            .where(table.c.current_holder_id == user_id)
+            .values(is_available=True, current_holder_id=None)
+            .returning(table.c.item_id)).scalars().all()
+
+
+    @classmethod
+    def delete_owned_items(cls, user_id):
+        """ Apaga todos os itens de que o usuário é dono (exclusão do usuário), sem commit.
+
+            Quem estava com um desses itens emprestado deixa de tê-lo; o histórico em
+            'transactions' continua com o 'item_id'.
+
+            Retorna:
+                list: 'item_id' dos itens apagados, para invalidar o cache depois do commit. """
+
+        table = cls.__table__
+        items, available, lent = data.session.execute(
+            select(func.count(), func.count().filter(table.c.is_available == True), func.count(table.c.current_holder_id))
+            .where(table.c.owner_id == user_id)).one()
+        if not items:
+            return []
+
+        UserStatsModel.add_grouped(
+            'SELECT current_holder_id AS user_id, -COUNT(*) AS holding FROM items '
+            'WHERE owner_id = :user_id AND current_holder_id IS NOT NULL GROUP BY current_holder_id',
+            ('holding',), {'user_id': user_id})
+        GlobalStatsModel.add(items=-items, available=-available, lent=-lent)
+
+        return data.session.execute(
+            table.delete().where(table.c.owner_id == user_id).returning(table.c.item_id)).scalars().all()
+
+
+    # Item no formato da API, lido como tupla (sem montar o objeto ORM)
+    @classmethod
+    def find_record(cls, item_id):
+        row = data.session.execute(ITEM_BY_ID, {'item_id': item_id}).first()
+        return item_record(row) if row else None
+
+
+    # Itens emprestados no momento a um usuário (usa o índice de current_holder_id), no formato da API
+    @classmethod
+    def find_holdings(cls, user_id):
+        rows = data.session.execute(ITEMS_BY_HOLDER, {'user_id': user_id})
+        return [item_record(row) for row in rows]
+
+
+    # Busca o dono e o detentor de vários itens em uma única consulta (item_id IN (...))
+    @classmethod
+    def find_owners(cls, item_ids):
+        if not item_ids:
+            return {}
+        rows = data.session.query(cls.item_id, cls.owner_id, cls.current_holder_id).filter(cls.item_id.in_(item_ids)).all()
+        return {item_id: (owner_id, holder_id) for item_id, owner_id, holder_id in rows}
+
+
+    # Insere e atualiza um lote de itens com executemany e um único commit;
+    # a disponibilidade de um item emprestado não muda (só na devolução)
+    @classmethod
+    def save_items(cls, created, updated):
+        table = cls.__table__
+
+        # Variação dos contadores por dono: {owner_id: [itens, disponíveis]}
+        changes = {}
+
+        if created:
+            data.session.execute(table.insert(), created)
+            for row in created:
+                change = changes.setdefault(row['owner_id'], [0, 0])
+                change[0] += 1
+                change[1] += int(bool(row['is_available']))
+
+        if updated:
+            available = {row['item_id']: int(bool(row['is_available'])) for row in updated}
+            for item_id, owner_id, was_available, holder_id in data.session.execute(
+                    select(table.c.item_id, table.c.owner_id, table.c.is_available, table.c.current_holder_id)
+                    .where(table.c.item_id.in_(list(available)))):
+                if holder_id is None:
+                    changes.setdefault(owner_id, [0, 0])[1] += available[item_id] - int(bool(was_available))
+
+            data.session.execute(
+                table.update()
+                .where(table.c.item_id == bindparam('b_item_id'))
+                .values(description=bindparam('description'),
+                        is_available=case((table.c.current_holder_id.is_(None), bindparam('is_available')), else_=table.c.is_available)),
+                [{'b_item_id': row['item_id'], 'description': row['description'], 'is_available': row['is_available']}
+                 for row in updated])
+
+        for owner_id, (items, available) in changes.items():
+            if items or available:
+                UserStatsModel.add(owner_id, items=items, available=available)
+        if changes:
+            GlobalStatsModel.add(items=sum(items for items, _ in changes.values()),
+                                 available=sum(available for _, available in changes.values()))
+
+        data.session.commit()
+        invalidate(*[item_key(row['item_id']) for row in updated])
+
+
+# Bancos novos: o índice de busca ('items_fts') e seus triggers nascem junto com a tabela 'items'
+event.listen(ItemModel.__table__, 'after_create', lambda target, connection, **kw: create_search_index(connection))
+
+
+# Consultas das leituras no formato da API, montadas uma vez (o SQL compilado fica no cache do engine)
+ITEM_COLUMNS = [ItemModel.__table__.c[name] for name in ITEM_FIELDS]
+ITEM_BY_ID = select(*ITEM_COLUMNS).where(ItemModel.item_id == bindparam('item_id'))
+ITEMS_BY_HOLDER = select(*ITEM_COLUMNS).where(ItemModel.current_holder_id == bindparam('user_id')).order_by(ItemModel.item_id)
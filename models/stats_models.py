@@ -0,0 +1,188 @@
+from functools import lru_cache
+from sql_alchemy import data
+from sqlalchemy import text
+from partitions import transaction_source
+
+
+class GlobalStatsModel(data.Model):
+    """ Contadores do inventário inteiro, em uma única linha ('stats_id' = 1). """
+
+    __tablename__ = 'global_stats'
+
+    stats_id = data.Column(data.Integer, primary_key=True)
+    items = data.Column(data.Integer, nullable=False, server_default='0')
+    available = data.Column(data.Integer, nullable=False, server_default='0') # Itens com is_available verdadeiro
+    lent = data.Column(data.Integer, nullable=False, server_default='0') # Itens com detentor (current_holder_id)
+    users = data.Column(data.Integer, nullable=False, server_default='0')
+    transactions = data.Column(data.Integer, nullable=False, server_default='0')
+    loans = data.Column(data.Integer, nullable=False, server_default='0')
+    devolutions = data.Column(data.Integer, nullable=False, server_default='0')
+
+
+    def json(self):
+        return {name: getattr(self, name) for name in GLOBAL_COUNTERS}
+
+
+    @classmethod
+    def find(cls):
+        # Sem linha (banco novo), todos os contadores valem zero
+        return data.session.get(cls, 1) or cls(**{name: 0 for name in GLOBAL_COUNTERS})
+
+
+    @classmethod
+    def add(cls, **deltas):
+        """ Soma 'deltas' aos contadores globais, na transação atual (o commit fica com quem chamou). """
+
+        data.session.execute(upsert_statement(cls.__tablename__, 'stats_id', tuple(sorted(deltas))), dict(deltas, key=1))
+
+
+
+class UserStatsModel(data.Model):
+    """ Contadores de um usuário, como dono de itens e como quem pega emprestado. """
+
+    __tablename__ = 'user_stats'
+
+    user_id = data.Column(data.Integer, primary_key=True)
+    items = data.Column(data.Integer, nullable=False, server_default='0') # Itens de que é dono
+    available = data.Column(data.Integer, nullable=False, server_default='0') # Dos seus itens, os disponíveis
+    lent = data.Column(data.Integer, nullable=False, server_default='0') # Dos seus itens, os emprestados
+    holding = data.Column(data.Integer, nullable=False, server_default='0') # Itens de outros emprestados a ele
+    loans = data.Column(data.Integer, nullable=False, server_default='0') # Empréstimos que recebeu
+    devolutions = data.Column(data.Integer, nullable=False, server_default='0') # Devoluções que fez
+
+
+    @classmethod
+    def find(cls, user_id):
+        return data.session.get(cls, user_id)
+
+
+    @classmethod
+    def add(cls, user_id, **deltas):
+        """ Soma 'deltas' aos contadores do usuário, criando a linha se preciso, na transação atual. """
+
+        if user_id is None:
+            return
+        data.session.execute(upsert_statement(cls.__tablename__, 'user_id', tuple(sorted(deltas))), dict(deltas, key=user_id))
+
+
+    @classmethod
+    def add_grouped(cls, grouped, names, parameters):
+        """ Soma a vários usuários, em um único UPDATE ... FROM, os deltas de uma consulta agrupada.
+
+            Parâmetros:
+                grouped (str): SELECT com a coluna 'user_id' e uma coluna para cada contador de 'names'.
+                names (tuple): Contadores alterados.
+                parameters (dict): Valores dos parâmetros de 'grouped'. """
+
+        data.session.execute(text('UPDATE user_stats SET {} FROM ({}) AS delta WHERE user_stats.user_id = delta.user_id'.format(
+            ', '.join('{0} = user_stats.{0} + delta.{0}'.format(name) for name in names), grouped)), parameters)
+
+
+    @classmethod
+    def remove(cls, user_id):
+        # Usado na exclusão do usuário: itens e transações já não apontam mais para ele
+        data.session.execute(text('DELETE FROM user_stats WHERE user_id = :user_id'), {'user_id': user_id})
+
+
+GLOBAL_COUNTERS = ('items', 'available', 'lent', 'users', 'transactions', 'loans', 'devolutions')
+USER_COUNTERS = ('items', 'available', 'lent', 'holding', 'loans', 'devolutions')
+
+
+@lru_cache(maxsize=None)
+def upsert_statement(table, key, names):
+    # INSERT ... ON CONFLICT DO UPDATE somando os deltas; um SQL por tabela e combinação de contadores
+    return text('INSERT INTO {0} ({1}, {2}) VALUES (:key, {3}) ON CONFLICT ({1}) DO UPDATE SET {4}'.format(
+        table, key, ', '.join(names), ', '.join(':' + name for name in names),
+        ', '.join('{0} = {0} + excluded.{0}'.format(name) for name in names)))
+
+
+def compute_stats(connection):
+    """ Recalcula todos os contadores a partir de 'items', 'transactions' e 'users'.
+
+        Custa uma leitura completa das tabelas; usado por 'flask stats-check' e pela migração
+        que cria as tabelas de contadores, nunca pelas requisições. As transações vêm da
+        tabela quente, das partições online e, dos meses arquivados, dos totais guardados
+        no catálogo ('partitions.py').
+
+        Retorna:
+            tuple: (contadores globais: dict, contadores por usuário: {user_id: dict}). """
+
+    users = {}
+
+    def counters(user_id):
+        return users.setdefault(user_id, dict.fromkeys(USER_COUNTERS, 0))
+
+    for owner_id, items, available, lent in connection.execute(text(
+            'SELECT owner_id, COUNT(*), SUM(is_available), SUM(current_holder_id IS NOT NULL) FROM items '
+            'WHERE owner_id IS NOT NULL GROUP BY owner_id')):
+        counters(owner_id).update(items=items, available=int(available or 0), lent=int(lent or 0))
+
+    for holder_id, holding in connection.execute(text(
+            'SELECT current_holder_id, COUNT(*) FROM items WHERE current_holder_id IS NOT NULL GROUP BY current_holder_id')):
+        counters(holder_id)['holding'] = holding
+
+    source = transaction_source(connection)
+
+    for user_id, loans in connection.execute(text(
+            'SELECT to_user_id, COUNT(*) FROM {} WHERE is_available = 0 AND to_user_id IS NOT NULL GROUP BY to_user_id'.format(source))):
+        counters(user_id)['loans'] = loans
+
+    for user_id, devolutions in connection.execute(text(
+            'SELECT from_user_id, COUNT(*) FROM {} WHERE is_available = 1 AND from_user_id IS NOT NULL GROUP BY from_user_id'.format(source))):
+        counters(user_id)['devolutions'] = devolutions
+
+    for user_id, loans, devolutions in connection.execute(text(
+            'SELECT user_id, SUM(loans), SUM(devolutions) FROM transaction_partition_users GROUP BY user_id')):
+        counters(user_id)['loans'] += loans
+        counters(user_id)['devolutions'] += devolutions
+
+    items, available, lent = connection.execute(text(
+        'SELECT COUNT(*), SUM(is_available), SUM(current_holder_id IS NOT NULL) FROM items')).one()
+    transactions, loans, devolutions = connection.execute(text(
+        'SELECT COUNT(*), SUM(is_available = 0), SUM(is_available = 1) FROM {}'.format(source))).one()
+    archived = connection.execute(text(
+        "SELECT SUM(rows), SUM(loans), SUM(devolutions) FROM transaction_partitions WHERE state = 'archived'")).one()
+    transactions += archived[0] or 0
+    loans = (loans or 0) + (archived[1] or 0)
+    devolutions = (devolutions or 0) + (archived[2] or 0)
+
+    totals = {
+        'items': items, 'available': int(available or 0), 'lent': int(lent or 0),
+        'users': connection.execute(text('SELECT COUNT(*) FROM users')).scalar(),
+        'transactions': transactions, 'loans': int(loans or 0), 'devolutions': int(devolutions or 0),
+    }
+    return totals, users
+
+
+def stored_stats(connection):
+    """ Lê os contadores gravados, no mesmo formato de 'compute_stats'. """
+
+    row = connection.execute(text('SELECT {} FROM global_stats WHERE stats_id = 1'.format(', '.join(GLOBAL_COUNTERS)))).first()
+    totals = dict(zip(GLOBAL_COUNTERS, row)) if row else dict.fromkeys(GLOBAL_COUNTERS, 0)
+
+    users = {row[0]: dict(zip(USER_COUNTERS, row[1:])) for row in connection.execute(text(
+        'SELECT user_id, {} FROM user_stats'.format(', '.join(USER_COUNTERS))))}
+    return totals, users
+
+
+def rebuild_stats(connection):
+    """ Regrava os contadores a partir do zero com os valores de 'compute_stats'.
+
+        Parâmetros:
+            connection: Conexão SQLAlchemy já dentro de uma transação.
+
+        Retorna:
+            int: Quantidade de usuários com contadores. """
+
+    totals, users = compute_stats(connection)
+
+    connection.execute(text('DELETE FROM global_stats'))
+    connection.execute(text('INSERT INTO global_stats (stats_id, {}) VALUES (1, {})'.format(
+        ', '.join(GLOBAL_COUNTERS), ', '.join(':' + name for name in GLOBAL_COUNTERS))), totals)
+
+    connection.execute(text('DELETE FROM user_stats'))
+    if users:
+        connection.execute(text('INSERT INTO user_stats (user_id, {}) VALUES (:user_id, {})'.format(
+            ', '.join(USER_COUNTERS), ', '.join(':' + name for name in USER_COUNTERS))),
+            [dict(values, user_id=user_id) for user_id, values in users.items()])
+    return len(users)
@@ -1,6 +1,12 @@
 from sql_alchemy import data
-from sqlalchemy.orm import relationship
+from sqlalchemy import bindparam, insert, select, text
+from sqlalchemy.orm import backref, relationship
+from models.item_models import ItemModel
 from date import Time
+from cache import invalidate, item_key
+from serialization import TRANSACTION_FIELDS
+from partitions import forget_user, transaction_source
+from models.stats_models import GlobalStatsModel, UserStatsModel
 
 
 class TransactionModel(data.Model):
@@ -9,14 +15,22 @@ class TransactionModel(data.Model):
 
     transaction_id = data.Column(data.Integer, primary_key=True)
     item_id = data.Column(data.Integer, nullable=True) # Puxa o id do item da tabela items
-    from_user_id = data.Column(data.Integer, data.ForeignKey('users.user_id'), nullable=True) # Puxa o id de um usuario da tabela user
-    to_user_id = data.Column(data.Integer, data.ForeignKey('users.user_id'), nullable=True) # # Puxa o id de um usuario da tabela user
+    from_user_id = data.Column(data.Integer, data.ForeignKey('users.user_id'), nullable=True, index=True) # Puxa o id de um usuario da tabela user
+    to_user_id = data.Column(data.Integer, data.ForeignKey('users.user_id'), nullable=True, index=True) # # Puxa o id de um usuario da tabela user
     is_available = data.Column(data.Boolean, default=True)
-    date = data.Column(data.String(20), default=lambda: Time.register_time())
+    created_at = data.Column(data.Integer, default=lambda: Time.epoch(), index=True) # Segundos desde a época (UTC), usados nos filtros por data
+    date = data.Column(data.String(20), default=lambda context: Time.format_epoch(context.get_current_parameters()['created_at'])) # Exibição de 'created_at' (dd/mm/yyyy HH:MM:SS)
 
+    __table_args__ = (
+        # Atende a busca do último empréstimo de um item (item_id = ? ORDER BY transaction_id DESC)
+        data.Index('ix_transactions_item_id_transaction_id', item_id, transaction_id.desc()),
+        # Chaves nunca reaproveitadas, mesmo quando a rotação das partições esvazia a tabela quente
+        {'sqlite_autoincrement': True},
+    )
 
-    from_user = relationship('UserModel', foreign_keys=[from_user_id], backref='from_transactions') # Cria a relação da tabela users com o from_user_id
-    to_user = relationship('UserModel', foreign_keys=[to_user_id], backref='to_transactions') # Cria a relação da tabela users com o to_user_id
+    # passive_deletes='all': excluir o usuário não carrega as transações dele (ver 'delete_user_transaction')
+    from_user = relationship('UserModel', foreign_keys=[from_user_id], backref=backref('from_transactions', passive_deletes='all')) # Cria a relação da tabela users com o from_user_id
+    to_user = relationship('UserModel', foreign_keys=[to_user_id], backref=backref('to_transactions', passive_deletes='all')) # Cria a relação da tabela users com o to_user_id
 
     
     def __init__(self, item_id, from_user_id, to_user_id, is_available):
@@ -47,10 +61,236 @@ class TransactionModel(data.Model):
         self.save_transaction()
 
 
-
-    # Deleta os valores de user na tabela transactions
+    # Deleta os valores de user na tabela transactions e nas partições, com UPDATEs pelos índices e sem commit
+    # (faz parte da exclusão do usuário, 'UserModel.delete_user')
     @classmethod
     def delete_user_transaction(cls, user_id):
-        data.session.query(cls).filter_by(from_user_id=user_id).update({"from_user_id": None})
-        data.session.query(cls).filter_by(to_user_id=user_id).update({"to_user_id": None})
-        data.session.commit()
\ No newline at end of file
+        transactions = cls.__table__
+        data.session.execute(transactions.update().where(transactions.c.from_user_id == user_id).values(from_user_id=None))
+        data.session.execute(transactions.update().where(transactions.c.to_user_id == user_id).values(to_user_id=None))
+        forget_user(data.session, user_id)
+
+
+    @classmethod
+    def register_loan(cls, item_id, user_id):
+        """ Empresta o item ao usuário em uma única transação do banco, com um único commit.
+
+            A reserva é um UPDATE condicional (só altera se o item estiver disponível, sem
+            detentor e não for do próprio usuário), então dois empréstimos simultâneos do mesmo item não
+            passam juntos: apenas um UPDATE afeta a linha. O mesmo UPDATE grava o novo
+            detentor ('current_holder_id') e, depois do INSERT, 'last_transaction_id'.
+            Os contadores de '/stats' são atualizados no mesmo commit.
+
+            Retorna:
+                tuple: (transação criada ou None, motivo da recusa: 'not_found', 'owner',
+                'unavailable' ou None em caso de sucesso). """
+
+        items = ItemModel.__table__
+        claimed = data.session.execute(
+            items.update()
+            .where(items.c.item_id == item_id, items.c.is_available == True, items.c.current_holder_id.is_(None),
+                   items.c.owner_id != user_id)
+            .values(is_available=False, current_holder_id=user_id)).rowcount
+
+        if claimed != 1:
+            data.session.rollback()
+            item = ItemModel.find_item(item_id)
+            if not item:
+                return None, 'not_found'
+            if item.owner_id == user_id:
+                return None, 'owner'
+            return None, 'unavailable'
+
+        owner_id = data.session.execute(
+            select(items.c.owner_id).where(items.c.item_id == item_id)).scalar()
+
+        UserStatsModel.add(owner_id, available=-1, lent=1)
+        UserStatsModel.add(user_id, holding=1, loans=1)
+        GlobalStatsModel.add(available=-1, lent=1, transactions=1, loans=1)
+
+        transaction = cls(item_id=item_id, from_user_id=owner_id, to_user_id=user_id, is_available=False)
+        cls._append(transaction)
+        return transaction, None
+
+
+    @classmethod
+    def register_devolution(cls, item_id, user_id):
+        """ Devolve o item ao dono em uma única transação do banco, com um único commit.
+
+            O detentor atual vem de 'items.current_holder_id', sem consultar o histórico:
+            o UPDATE condicional só libera o item se ele estiver emprestado ao usuário.
+            Os contadores de '/stats' são atualizados no mesmo commit.
+
+            Retorna:
+                tuple: (transação criada ou None, motivo da recusa: 'not_found', 'no_loan',
+                'not_holder' ou None em caso de sucesso). """
+
+        items = ItemModel.__table__
+        released = data.session.execute(
+            items.update()
+            .where(items.c.item_id == item_id, items.c.is_available == False, items.c.current_holder_id == user_id)
+            .values(is_available=True, current_holder_id=None)).rowcount
+
+        if released != 1:
+            data.session.rollback()
+            item = ItemModel.find_item(item_id)
+            if not item:
+                return None, 'not_found'
+            if item.last_transaction_id is None:
+                return None, 'no_loan'
+            return None, 'not_holder'
+
+        owner_id = data.session.execute(
+            select(items.c.owner_id).where(items.c.item_id == item_id)).scalar()
+
+        UserStatsModel.add(owner_id, available=1, lent=-1)
+        UserStatsModel.add(user_id, holding=-1, devolutions=1)
+        GlobalStatsModel.add(available=1, lent=-1, transactions=1, devolutions=1)
+
+        transaction = cls(item_id=item_id, from_user_id=user_id, to_user_id=owner_id, is_available=True)
+        cls._append(transaction)
+        return transaction, None
+
+
+    @classmethod
+    def register_batch(cls, item_ids, user_id, loan, atomic):
+        """ Empresta (ou devolve) vários itens em uma única transação do banco, com um único commit.
+
+            Os itens são lidos com uma única consulta IN e validados juntos, com os mesmos motivos
+            de recusa de 'register_loan'/'register_devolution' (o detentor vem de
+            'current_holder_id', sem consultar o histórico). A reserva é um único UPDATE
+            condicional com IN, que continua protegendo contra pedidos simultâneos: um item
+            que mudou depois da leitura fica de fora do UPDATE e é recusado. As transações
+            entram com um INSERT de várias linhas (RETURNING) e 'last_transaction_id' com
+            executemany. Os contadores de '/stats' são atualizados no mesmo commit.
+
+            Parâmetros:
+                item_ids (list): IDs dos itens, sem repetição.
+                user_id (int): Usuário autenticado (quem pega emprestado ou quem devolve).
+                loan (bool): True para empréstimos, False para devoluções.
+                atomic (bool): Se True, qualquer recusa desfaz o lote inteiro; senão, grava os
+                    itens aceitos e recusa só os demais.
+
+            Retorna:
+                tuple: (transações criadas {item_id: linha em TRANSACTION_FIELDS},
+                recusas {item_id: motivo, como em 'register_loan'/'register_devolution'}). """
+
+        items = ItemModel.__table__
+        found = {row.item_id: row for row in data.session.execute(
+            select(items.c.item_id, items.c.owner_id, items.c.is_available, items.c.current_holder_id, items.c.last_transaction_id)
+            .where(items.c.item_id.in_(item_ids)))}
+
+        refused = {}
+        for item_id in item_ids:
+            reason = batch_refusal(found.get(item_id), user_id, loan)
+            if reason:
+                refused[item_id] = reason
+
+        accepted = [item_id for item_id in item_ids if item_id not in refused]
+        if not accepted or (refused and atomic):
+            data.session.rollback()
+            return {}, refused
+
+        if loan:
+            guard = (items.c.is_available == True, items.c.current_holder_id.is_(None), items.c.owner_id != user_id)
+            values = {'is_available': False, 'current_holder_id': user_id}
+        else:
+            guard = (items.c.is_available == False, items.c.current_holder_id == user_id)
+            values = {'is_available': True, 'current_holder_id': None}
+
+        owners = dict(data.session.execute(
+            items.update().where(items.c.item_id.in_(accepted), *guard).values(**values)
+            .returning(items.c.item_id, items.c.owner_id)).all())
+
+        # Mudou entre a leitura e o UPDATE (outro pedido chegou antes)
+        for item_id in accepted:
+            if item_id not in owners:
+                refused[item_id] = 'unavailable' if loan else 'not_holder'
+
+        if not owners or (refused and atomic):
+            data.session.rollback()
+            return {}, refused
+
+        moved = [item_id for item_id in accepted if item_id in owners]
+        sign = -1 if loan else 1
+        per_owner = {}
+        for item_id in moved:
+            per_owner[owners[item_id]] = per_owner.get(owners[item_id], 0) + 1
+        for owner_id, count in per_owner.items():
+            UserStatsModel.add(owner_id, available=sign * count, lent=-sign * count)
+        if loan:
+            UserStatsModel.add(user_id, holding=len(moved), loans=len(moved))
+            GlobalStatsModel.add(available=-len(moved), lent=len(moved), transactions=len(moved), loans=len(moved))
+        else:
+            UserStatsModel.add(user_id, holding=-len(moved), devolutions=len(moved))
+            GlobalStatsModel.add(available=len(moved), lent=-len(moved), transactions=len(moved), devolutions=len(moved))
+
+        transactions = cls.__table__
+        rows = data.session.execute(
+            insert(transactions).returning(*[transactions.c[name] for name in TRANSACTION_FIELDS], sort_by_parameter_order=True),
+            [{'item_id': item_id,
+              'from_user_id': owners[item_id] if loan else user_id,
+              'to_user_id': user_id if loan else owners[item_id],
+              'is_available': not loan} for item_id in moved]).all()
+
+        data.session.execute(
+            items.update().where(items.c.item_id == bindparam('b_item_id')).values(last_transaction_id=bindparam('b_transaction_id')),
+            [{'b_item_id': row[1], 'b_transaction_id': row[0]} for row in rows])
+        data.session.commit()
+        invalidate(*[item_key(item_id) for item_id in moved])
+        return {row[1]: row for row in rows}, refused
+
+
+    # Insere a transação e aponta 'last_transaction_id' do item para ela, no mesmo commit
+    @classmethod
+    def _append(cls, transaction):
+        items = ItemModel.__table__
+        data.session.add(transaction)
+        data.session.flush()
+        data.session.execute(
+            items.update()
+            .where(items.c.item_id == transaction.item_id)
+            .values(last_transaction_id=transaction.transaction_id))
+        data.session.commit()
+        invalidate(item_key(transaction.item_id))
+
+
+    @classmethod
+    def backfill_holdings(cls, connection):
+        """ Recalcula 'current_holder_id' e 'last_transaction_id' de todos os itens a partir das transações.
+
+            Usa a última transação de cada item (índice item_id, transaction_id DESC): se ela
+            deixou o item indisponível, o detentor é o 'to_user_id'; senão o item está com o dono.
+            Lê a tabela quente e as partições online ('transaction_source').
+
+            Parâmetros:
+                connection: Conexão SQLAlchemy já dentro de uma transação.
+
+            Retorna:
+                int: Quantidade de itens atualizados. """
+
+        source = transaction_source(connection)
+        return connection.execute(text("""
+            UPDATE items SET
+                last_transaction_id = (
+                    SELECT t.transaction_id FROM {0} t
+                    WHERE t.item_id = items.item_id
+                    ORDER BY t.transaction_id DESC LIMIT 1),
+                current_holder_id = (
+                    SELECT CASE WHEN t.is_available = 0 THEN t.to_user_id END FROM {0} t
+                    WHERE t.item_id = items.item_id
+                    ORDER BY t.transaction_id DESC LIMIT 1)
+        """.format(source))).rowcount
+
+
+def batch_refusal(item, user_id, loan):
+    # Motivo da recusa de um item do lote ('register_batch'), ou None se ele pode ser movido
+    if item is None:
+        return 'not_found'
+    if loan:
+        if item.owner_id == user_id:
+            return 'owner'
+        return None if item.is_available and item.current_holder_id is None else 'unavailable'
+    if not item.is_available and item.current_holder_id == user_id:
+        return None
+    return 'no_loan' if item.last_transaction_id is None else 'not_holder'
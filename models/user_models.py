@@ -1,4 +1,10 @@
 from sql_alchemy import data
+from cache import invalidate, item_key, user_key
+from serialization import USER_FIELDS, user_record
+from models.item_models import ItemModel
+from models.stats_models import GlobalStatsModel, UserStatsModel
+from models.transaction_models import TransactionModel
+from sqlalchemy import bindparam, inspect, select
 from sqlalchemy.orm import relationship
 
 
@@ -8,11 +14,12 @@ class UserModel(data.Model):
 
     user_id = data.Column(data.Integer, primary_key=True)
     username = data.Column(data.String(20))
-    login = data.Column(data.String(40))
-    password = data.Column(data.String(40))
+    login = data.Column(data.String(40), unique=True, index=True)
+    password = data.Column(data.String(255)) # Hash no formato de 'passwords.py'
 
-    sent_transactions = relationship("TransactionModel", foreign_keys='TransactionModel.from_user_id') # Cria relação com a tabela transactions
-    received_transactions = relationship("TransactionModel", foreign_keys='TransactionModel.to_user_id') # Cria relação com a tabela transactions
+    # passive_deletes='all': o 'session.delete' do usuário não carrega as transações (ver 'delete_user')
+    sent_transactions = relationship("TransactionModel", foreign_keys='TransactionModel.from_user_id', passive_deletes='all') # Cria relação com a tabela transactions
+    received_transactions = relationship("TransactionModel", foreign_keys='TransactionModel.to_user_id', passive_deletes='all') # Cria relação com a tabela transactions
 
     def __init__(self, username, login, password):
         self.username = username
@@ -36,6 +43,12 @@ class UserModel(data.Model):
             return user
         return None
     
+    # Usuário no formato da API, lido como tupla (sem montar o objeto ORM)
+    @classmethod
+    def find_record(cls, user_id):
+        row = data.session.execute(USER_BY_ID, {'user_id': user_id}).first()
+        return user_record(row) if row else None
+    
     # Acha o usuario pelo login
     @classmethod
     def find_by_login(cls, login):
@@ -46,14 +59,41 @@ class UserModel(data.Model):
     
 
     def save_user(self):
+        if inspect(self).key is None:
+            GlobalStatsModel.add(users=1)
         data.session.add(self)
         data.session.commit()
 
 
+    # Troca o hash da senha (ex.: refeito no login com outro custo ou a partir de texto puro)
+    def update_password(self, password):
+        self.password = password
+        self.save_user()
+
+
     def update_user(self,user):
         self.user = user
 
 
     def delete_user(self):
+        """ Exclui o usuário e o que depende dele em uma única transação do banco, com um único commit.
+
+            Cada passo é um comando sobre o conjunto de linhas, pelos índices, sem carregar
+            objetos: os itens emprestados a ele voltam aos donos, os itens de que é dono são
+            apagados, as transações perdem a referência a ele ('from_user_id'/'to_user_id'
+            viram None) e os contadores de '/stats' são ajustados. Os relacionamentos com
+            'transactions' usam passive_deletes='all', então o 'session.delete' não as lê. """
+
+        user_id = self.user_id
+        released = ItemModel.release_holdings(user_id)
+        deleted = ItemModel.delete_owned_items(user_id)
+        TransactionModel.delete_user_transaction(user_id)
+        UserStatsModel.remove(user_id)
+        GlobalStatsModel.add(users=-1)
         data.session.delete(self)
-        data.session.commit()
\ No newline at end of file
+        data.session.commit()
+        invalidate(user_key(user_id), *[item_key(item_id) for item_id in released + deleted])
+
+
+# Leitura no formato da API, montada uma vez (o SQL compilado fica no cache do engine)
+USER_BY_ID = select(*[UserModel.__table__.c[name] for name in USER_FIELDS]).where(UserModel.user_id == bindparam('user_id'))
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from werkzeug.exceptions import BadRequest
+
+SORT_ORDERS = ("asc", "desc")
+
+# Ordenações que podem vir em um cursor; 'relevance' é a da busca textual ('q')
+CURSOR_ORDERS = SORT_ORDERS + ("relevance",)
+
+# Maior página das listagens; um 'limit' maior é reduzido a este valor
+MAX_LIMIT = 1000
+
+# Maior exportação em streaming ('format=ndjson|csv'), com ou sem 'limit'
+MAX_EXPORT_LIMIT = 100000
+
+
+def sort_order(value):
+    """ Valida a direção de ordenação da paginação.
+
+        Parâmetros:
+            value (str): 'asc' ou 'desc' (sem diferenciar maiúsculas).
+
+        Retorna:
+            str: A direção normalizada em minúsculas.
+
+        Levanta:
+            BadRequest: Se o valor não for 'asc' nem 'desc'. """
+
+    if isinstance(value, str) and value.lower() in SORT_ORDERS:
+        return value.lower()
+    raise BadRequest("The value must be 'asc' or 'desc'.")
+
+
+def page_limit(limit):
+    """ Mantém o 'limit' pedido entre 0 e 'MAX_LIMIT'.
+
+        Um 'limit' negativo viraria 'LIMIT -1' no SQLite, que não limita nada.
+
+        Parâmetros:
+            limit (int): Tamanho da página pedido pelo cliente.
+
+        Retorna:
+            int: O tamanho da página usado na consulta. """
+
+    return min(max(limit, 0), MAX_LIMIT)
+
+
+def export_limit(limit=None):
+    """ Mantém o 'limit' de uma exportação entre 0 e 'MAX_EXPORT_LIMIT'.
+
+        A exportação usa memória constante, mas ocupa uma conexão e uma vaga de
+        concorrência enquanto é lida; sem teto, um 'limit' enorme (ou nenhum) a manteria
+        presa pelo tempo que o cliente quisesse.
+
+        Parâmetros:
+            limit (int | None): Quantidade de linhas pedida; None exporta até o teto.
+
+        Retorna:
+            int: A quantidade de linhas usada na consulta. """
+
+    if limit is None:
+        return MAX_EXPORT_LIMIT
+    return min(max(limit, 0), MAX_EXPORT_LIMIT)
+
+
+def encode_cursor(last_id, sort="asc"):
+    """ Gera o cursor opaco que aponta para a página seguinte a 'last_id'.
+
+        Parâmetros:
+            last_id (int): Chave primária da última linha devolvida (na ordenação
+                'relevance', o OFFSET da página seguinte).
+            sort (str): Direção da ordenação usada na página.
+
+        Retorna:
+            str: Cursor codificado em base64 seguro para URL. """
+
+    payload = json.dumps({"after": last_id, "sort": sort}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ Decodifica um cursor gerado por 'encode_cursor'.
+
+        Parâmetros:
+            cursor (str): Cursor recebido na query string.
+
+        Retorna:
+            dict: {'after': int, 'sort': 'asc' | 'desc' | 'relevance'}.
+
+        Levanta:
+            BadRequest: Se o cursor estiver malformado. """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        after = payload["after"]
+        sort = payload["sort"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise BadRequest("Invalid cursor.")
+
+    if not isinstance(after, int) or sort not in CURSOR_ORDERS:
+        raise BadRequest("Invalid cursor.")
+
+    return {"after": after, "sort": sort}
+
+
+def search_boundary(rows):
+    """ Chave em que a busca continua depois dos resultados ranqueados por relevância.
+
+        Parâmetros:
+            rows (list): Linhas de 'ListQuery.ranked_boundary': a menor chave ranqueada e,
+                se houver, a maior das que ficaram de fora.
+
+        Retorna:
+            int | None: A menor chave ranqueada, ou None se todos os resultados foram ranqueados. """
+
+    return rows[0][0] if len(rows) == 2 else None
+
+
+def paginate(rows, limit, key_index, sort, offset=0, boundary=None):
+    """ Corta a linha extra buscada pela consulta ('ListQuery.build') e gera o próximo cursor.
+
+        Parâmetros:
+            rows (list): Linhas retornadas pela consulta (até limit + 1).
+            limit (int): Tamanho da página pedido pelo cliente.
+            key_index (int): Posição da chave primária na linha.
+            sort (str): Direção da ordenação usada.
+            offset (int): OFFSET da página atual; usado só na ordenação 'relevance'.
+            boundary (int, opcional): 'search_boundary' da busca. Acabados os resultados
+                ranqueados, o próximo cursor segue pelos demais em ordem 'desc' de chave,
+                a partir dela, e nenhum resultado fica de fora.
+
+        Retorna:
+            tuple: (linhas da página, next_cursor ou None). """
+
+    if limit <= 0:
+        return [], None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if sort == "relevance":
+            return rows, encode_cursor(offset + limit, sort)
+        return rows, encode_cursor(rows[-1][key_index], sort)
+    if sort == "relevance" and boundary is not None:
+        return rows, encode_cursor(boundary, "desc")
+    return rows, None
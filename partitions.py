@@ -0,0 +1,363 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from functools import lru_cache
+from sqlalchemy import Boolean, Column, Index, Integer, MetaData, String, Table, select, text
+from sqlalchemy.schema import CreateTable
+from sql_alchemy import data
+from versions import bump_version
+
+""" Armazenamento particionado por mês do histórico de 'transactions'.
+
+    A tabela 'transactions' é a partição quente: todas as escritas continuam indo para ela
+    (empréstimos, devoluções, lotes), só por INSERT. 'flask transactions-rotate' move os
+    meses fechados mais antigos para uma tabela por mês ('transactions_2025_06', pelo
+    'created_at' em UTC), com as mesmas colunas e índices, e registra cada partição em
+    'transaction_partitions' (intervalo de datas, primeiro e último 'transaction_id',
+    totais). 'flask transactions-archive' grava as partições frias em um arquivo SQLite
+    comprimido com gzip, tira a tabela do banco e guarda no catálogo os totais (e, por
+    usuário, em 'transaction_partition_users') que os contadores de '/stats' usam.
+    'flask transactions-restore' traz um mês arquivado de volta.
+
+    Em '/transactions', o 'PartitionRouter' lê o catálogo e consulta só as partições que
+    podem ter linhas para os filtros (intervalo de datas, 'transaction_id', posição do
+    cursor): cada uma vira um ramo de um UNION ALL ordenado pela chave, que o SQLite
+    percorre em merge e para no LIMIT. Uma partição inteira dentro do intervalo de datas
+    dispensa o filtro de 'created_at' e é lida na ordem da chave, sem ordenação. Meses
+    arquivados no intervalo não são lidos e voltam na resposta ('archived_months'). """
+
+
+# Mesmas colunas de 'TransactionModel', sem as chaves estrangeiras (o histórico sobrevive ao usuário)
+PARTITION_COLUMNS = ("transaction_id", "item_id", "from_user_id", "to_user_id", "is_available", "created_at", "date")
+HOT_TABLE = "transactions"
+
+transaction_partitions = data.Table(
+    'transaction_partitions',
+    data.Column('month', data.String(7), primary_key=True), # 'YYYY-MM' (UTC)
+    data.Column('table_name', data.String(40), nullable=False),
+    data.Column('starts_at', data.Integer, nullable=False), # Intervalo [starts_at, ends_at) de 'created_at'
+    data.Column('ends_at', data.Integer, nullable=False),
+    data.Column('first_id', data.Integer),
+    data.Column('last_id', data.Integer),
+    data.Column('rows', data.Integer, nullable=False, server_default='0'),
+    data.Column('loans', data.Integer, nullable=False, server_default='0'),
+    data.Column('devolutions', data.Integer, nullable=False, server_default='0'),
+    data.Column('state', data.String(10), nullable=False, server_default='online'), # 'online' ou 'archived'
+    data.Column('archive_path', data.String(255)),
+)
+
+# Empréstimos e devoluções por usuário dos meses arquivados (o que sai do banco com o arquivo)
+transaction_partition_users = data.Table(
+    'transaction_partition_users',
+    data.Column('month', data.String(7), primary_key=True),
+    data.Column('user_id', data.Integer, primary_key=True, index=True),
+    data.Column('loans', data.Integer, nullable=False, server_default='0'),
+    data.Column('devolutions', data.Integer, nullable=False, server_default='0'),
+)
+
+PARTITION_CATALOG = text(
+    "SELECT month, table_name, starts_at, ends_at, first_id, last_id, state FROM transaction_partitions ORDER BY starts_at")
+
+
+@lru_cache(maxsize=None)
+def partition_table(name):
+    """ Tabela de uma partição (ou do arquivo de um mês arquivado), com os índices das listagens.
+
+        Parâmetros:
+            name (str): Nome da tabela, por exemplo 'transactions_2025_06'.
+
+        Retorna:
+            Table: Tabela SQLAlchemy fora do 'data.metadata' (o 'create_all' não a cria). """
+
+    table = Table(
+        name, MetaData(),
+        Column('transaction_id', Integer, primary_key=True),
+        Column('item_id', Integer),
+        Column('from_user_id', Integer),
+        Column('to_user_id', Integer),
+        Column('is_available', Boolean),
+        Column('created_at', Integer),
+        Column('date', String(20)),
+    )
+    Index('ix_{}_item_id_transaction_id'.format(name), table.c.item_id, table.c.transaction_id.desc())
+    Index('ix_{}_from_user_id'.format(name), table.c.from_user_id)
+    Index('ix_{}_to_user_id'.format(name), table.c.to_user_id)
+    Index('ix_{}_created_at'.format(name), table.c.created_at)
+    return table
+
+
+def month_name(moment):
+    # Segundos desde a época -> 'YYYY-MM' (UTC)
+    return datetime.fromtimestamp(moment, timezone.utc).strftime("%Y-%m")
+
+
+def month_bounds(month):
+    """ Intervalo [início, fim) de um mês 'YYYY-MM' (UTC), em segundos desde a época. """
+
+    year, number = int(month[:4]), int(month[5:7])
+    start = datetime(year, number, 1, tzinfo=timezone.utc)
+    end = datetime(year + number // 12, number % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def recent_months_start(months, now):
+    # Início do mais antigo dos 'months' meses mais recentes (o atual conta como um)
+    moment = datetime.fromtimestamp(now, timezone.utc)
+    index = moment.year * 12 + moment.month - 1 - (months - 1)
+    return int(datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def table_name(month):
+    return "{}_{}".format(HOT_TABLE, month.replace("-", "_"))
+
+
+def online_tables(connection):
+    # Partições no banco, da mais antiga para a mais nova
+    return [row[0] for row in connection.execute(
+        text("SELECT table_name FROM transaction_partitions WHERE state = 'online' ORDER BY starts_at"))]
+
+
+def transaction_source(connection):
+    """ Fonte SQL com todas as transações no banco (partições e tabela quente), para consultas de manutenção.
+
+        Retorna:
+            str: 'transactions' sem partições; senão um UNION ALL entre parênteses, usável em 'FROM'. """
+
+    tables = online_tables(connection)
+    if not tables:
+        return HOT_TABLE
+    columns = ", ".join(PARTITION_COLUMNS)
+    return "({})".format(" UNION ALL ".join("SELECT {} FROM {}".format(columns, table) for table in tables + [HOT_TABLE]))
+
+
+def refresh_partition(connection, month):
+    # Recalcula no catálogo o intervalo de chaves e os totais da partição
+    first_id, last_id, rows, loans, devolutions = connection.execute(text(
+        "SELECT MIN(transaction_id), MAX(transaction_id), COUNT(*), SUM(is_available = 0), SUM(is_available = 1) FROM {}".format(
+            table_name(month)))).one()
+    starts_at, ends_at = month_bounds(month)
+    connection.execute(text(
+        "INSERT INTO transaction_partitions (month, table_name, starts_at, ends_at, first_id, last_id, rows, loans, devolutions, state) "
+        "VALUES (:month, :table_name, :starts_at, :ends_at, :first_id, :last_id, :rows, :loans, :devolutions, 'online') "
+        "ON CONFLICT (month) DO UPDATE SET first_id = excluded.first_id, last_id = excluded.last_id, rows = excluded.rows, "
+        "loans = excluded.loans, devolutions = excluded.devolutions, state = 'online'"), {
+            'month': month, 'table_name': table_name(month), 'starts_at': starts_at, 'ends_at': ends_at,
+            'first_id': first_id, 'last_id': last_id, 'rows': rows, 'loans': int(loans or 0), 'devolutions': int(devolutions or 0)})
+
+
+def rotate_partitions(connection, hot_months=2, now=None):
+    """ Move da tabela quente para as partições mensais os meses fechados mais antigos.
+
+        Cada mês é copiado com um INSERT ... SELECT e apagado da tabela quente com um DELETE,
+        os dois pelo índice de 'created_at'. Meses já arquivados ficam de fora (as linhas
+        continuam na tabela quente, ainda visíveis nas listagens).
+
+        Parâmetros:
+            connection: Conexão SQLAlchemy já dentro de uma transação.
+            hot_months (int): Meses mais recentes que ficam na tabela quente (o atual conta como um).
+            now (int, opcional): Instante de referência, em segundos desde a época.
+
+        Retorna:
+            list: Tuplas (mês, linhas movidas). """
+
+    cutoff = recent_months_start(max(hot_months, 1), now if now is not None else int(datetime.now(timezone.utc).timestamp()))
+    archived = {row[0] for row in connection.execute(text("SELECT month FROM transaction_partitions WHERE state = 'archived'"))}
+    columns = ", ".join(PARTITION_COLUMNS)
+    moved = []
+
+    oldest = connection.execute(text("SELECT MIN(created_at) FROM transactions WHERE created_at < :cutoff"), {'cutoff': cutoff}).scalar()
+    while oldest is not None:
+        month = month_name(oldest)
+        start, end = month_bounds(month)
+        bounds = {'start': start, 'end': end}
+
+        if month not in archived:
+            partition_table(table_name(month)).create(connection, checkfirst=True)
+            rows = connection.execute(text(
+                "INSERT INTO {} ({columns}) SELECT {columns} FROM transactions WHERE created_at >= :start AND created_at < :end".format(
+                    table_name(month), columns=columns)), bounds).rowcount
+            connection.execute(text("DELETE FROM transactions WHERE created_at >= :start AND created_at < :end"), bounds)
+            refresh_partition(connection, month)
+            moved.append((month, rows))
+
+        oldest = connection.execute(text("SELECT MIN(created_at) FROM transactions WHERE created_at >= :end AND created_at < :cutoff"),
+                                    {'end': end, 'cutoff': cutoff}).scalar()
+    return moved
+
+
+def archive_partition(connection, month, directory, batch_size=10000):
+    """ Grava uma partição em um arquivo SQLite comprimido (gzip) e a tira do banco.
+
+        O arquivo é escrito e renomeado antes de a tabela ser apagada, então uma falha no
+        meio não perde linhas. Os totais do mês, geral e por usuário, ficam no catálogo para
+        os contadores de '/stats'.
+
+        Parâmetros:
+            connection: Conexão SQLAlchemy já dentro de uma transação.
+            month (str): Mês 'YYYY-MM' de uma partição online.
+            directory (str): Pasta dos arquivos.
+            batch_size (int): Linhas lidas e gravadas por vez.
+
+        Retorna:
+            str: Caminho do arquivo '.db.gz'. """
+
+    name = table_name(month)
+    table = partition_table(name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + ".db.gz")
+
+    with tempfile.TemporaryDirectory(dir=directory) as work:
+        plain = os.path.join(work, name + ".db")
+        archive = sqlite3.connect(plain)
+        archive.execute(str(CreateTable(partition_table(HOT_TABLE)).compile(dialect=connection.dialect)))
+        insert = "INSERT INTO {} ({}) VALUES ({})".format(HOT_TABLE, ", ".join(PARTITION_COLUMNS), ", ".join("?" * len(PARTITION_COLUMNS)))
+        result = connection.execute(select(*[table.c[column] for column in PARTITION_COLUMNS]).order_by(table.c.transaction_id),
+                                    execution_options={"yield_per": batch_size})
+        for rows in result.partitions():
+            archive.executemany(insert, [tuple(row) for row in rows])
+        archive.commit()
+        archive.close()
+
+        with open(plain, "rb") as source, gzip.open(path + ".tmp", "wb") as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        os.replace(path + ".tmp", path)
+
+    connection.execute(text(
+        "INSERT INTO transaction_partition_users (month, user_id, loans, devolutions) "
+        "SELECT :month, user_id, SUM(loans), SUM(devolutions) FROM ("
+        "SELECT to_user_id AS user_id, 1 AS loans, 0 AS devolutions FROM {0} WHERE is_available = 0 AND to_user_id IS NOT NULL "
+        "UNION ALL SELECT from_user_id, 0, 1 FROM {0} WHERE is_available = 1 AND from_user_id IS NOT NULL"
+        ") GROUP BY user_id".format(name)), {'month': month})
+    connection.execute(text("DROP TABLE {}".format(name)))
+    connection.execute(text("UPDATE transaction_partitions SET state = 'archived', archive_path = :path WHERE month = :month"),
+                       {'path': path, 'month': month})
+    return path
+
+
+def archive_partitions(connection, directory, online_months=12, now=None):
+    """ Arquiva as partições online de meses fora dos 'online_months' mais recentes.
+
+        Retorna:
+            list: Tuplas (mês, caminho do arquivo). """
+
+    cutoff = recent_months_start(max(online_months, 1), now if now is not None else int(datetime.now(timezone.utc).timestamp()))
+    months = [row[0] for row in connection.execute(text(
+        "SELECT month FROM transaction_partitions WHERE state = 'online' AND ends_at <= :cutoff ORDER BY starts_at"), {'cutoff': cutoff})]
+    return [(month, archive_partition(connection, month, directory)) for month in months]
+
+
+def restore_partition(connection, month, batch_size=10000):
+    """ Traz um mês arquivado de volta para uma partição online.
+
+        Transações de usuários excluídos depois do arquivamento perdem a referência a eles,
+        como no banco ('delete_user_transaction').
+
+        Parâmetros:
+            connection: Conexão SQLAlchemy já dentro de uma transação.
+            month (str): Mês 'YYYY-MM' arquivado.
+
+        Retorna:
+            int: Linhas restauradas.
+
+        Levanta:
+            LookupError: Se o mês não estiver arquivado. """
+
+    path = connection.execute(text("SELECT archive_path FROM transaction_partitions WHERE month = :month AND state = 'archived'"),
+                              {'month': month}).scalar()
+    if path is None:
+        raise LookupError("Month '{}' is not archived.".format(month))
+
+    name = table_name(month)
+    table = partition_table(name)
+    table.create(connection, checkfirst=True)
+    restored = 0
+
+    with tempfile.TemporaryDirectory() as work:
+        plain = os.path.join(work, name + ".db")
+        with gzip.open(path, "rb") as source, open(plain, "wb") as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+
+        archive = sqlite3.connect(plain)
+        cursor = archive.execute("SELECT {} FROM {} ORDER BY transaction_id".format(", ".join(PARTITION_COLUMNS), HOT_TABLE))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            connection.execute(table.insert(), [dict(zip(PARTITION_COLUMNS, row)) for row in rows])
+            restored += len(rows)
+        archive.close()
+
+    for column in ("from_user_id", "to_user_id"):
+        connection.execute(text("UPDATE {0} SET {1} = NULL WHERE {1} IS NOT NULL AND {1} NOT IN (SELECT user_id FROM users)".format(name, column)))
+    connection.execute(text("DELETE FROM transaction_partition_users WHERE month = :month"), {'month': month})
+    refresh_partition(connection, month)
+    return restored
+
+
+def forget_user(session, user_id):
+    """ Tira o usuário das partições online e dos totais dos meses arquivados (exclusão do usuário).
+
+        Os arquivos comprimidos não são reescritos; 'restore_partition' aplica a exclusão ao restaurar. """
+
+    tables = online_tables(session)
+    for table in tables:
+        session.execute(text("UPDATE {} SET from_user_id = NULL WHERE from_user_id = :user_id".format(table)), {'user_id': user_id})
+        session.execute(text("UPDATE {} SET to_user_id = NULL WHERE to_user_id = :user_id".format(table)), {'user_id': user_id})
+    if tables:
+        bump_version(session, "transactions")
+    session.execute(text("DELETE FROM transaction_partition_users WHERE user_id = :user_id"), {'user_id': user_id})
+
+
+class PartitionRouter:
+    """ Escolhe as partições de 'transactions' que podem ter linhas para uma listagem.
+
+        Parâmetros:
+            catalog (list): Linhas de 'PARTITION_CATALOG' (lidas a cada requisição; a tabela é pequena).
+
+        Atributos:
+            archived (list): Meses arquivados que cairiam na última consulta roteada. """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.archived = []
+
+
+    def route(self, values, sort):
+        """ Retorna as fontes da consulta para 'ListQuery.build': (tabela, filtros dispensáveis) por partição.
+
+            Uma partição fica de fora se o seu intervalo de datas não cruza 'date_from'/'date_to',
+            se o 'transaction_id' pedido não está entre a primeira e a última chave dela ou se ela
+            termina antes da posição do cursor. Se está inteira dentro do intervalo de datas, os
+            filtros 'date_from'/'date_to' são dispensados nela. A tabela quente entra sempre, por
+            último. """
+
+        date_from = values.get("date_from")
+        date_to = values.get("date_to")
+        transaction_id = values.get("transaction_id")
+        after = values.get("after")
+
+        sources = []
+        self.archived = []
+        for month, name, starts_at, ends_at, first_id, last_id, state in self.catalog:
+            if date_from is not None and ends_at <= date_from or date_to is not None and starts_at >= date_to:
+                continue
+            if first_id is None or transaction_id is not None and not first_id <= transaction_id <= last_id:
+                continue
+            if after is not None and (last_id <= after if sort == "asc" else first_id >= after):
+                continue
+            if state == "archived":
+                self.archived.append(month)
+                continue
+
+            covered = []
+            if date_from is not None and starts_at >= date_from:
+                covered.append("date_from")
+            if date_to is not None and ends_at <= date_to:
+                covered.append("date_to")
+            sources.append((name, tuple(covered)))
+
+        sources.append((HOT_TABLE, ()))
+        return tuple(sources)
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+""" Hash de senhas com KDF (scrypt ou PBKDF2-SHA256) executado em um pool de threads limitado.
+
+    O 'hashlib' libera o GIL durante o scrypt e o PBKDF2, então os hashes rodam em
+    paralelo com as demais threads de requisição. O pool é só um limite de concorrência:
+    tem tamanho fixo e uma fila limitada, e numa rajada de logins as requisições além do
+    limite são recusadas na hora ('PasswordHasherBusy') em vez de acumular CPU e memória.
+
+    A thread da requisição não fica livre enquanto o hash é calculado: ela espera o
+    resultado ('Future.result()'), e o WSGI não tem como devolvê-la ao servidor no meio
+    da requisição. Só um handler assíncrono (modo ASGI) poderia liberar o worker, e só
+    aguardando o future com 'await' ('asyncio.wrap_future'); hoje '/signup' e '/login'
+    rodam pelo Flask também no modo ASGI.
+
+    Formato armazenado (o custo vai junto, então mudar a configuração não invalida as
+    senhas antigas; elas são refeitas no próximo login):
+        scrypt$<n>$<r>$<p>$<salt>$<hash>
+        pbkdf2_sha256$<iterações>$<salt>$<hash>
+
+    Qualquer outro valor é tratado como senha legada em texto puro. """
+
+
+ALGORITHMS = ("scrypt", "pbkdf2_sha256")
+
+
+class PasswordHasherBusy(Exception):
+    """ Levantada quando a fila de hashes está cheia. """
+
+
+
+def b64encode(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+
+class PasswordHasher:
+    """ Calcula e verifica hashes de senha em um pool de threads.
+
+        Parâmetros:
+            algorithm (str): 'scrypt' (padrão) ou 'pbkdf2_sha256'.
+            scrypt_n, scrypt_r, scrypt_p (int): Custo do scrypt (memória ~ 128 * n * r bytes).
+            pbkdf2_iterations (int): Iterações do PBKDF2-SHA256.
+            workers (int): Threads do pool (hashes calculados ao mesmo tempo).
+            max_pending (int): Hashes aceitos entre executando e na fila; além disso, recusa. """
+
+    def __init__(self, algorithm="scrypt", scrypt_n=2 ** 14, scrypt_r=8, scrypt_p=1,
+                 pbkdf2_iterations=600000, workers=4, max_pending=64):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown password hash algorithm '{}'.".format(algorithm))
+
+        self.algorithm = algorithm
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._dummy = None
+
+
+    def hash(self, password):
+        """ Retorna o hash de 'password' com o algoritmo e o custo atuais.
+
+            Levanta:
+                PasswordHasherBusy: Se a fila do pool estiver cheia. """
+
+        return self._run(self._hash, password)
+
+
+    def hash_many(self, passwords):
+        """ Calcula os hashes de várias senhas usando todas as threads do pool (uso em lote, sem fila). """
+
+        return list(self._pool.map(self._hash, passwords))
+
+
+    def verify(self, stored, password):
+        """ Confere a senha contra o valor armazenado.
+
+            Retorna:
+                tuple: (confere, precisa_refazer). 'precisa_refazer' é True para senhas legadas
+                em texto puro e para hashes feitos com outro algoritmo ou custo. Um hash
+                armazenado malformado (custo, salt ou hash ilegíveis) não confere.
+
+            Levanta:
+                PasswordHasherBusy: Se a fila do pool estiver cheia. """
+
+        return self._run(self._verify, stored, password)
+
+
+    def dummy_verify(self, password):
+        """ Faz uma verificação com o mesmo custo de uma real, para logins de usuário inexistente
+            levarem o mesmo tempo que os de senha errada. """
+
+        if self._dummy is None:
+            self._dummy = self.hash(b64encode(os.urandom(16)))
+        self.verify(self._dummy, password)
+
+
+    def _run(self, function, *args):
+        # Limita quantos hashes rodam ao mesmo tempo; a thread chamadora continua bloqueada até o resultado
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._pool.submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+
+    def _hash(self, password, salt=None):
+        salt = salt or os.urandom(16)
+
+        if self.algorithm == "scrypt":
+            digest = self._scrypt(password, salt, self.scrypt_n, self.scrypt_r, self.scrypt_p)
+            return "scrypt${}${}${}${}${}".format(self.scrypt_n, self.scrypt_r, self.scrypt_p, b64encode(salt), b64encode(digest))
+
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.pbkdf2_iterations)
+        return "pbkdf2_sha256${}${}${}".format(self.pbkdf2_iterations, b64encode(salt), b64encode(digest))
+
+
+    def _verify(self, stored, password):
+        try:
+            return self._verify_hash(stored, password)
+        except (ValueError, OverflowError):
+            # Hash armazenado malformado (custo, salt ou hash ilegíveis): a senha não confere
+            return False, False
+
+
+    def _verify_hash(self, stored, password):
+        parts = (stored or "").split("$")
+
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            digest = self._scrypt(password, b64decode(parts[4]), n, r, p)
+            current = self.algorithm == "scrypt" and (n, r, p) == (self.scrypt_n, self.scrypt_r, self.scrypt_p)
+            return hmac.compare_digest(digest, b64decode(parts[5])), not current
+
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            iterations = int(parts[1])
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), b64decode(parts[2]), iterations)
+            current = self.algorithm == "pbkdf2_sha256" and iterations == self.pbkdf2_iterations
+            return hmac.compare_digest(digest, b64decode(parts[3])), not current
+
+        # Senha legada em texto puro: confere e pede para refazer como hash
+        return hmac.compare_digest((stored or "").encode(), password.encode()), True
+
+
+    @staticmethod
+    def _scrypt(password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32)
+
+
+
+def is_hashed(stored):
+    # Diz se o valor armazenado já está em um dos formatos de hash
+    return (stored or "").split("$", 1)[0] in ALGORITHMS
+
+
+def init_passwords(app):
+    """ Cria o 'PasswordHasher' a partir do config e o registra em 'app.extensions'.
+
+        Config (todos opcionais):
+            PASSWORD_HASH_ALGORITHM: 'scrypt' (padrão) ou 'pbkdf2_sha256'.
+            PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P: custo do scrypt (2**14, 8, 1).
+            PASSWORD_PBKDF2_ITERATIONS: iterações do PBKDF2 (600000).
+            PASSWORD_HASH_WORKERS: threads do pool (padrão: número de CPUs, até 8).
+            PASSWORD_HASH_MAX_PENDING: hashes em andamento ou na fila antes de recusar (64). """
+
+    hasher = PasswordHasher(
+        algorithm=app.config.get("PASSWORD_HASH_ALGORITHM", "scrypt"),
+        scrypt_n=int(app.config.get("PASSWORD_SCRYPT_N", 2 ** 14)),
+        scrypt_r=int(app.config.get("PASSWORD_SCRYPT_R", 8)),
+        scrypt_p=int(app.config.get("PASSWORD_SCRYPT_P", 1)),
+        pbkdf2_iterations=int(app.config.get("PASSWORD_PBKDF2_ITERATIONS", 600000)),
+        workers=int(app.config.get("PASSWORD_HASH_WORKERS", min(8, os.cpu_count() or 1))),
+        max_pending=int(app.config.get("PASSWORD_HASH_MAX_PENDING", 64)),
+    )
+    app.extensions["passwords"] = hasher
+    return hasher
+
+
+def get_hasher():
+    """ Retorna o 'PasswordHasher' da aplicação atual. """
+
+    return current_app.extensions["passwords"]
@@ -0,0 +1,174 @@
+from functools import lru_cache
+from sqlalchemy import text
+from werkzeug.exceptions import BadRequest
+from pagination import decode_cursor
+
+""" Montagem das consultas de listagem com o SQL memorizado por combinação de filtros.
+
+    As listagens têm poucas combinações possíveis (2^5 filtros e a busca em '/items',
+    2^7 filtros em '/transactions', vezes ordenação e modo de paginação). O SQL de cada combinação é
+    montado uma única vez e guardado junto com o 'text()' já pronto; as requisições
+    seguintes só preenchem os valores. Como o texto do SQL é sempre o mesmo para a mesma
+    combinação, o cache de statements preparados do sqlite3 ('cached_statements') também
+    reaproveita o statement compilado em cada conexão do pool.
+
+    Em '/transactions' as partições consultadas também entram na combinação; como elas
+    crescem com o histórico, o cache guarda os 'STATEMENT_CACHE_SIZE' SQLs mais usados. """
+
+
+STATEMENT_CACHE_SIZE = 1024
+
+
+class ListQuery:
+    """ Consulta de listagem paginada sobre uma tabela.
+
+        Parâmetros:
+            table (str): Tabela consultada.
+            key (str): Chave primária, usada na ordenação e no cursor.
+            filters (tuple): (argumento, cláusula SQL, conversão do valor ou None), na ordem do WHERE.
+            columns (tuple): Colunas selecionadas, na ordem das linhas retornadas.
+            search (tuple, opcional): (argumento, tabela FTS5, máximo de resultados ranqueados) da
+                busca textual. A busca entra como JOIN com a tabela FTS5; em 'asc'/'desc' a ordem e o
+                cursor usam o rowid do FTS5 (= chave), que o FTS5 já entrega ordenado, e em
+                'relevance' a ordem é o 'rank' (bm25) dos resultados mais recentes.
+
+        Atributos:
+            ranked_boundary (TextClause | None): Com 'search', consulta a menor chave ranqueada
+                e a seguinte, para continuar a busca depois do teto ('search_boundary'). """
+
+    def __init__(self, table, key, filters, columns, search=None):
+        self.table = table
+        self.key = key
+        self.columns = ", ".join(columns)
+        self.filters = tuple(filters)
+        self.clauses = {name: clause for name, clause, _ in self.filters}
+        self.search = search
+        self.statement = lru_cache(maxsize=STATEMENT_CACHE_SIZE)(self._statement)
+        self.ranked_boundary = None
+        if search is not None:
+            name, search_table, limit = search
+            self.ranked_boundary = text("SELECT rowid FROM {0} WHERE {0} MATCH :{1} ORDER BY rowid DESC LIMIT 2 OFFSET {2}".format(
+                search_table, name, limit - 1))
+
+
+    def build(self, parameters, lookahead=True, route=None):
+        """ Retorna a consulta e os valores para os argumentos normalizados.
+
+            Com 'cursor', a página começa logo depois da chave informada (sem OFFSET); sem
+            cursor, usa LIMIT/OFFSET. 'limit' None remove o limite (exportação). Na ordenação
+            'relevance' a ordem não segue a chave, então o cursor guarda o OFFSET da página.
+
+            Parâmetros:
+                parameters (dict): Saída de 'normalize_arguments'.
+                lookahead (bool): Busca uma linha a mais para saber se existe próxima página.
+                route (callable, opcional): Recebe (valores, ordenação) e devolve as fontes da
+                    consulta, tuplas (tabela, filtros que a tabela já garante), como
+                    'PartitionRouter.route'. Com mais de uma fonte, a consulta é um UNION ALL
+                    ordenado pela chave. Sem 'route', consulta só 'table'.
+
+            Retorna:
+                tuple: (TextClause, valores dos parâmetros, direção da ordenação).
+
+            Levanta:
+                BadRequest: Se o cursor for inválido ou a ordenação 'relevance' vier sem a busca. """
+
+        values = {}
+        present = []
+
+        for name, _, convert in self.filters:
+            if name in parameters:
+                present.append(name)
+                values[name] = parameters[name] if convert is None else convert(parameters[name])
+
+        searching = self.search is not None and self.search[0] in parameters
+        if searching:
+            values[self.search[0]] = parameters[self.search[0]]
+
+        sort = parameters.get("sort", "asc")
+        limit = parameters["limit"]
+
+        cursor = decode_cursor(parameters["cursor"]) if parameters.get("cursor") else None
+        if cursor is not None:
+            sort = cursor["sort"]
+
+        if sort == "relevance" and not searching:
+            raise BadRequest("Invalid cursor.")
+
+        if cursor is None or sort == "relevance":
+            # Na ordenação 'relevance' o cursor guarda o OFFSET da página
+            values["offset"] = parameters["offset"] if cursor is None else cursor["after"]
+            paging = "offset"
+        else:
+            values["after"] = cursor["after"]
+            paging = "cursor"
+
+        if limit is None:
+            # Sem limite; o SQLite só aceita OFFSET depois de um LIMIT
+            if paging == "offset" and not values["offset"]:
+                paging = "all"
+        else:
+            values["limit"] = limit + 1 if lookahead else limit
+
+        sources = route(values, sort) if route is not None else ((self.table, ()),)
+        return self.statement(tuple(present), searching, sort, paging, limit is None, sources), values, sort
+
+
+    def _statement(self, present, searching, sort, paging, unbounded, sources):
+        if len(sources) > 1:
+            return self._compound(present, sort, paging, unbounded, sources)
+
+        source, covered = sources[0]
+        present = tuple(name for name in present if name not in covered)
+        key = self.key
+
+        if searching and sort == "relevance":
+            # Ranqueia só os 'limit' resultados mais recentes: o bm25 custa por linha encontrada
+            name, search_table, limit = self.search
+            source += (" JOIN (SELECT rowid AS match_id, rank FROM {0} WHERE {0} MATCH :{1} ORDER BY rowid DESC LIMIT {2})"
+                       " AS found ON found.match_id = {3}").format(search_table, name, limit, self.key)
+        elif searching:
+            # Ordenar e paginar pelo rowid do FTS5 deixa o próprio índice parar na página pedida
+            name, search_table, _ = self.search
+            source += " JOIN (SELECT rowid AS match_id FROM {0} WHERE {0} MATCH :{1}) AS found ON found.match_id = {2}".format(
+                search_table, name, self.key)
+            key = "found.match_id"
+
+        if sort == "relevance":
+            order = "found.rank, {} ASC".format(self.key)
+        else:
+            order = "{} {}".format(key, sort.upper())
+
+        where = [self.clauses[name] for name in present]
+        if paging == "cursor":
+            where.append("{} {} :after".format(key, ">" if sort == "asc" else "<"))
+
+        query = "SELECT {} FROM {}".format(self.columns, source)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY " + order
+        return text(query + self._limit(paging, unbounded))
+
+
+    def _compound(self, present, sort, paging, unbounded, sources):
+        # Um ramo por fonte; o ORDER BY do UNION ALL pela chave é feito em merge, parando no LIMIT
+        arms = []
+        for source, covered in sources:
+            where = [self.clauses[name] for name in present if name not in covered]
+            if paging == "cursor":
+                where.append("{} {} :after".format(self.key, ">" if sort == "asc" else "<"))
+            arm = "SELECT {} FROM {}".format(self.columns, source)
+            if where:
+                arm += " WHERE " + " AND ".join(where)
+            arms.append(arm)
+
+        query = " UNION ALL ".join(arms) + " ORDER BY {} {}".format(self.key, sort.upper())
+        return text(query + self._limit(paging, unbounded))
+
+
+    @staticmethod
+    def _limit(paging, unbounded):
+        if unbounded:
+            return " LIMIT -1 OFFSET :offset" if paging == "offset" else ""
+        if paging == "cursor":
+            return " LIMIT :limit"
+        return " LIMIT :limit OFFSET :offset"
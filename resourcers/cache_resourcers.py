@@ -0,0 +1,18 @@
+from flask_restful import Resource
+from cache import get_cache
+
+
+class CacheStats(Resource):
+    """ Recurso para consultar os contadores do cache de leitura. """
+
+
+    def get(self):
+        """ Retorna os acertos, faltas e a taxa de acerto do cache do processo atual.
+
+            Retorno:
+                tuple: {'backend', 'hits', 'misses', 'entries', 'hit_ratio'} e código HTTP 200. """
+
+        stats = get_cache().stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+        return stats, 200
@@ -1,30 +1,58 @@
+from flask import request, current_app
 from flask_restful import Resource, reqparse
 from models.item_models import ItemModel
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from auth import login_required, current_user
 from bool_format import str_to_bool
-import sqlite3
-import os
-
-
-def normalize_arguments(description=None, is_available=None, owner_id=None, limit=50, offset=0, **dados):
+from pagination import sort_order, paginate, page_limit, export_limit, encode_cursor, search_boundary
+from query_builder import ListQuery
+from validation import ArgumentSchema
+from date import Time
+from search import MAX_RANKED_MATCHES, SEARCH_TABLE, match_expression
+from export import format_name, export_format, stream_export
+from sql_alchemy import data
+from cache import read_through, conditional_response, item_key
+from serialization import ITEM_FIELDS, item_record
+from versions import collection_etag, not_modified, etag_header
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import BadRequest
+import json
+
+
+def normalize_arguments(description=None, is_available=None, owner_id=None, date_from=None, date_to=None, date=None, q=None, limit=50, offset=0, cursor=None, sort=None, **dados):
     """Normaliza e organiza os argumentos fornecidos para uma consulta, incluindo paginação e filtros opcionais.
 
     Parâmetros:
         description (str, opcional): Filtro por descrição.
         is_available (bool, opcional): Filtro para disponibilidade (True ou False).
         owner_id (int, opcional): ID do proprietário para filtro.
-        limit (int, opcional): Quantidade máxima de resultados a serem retornados. Padrão é 50.
+        date_from (int, opcional): Início do intervalo de 'created_at', em segundos desde a época (inclusivo).
+        date_to (int, opcional): Fim do intervalo de 'created_at', em segundos desde a época (exclusivo).
+        date (tuple, opcional): Intervalo (início, fim) de um dia; preenche 'date_from'/'date_to' que não foram informados.
+        q (str, opcional): Busca textual na descrição, já convertida por 'match_expression'.
+        limit (int, opcional): Quantidade máxima de resultados a serem retornados. Padrão é 50, no máximo MAX_LIMIT (1000).
         offset (int, opcional): Quantidade de resultados a serem ignorados (para paginação). Padrão é 0.
+        cursor (str, opcional): Cursor opaco ('next_cursor' da página anterior); quando presente, substitui o 'offset'.
+        sort (str, opcional): Ordenação por 'item_id', 'asc' ou 'desc'. Padrão é 'asc', ou 'relevance' (bm25) quando há 'q'.
         **dados: Argumentos adicionais não utilizados explicitamente, mas aceitos por compatibilidade.
 
     Retorna:
-        dict: Um dicionário contendo os argumentos normalizados que foram fornecidos, incluindo 'limit' e 'offset' como padrão.""" 
+        dict: Um dicionário contendo os argumentos normalizados que foram fornecidos, incluindo 'limit', 'offset' e 'sort' como padrão.""" 
     
+    if sort is None:
+        sort = "relevance" if q is not None else "asc"
+
     args = {
-        "limit": limit,
-        "offset": offset
+        "limit": page_limit(limit),
+        "offset": offset,
+        "sort": sort
     }
 
+    if q is not None:
+        args["q"] = q
+
+    if cursor is not None:
+        args["cursor"] = cursor
+
     if description is not None:
         args["description"] = description
 
@@ -34,16 +62,62 @@ def normalize_arguments(description=None, is_available=None, owner_id=None, limi
     if owner_id is not None:
         args["owner_id"] = owner_id
 
+    if date is not None:
+        date_from = date[0] if date_from is None else date_from
+        date_to = date[1] if date_to is None else date_to
+
+    if date_from is not None:
+        args["date_from"] = date_from
+
+    if date_to is not None:
+        args["date_to"] = date_to
+
     return args
 
 
-arguments = reqparse.RequestParser()
-arguments.add_argument("description", type=str, location="args")
-arguments.add_argument("is_available", type=str_to_bool, location="args")
-arguments.add_argument("date", type=str, location="args")
-arguments.add_argument("owner_id", type=int, location="args")
-arguments.add_argument("limit", type=int, location="args")
-arguments.add_argument("offset", type=int, location="args")
+# Um item emprestado só volta a ficar disponível pela devolução
+ITEM_LENT = "This item is lent; it becomes available again when it is returned."
+
+arguments = ArgumentSchema(
+    description=str,
+    is_available=str_to_bool,
+    date=Time.day_range,
+    date_from=Time.range_start,
+    date_to=Time.range_end,
+    q=match_expression,
+    owner_id=int,
+    limit=int,
+    offset=int,
+    cursor=str,
+    sort=sort_order,
+    format=format_name,
+)
+
+ITEM_QUERY = ListQuery("items", "item_id", (
+    ("description", "description = :description", None),
+    ("is_available", "is_available = :is_available", int),
+    ("owner_id", "owner_id = :owner_id", None),
+    ("date_from", "created_at >= :date_from", None),
+    ("date_to", "created_at < :date_to", None),
+), ITEM_FIELDS, search=("q", SEARCH_TABLE, MAX_RANKED_MATCHES))
+
+
+def ranked_boundary(values):
+    # 'search_boundary' da busca por relevância, ou None se todos os resultados couberem no ranking
+    return search_boundary(data.session.execute(ITEM_QUERY.ranked_boundary, {"q": values["q"]}).fetchall())
+
+
+def export_rows(parameters, query, values, boundary):
+    # Linhas da exportação; passado o teto do ranking, segue pelos demais resultados em ordem 'desc'
+    exported = 0
+    for row in data.session.execute(query, values, execution_options={"yield_per": 1000}):
+        exported += 1
+        yield row
+
+    if boundary is not None and exported < parameters["limit"]:
+        rest = dict(parameters, cursor=encode_cursor(boundary, "desc"), limit=parameters["limit"] - exported)
+        query, values, _ = ITEM_QUERY.build(rest, lookahead=False)
+        yield from data.session.execute(query, values, execution_options={"yield_per": 1000})
 
 
 
@@ -52,64 +126,58 @@ class Items(Resource):
         """ Recupera itens do banco de dados com base nos parâmetros de consulta fornecidos.
     
         Essa função realiza as seguintes etapas:
-        - Lê os argumentos da requisição (query string).
+        - Lê os argumentos da requisição (query string) com o esquema declarativo 'arguments'.
         - Normaliza os parâmetros utilizando a função 'normalize_arguments'.
-        - Constrói dinamicamente a consulta SQL com filtros opcionais para 'description', 'is_available' e vowner_id'.
-        - Aplica paginação usando 'limit' e 'offset'.
-        - Executa a consulta no banco SQLite e retorna os resultados.
+        - Obtém de 'ITEM_QUERY' a consulta SQL (memorizada por combinação de filtros), com filtros opcionais para 'description', 'is_available', 'owner_id' e o intervalo de datas ('date_from'/'date_to' ou 'date', pelo índice de 'created_at').
+        - Com 'q', busca as palavras (por prefixo) no índice FTS5 da descrição; sem 'sort', ordena pela
+          relevância (bm25) os 'MAX_RANKED_MATCHES' resultados mais recentes e o cursor guarda o offset
+          da página seguinte; se houver mais resultados que isso, a resposta leva 'truncated' e, acabados
+          os ranqueados, o cursor (e a exportação) segue pelos demais em ordem 'desc' de 'item_id'.
+          Com 'sort', percorre todos os resultados em ordem de 'item_id'.
+        - Aplica paginação por cursor ('cursor', chave 'item_id') ou, sem cursor, por 'limit' e 'offset'.
+        - Executa a consulta pelo pool de conexões compartilhado ('data') e retorna os resultados.
+        - Com 'format=ndjson|csv' (ou 'Accept: application/x-ndjson' / 'text/csv'), devolve os itens
+          em streaming, lidos do cursor aos poucos; nesse modo o 'limit' tem teto e padrão MAX_EXPORT_LIMIT (100000).
+        - Na resposta JSON, o ETag fraco é a versão da coleção ('versions.py'): um 'If-None-Match'
+          com a versão atual recebe 304 antes da consulta.
     
         Retorno:
-            tuple: Um dicionário com a lista de itens encontrados no banco de dados e o código de status HTTP 200.
-            Cada item contém os campos: 'item_id', 'description', 'is_available', 'date', 'owner_id'. """
+            tuple: Um dicionário com a lista de itens encontrados no banco de dados, o 'next_cursor' da próxima
+            página (None na última), 'truncated' se a busca por relevância não ranqueou todos os resultados,
+            o código de status HTTP 200 e o cabeçalho 'ETag'.
+            Cada item contém os campos: 'item_id', 'description', 'is_available', 'date', 'owner_id'.
+            Response: No modo de exportação, a resposta em streaming; 304 Not Modified sem corpo. """
         
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        DB_PATH = os.path.normpath(os.path.join(BASE_DIR, "..", "instance", "data.db"))
+        args = arguments.parse(request.args)
+        export = export_format(args.get("format"))
 
-        connection = sqlite3.connect(DB_PATH)
-        cursor = connection.cursor()
+        parameters = normalize_arguments(**args)
 
-        args = arguments.parse_args()
+        if export:
+            # A exportação é lida do cursor aos poucos, em memória constante, com o teto próprio de 'export_limit'
+            parameters["limit"] = export_limit(args.get("limit"))
+        else:
+            etag = collection_etag(data.session, "items")
+            unchanged = not_modified(etag)
+            if unchanged is not None:
+                return unchanged
 
-        parameters = normalize_arguments(**{key: value for key, value in args.items() if value is not None})
+        # Na exportação o 'limit' é exato, sem a linha extra da paginação
+        query, values, sort = ITEM_QUERY.build(parameters, lookahead=not export)
+        boundary = ranked_boundary(values) if sort == "relevance" else None
 
-        query = "SELECT * FROM items"
-        filters = []
-        values = []
+        if export:
+            rows = export_rows(parameters, query, values, boundary)
+            return stream_export(export, ITEM_FIELDS, (item_record(row) for row in rows), "items")
 
-        if "description" in parameters:
-            filters.append("description = ?")
-            values.append(parameters["description"])
+        result = data.session.execute(query, values).fetchall()
+        result, next_cursor = paginate(result, parameters["limit"], 0, sort, values.get("offset", 0), boundary)
 
-        if "is_available" in parameters:
-            filters.append("is_available = ?")
-            values.append(int(parameters["is_available"]))
+        items = {"items": [item_record(row) for row in result], "next_cursor": next_cursor}
+        if boundary is not None:
+            items["truncated"] = True
 
-        if "owner_id" in parameters:
-            filters.append("owner_id = ?")
-            values.append(parameters["owner_id"])
-
-        if filters:
-            query += " WHERE " + " AND ".join(filters)
-
-        query += " LIMIT ? OFFSET ?"
-        values.append(parameters["limit"]) 
-        values.append(parameters["offset"]) 
-
-        result = cursor.execute(query, tuple(values))
-
-        items = [
-            {
-                "item_id": row[0],
-                "description": row[1],
-                "is_available": bool(row[2]),
-                "date": row[3],
-                "owner_id": row[4]
-            }
-            for row in result
-        ]
-
-        connection.close()
-        return {"items": items}, 200
+        return items, 200, etag_header(etag)
     
 
 
@@ -155,17 +223,21 @@ class Item(Resource):
         Parâmetros:
             item_id (int): O identificador único do item a ser buscado.
 
+        O item vem do cache de leitura ('cache.read_through'); a resposta leva o ETag
+        (hash do JSON), e um 'If-None-Match' válido recebe 304 sem corpo.
+
         Retorno:
-            dict ou tuple: Se o item for encontrado, retorna um dicionário com os dados do item em formato JSON.
-            Caso contrário, retorna um dicionário com uma mensagem de erro e o código HTTP 404."""
+            tuple ou Response: Se o item for encontrado, retorna os dados do item em formato JSON com os
+            cabeçalhos de validação (ou 304 Not Modified). Caso contrário, retorna um dicionário com uma
+            mensagem de erro e o código HTTP 404."""
         
-        item = ItemModel.find_item(item_id)
-        if item:
-            return item.json()
+        entry = read_through(item_key(item_id), lambda: ItemModel.find_record(item_id))
+        if entry:
+            return conditional_response(entry)
         return {'message': 'Item not found.'}, 404 # not found
     
     
-    @jwt_required()
+    @login_required
     def post(self, item_id):
         """ Cria um novo item com o 'item_id' fornecido.
 
@@ -183,7 +255,7 @@ class Item(Resource):
         if ItemModel.find_item(item_id):
             return {"message": "Item id'{}' already exists.".format(item_id)}, 400 # Bad resquest
         
-        user_id = int(get_jwt_identity()) 
+        user_id = current_user().user_id 
         data = Item.arguments.parse_args()
         item = ItemModel(item_id,**data, owner_id=user_id) 
         
@@ -194,7 +266,7 @@ class Item(Resource):
         return item.json(), 201
 
 
-    @jwt_required()
+    @login_required
     def put(self, item_id):
         """Atualiza um item existente com base no 'item_id'.
 
@@ -207,10 +279,11 @@ class Item(Resource):
             tuple:
                 - Se o item não for encontrado, retorna mensagem de erro e código HTTP 404.
                 - Se o usuário não for o proprietário do item, retorna mensagem de acesso negado e código HTTP 403.
+                - Se o item estiver emprestado e o pedido o marcar como disponível, retorna mensagem e código HTTP 409.
                 - Se a atualização for bem-sucedida, retorna os dados atualizados do item e código HTTP 200.
                 - Em caso de erro interno ao salvar, retorna mensagem de erro e código HTTP 500. """
         
-        user_id = int(get_jwt_identity())
+        user_id = current_user().user_id
         data = Item.arguments.parse_args()
         item_finded = ItemModel.find_item(item_id)
 
@@ -220,6 +293,9 @@ class Item(Resource):
         if item_finded.owner_id != user_id:
             return {"message": "You are not allowed to update this item."}, 403 # Acess Denied
 
+        if item_finded.current_holder_id is not None and data['is_available']:
+            return {"message": ITEM_LENT}, 409 # Conflict
+
         if item_finded:
             item_finded.update_item(**data)
             return item_finded.json(), 200 #sucessful
@@ -232,7 +308,7 @@ class Item(Resource):
         return item.json(), 201
     
 
-    @jwt_required()
+    @login_required
     def delete(self, item_id):
         """ Exclui um item com base no 'item_id'.
 
@@ -248,7 +324,7 @@ class Item(Resource):
                 - Se a exclusão for bem-sucedida, retorna mensagem de sucesso e código HTTP 200 (padrão).
                 - Em caso de erro interno ao excluir, retorna mensagem de erro e código HTTP 500. """
         
-        user_id = int(get_jwt_identity()) 
+        user_id = current_user().user_id 
         item = ItemModel.find_item(item_id)
 
         if not item:
@@ -261,4 +337,130 @@ class Item(Resource):
             item.delete_item()
             return {'message': 'Item deleted.'}
         except:
-            return {'message': 'An internal error ocurred trying to save item.'}, 500 #Internal Server Error
\ No newline at end of file
+            return {'message': 'An internal error ocurred trying to save item.'}, 500 #Internal Server Error
+
+
+def parse_bulk_body():
+    """ Lê o corpo de '/items/bulk' como lista JSON ou NDJSON (um objeto por linha).
+
+        Retorna:
+            list: As linhas enviadas, na ordem recebida.
+
+        Levanta:
+            BadRequest: Se o corpo não for uma lista JSON nem NDJSON válido. """
+
+    if request.mimetype == "application/x-ndjson":
+        try:
+            return [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            raise BadRequest("The body must be valid NDJSON.")
+
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise BadRequest("The body must be a JSON array of items.")
+    return rows
+
+
+def validate_bulk_row(row):
+    # Valida uma linha do lote; retorna (item, None) ou (None, mensagem de erro)
+    if not isinstance(row, dict):
+        return None, "Each row must be an object."
+
+    item_id = row.get("item_id")
+    if not isinstance(item_id, int) or isinstance(item_id, bool):
+        return None, "The field 'item_id' must be an integer."
+
+    description = row.get("description")
+    if not isinstance(description, str):
+        return None, "The field 'description' can not be left blank"
+
+    try:
+        is_available = str_to_bool(row.get("is_available"))
+    except BadRequest:
+        return None, "The field 'is_available' can not be left blank"
+
+    return {"item_id": item_id, "description": description, "is_available": is_available}, None
+
+
+
+class ItemsBulk(Resource):
+    """ Recurso para criar ou atualizar muitos itens em uma única requisição.
+
+        Método POST:
+            Recebe uma lista JSON (ou NDJSON) de itens, cria os novos no inventário do
+            usuário autenticado e atualiza os que já são dele, em transações por lote. """
+
+
+    @login_required
+    def post(self):
+        """ Cria ou atualiza itens em lote.
+
+            - Lê o corpo como lista JSON ou NDJSON ('Content-Type: application/x-ndjson').
+            - Valida cada linha ('item_id', 'description', 'is_available').
+            - Busca os donos de todos os IDs do lote em uma única consulta (IN).
+            - Recusa a linha que marca como disponível um item emprestado (só a devolução faz isso).
+            - Insere os itens novos e atualiza os do usuário com executemany,
+              um commit a cada 'chunk_size' linhas (query string ou BULK_CHUNK_SIZE, padrão 500).
+
+            Retorno:
+                tuple: Resultado por linha ('created', 'updated' ou 'error' com mensagem),
+                totais e código HTTP 200. Corpo inválido retorna 400. """
+
+        user_id = current_user().user_id
+        rows = parse_bulk_body()
+        chunk_size = request.args.get("chunk_size", type=int) or current_app.config.get("BULK_CHUNK_SIZE", 500)
+        chunk_size = max(1, min(chunk_size, 900)) # SQLite aceita no máximo 999 parâmetros por consulta
+
+        results = [None] * len(rows)
+        seen = set()
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = []
+
+            for index in range(start, min(start + chunk_size, len(rows))):
+                item, error = validate_bulk_row(rows[index])
+
+                if item and item["item_id"] in seen:
+                    error = "Item id'{}' is repeated in this request.".format(item["item_id"])
+
+                if error:
+                    results[index] = {"index": index, "status": "error", "message": error}
+                    continue
+
+                seen.add(item["item_id"])
+                chunk.append((index, item))
+
+            owners = ItemModel.find_owners([item["item_id"] for index, item in chunk])
+            created = []
+            updated = []
+
+            for index, item in chunk:
+                result = {"index": index, "item_id": item["item_id"]}
+
+                if item["item_id"] not in owners:
+                    created.append(dict(item, owner_id=user_id))
+                    result["status"] = "created"
+                elif owners[item["item_id"]][0] != user_id:
+                    result["status"] = "error"
+                    result["message"] = "You are not allowed to update this item."
+                elif owners[item["item_id"]][1] is not None and item["is_available"]:
+                    result["status"] = "error"
+                    result["message"] = ITEM_LENT
+                else:
+                    updated.append(item)
+                    result["status"] = "updated"
+
+                results[index] = result
+
+            try:
+                ItemModel.save_items(created, updated)
+            except SQLAlchemyError:
+                data.session.rollback()
+                for index, item in chunk:
+                    if results[index]["status"] != "error":
+                        results[index]["status"] = "error"
+                        results[index]["message"] = "An internal error ocurred trying to save item."
+
+        summary = {status: sum(1 for result in results if result["status"] == status)
+                   for status in ("created", "updated", "error")}
+        return {"results": results, **summary}, 200
@@ -0,0 +1,73 @@
+from flask_restful import Resource
+from models.stats_models import GlobalStatsModel, UserStatsModel
+from models.user_models import UserModel
+
+
+def user_counters(user_id):
+    # Linha de contadores do usuário; None se ele não existe e nunca teve itens
+    stats = UserStatsModel.find(user_id)
+    if stats is None and not UserModel.find_user(user_id):
+        return None
+    return stats or UserStatsModel(user_id=user_id, items=0, available=0, lent=0, holding=0, loans=0, devolutions=0)
+
+
+
+class Stats(Resource):
+    """ Recurso para os totais do inventário.
+
+        Os contadores ('global_stats', 'user_stats') são atualizados pelas próprias escritas,
+        no mesmo commit; cada resposta de '/stats' é uma leitura por chave primária, com
+        custo constante. 'flask --app app stats-check' os recalcula do zero. """
+
+
+    def get(self):
+        """ Retorna os contadores globais.
+
+            Retorno:
+                tuple: {'items', 'available', 'lent', 'users', 'transactions', 'loans', 'devolutions'}
+                e código HTTP 200. 'available' conta os itens com 'is_available' verdadeiro e
+                'lent' os que estão com alguém que não é o dono. """
+
+        return GlobalStatsModel.find().json(), 200
+
+
+
+class OwnerStats(Resource):
+    """ Recurso para os contadores de um dono de itens. """
+
+
+    def get(self, owner_id):
+        """ Retorna quantos itens o dono tem, quantos estão disponíveis e quantos estão emprestados.
+
+            Parâmetros:
+                owner_id (int): Identificador do dono.
+
+            Retorno:
+                tuple: {'owner_id', 'items', 'available', 'lent'} e código HTTP 200,
+                ou mensagem de erro e código HTTP 404 se o usuário não existir. """
+
+        stats = user_counters(owner_id)
+        if stats is None:
+            return {'message': 'User not found.'}, 404
+        return {'owner_id': owner_id, 'items': stats.items, 'available': stats.available, 'lent': stats.lent}, 200
+
+
+
+class UserStats(Resource):
+    """ Recurso para os contadores de empréstimos de um usuário. """
+
+
+    def get(self, user_id):
+        """ Retorna os itens que o usuário tem emprestados agora e o total de empréstimos e devoluções.
+
+            Parâmetros:
+                user_id (int): Identificador do usuário.
+
+            Retorno:
+                tuple: {'user_id', 'holding', 'loans', 'devolutions'} e código HTTP 200,
+                ou mensagem de erro e código HTTP 404 se o usuário não existir. """
+
+        stats = user_counters(user_id)
+        if stats is None:
+            return {'message': 'User not found.'}, 404
+        return {'user_id': user_id, 'holding': stats.holding, 'loans': stats.loans, 'devolutions': stats.devolutions}, 200
@@ -1,13 +1,22 @@
+from flask import request, current_app
 from flask_restful import Resource, reqparse
 from models.transaction_models import TransactionModel
-from models.item_models import ItemModel
-from  flask_jwt_extended import jwt_required, get_jwt_identity
+from auth import login_required, current_user
 from bool_format import str_to_bool
-import sqlite3
-import os
-
-
-def normalize_arguments(transaction_id=None, item_id=None, from_user_id=None, to_user_id=None, is_available=None, limit=100, offset=0, **dados):
+from pagination import sort_order, paginate, page_limit, export_limit
+from query_builder import ListQuery
+from validation import ArgumentSchema
+from date import Time
+from export import format_name, export_format, stream_export
+from sql_alchemy import data, run_with_retry
+from serialization import TRANSACTION_FIELDS, movement_record, transaction_record
+from partitions import PARTITION_CATALOG, PartitionRouter
+from versions import collection_etag, not_modified, etag_header
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import BadRequest
+
+
+def normalize_arguments(transaction_id=None, item_id=None, from_user_id=None, to_user_id=None, is_available=None, date_from=None, date_to=None, date=None, limit=100, offset=0, cursor=None, sort="asc", **dados):
     """Normaliza e organiza os argumentos fornecidos para uma consulta de transações, incluindo filtros e paginação.
 
     Parâmetros:
@@ -16,18 +25,27 @@ def normalize_arguments(transaction_id=None, item_id=None, from_user_id=None, to
         from_user_id (int, opcional): Filtro pelo ID do usuário que iniciou a transação.
         to_user_id (int, opcional): Filtro pelo ID do usuário que recebeu a transação.
         is_available (bool, opcional): Filtro para disponibilidade do item relacionado.
-        limit (float, opcional): Quantidade máxima de resultados retornados. Padrão é 100.
-        offset (float, opcional): Quantidade de resultados a serem ignorados (para paginação). Padrão é 0.
+        date_from (int, opcional): Início do intervalo de 'created_at', em segundos desde a época (inclusivo).
+        date_to (int, opcional): Fim do intervalo de 'created_at', em segundos desde a época (exclusivo).
+        date (tuple, opcional): Intervalo (início, fim) de um dia; preenche 'date_from'/'date_to' que não foram informados.
+        limit (int, opcional): Quantidade máxima de resultados retornados. Padrão é 100, no máximo MAX_LIMIT (1000).
+        offset (int, opcional): Quantidade de resultados a serem ignorados (para paginação). Padrão é 0.
+        cursor (str, opcional): Cursor opaco ('next_cursor' da página anterior); quando presente, substitui o 'offset'.
+        sort (str, opcional): Ordenação por 'transaction_id', 'asc' ou 'desc'. Padrão é 'asc'.
         **dados: Argumentos adicionais não utilizados explicitamente, mas aceitos para compatibilidade.
 
     Retorno:
-        dict: Um dicionário contendo os argumentos normalizados que foram fornecidos, incluindo 'limit' e 'offset' como padrão."""
+        dict: Um dicionário contendo os argumentos normalizados que foram fornecidos, incluindo 'limit', 'offset' e 'sort' como padrão."""
     
     args = {
-        "limit": limit,
-        "offset": offset
+        "limit": page_limit(limit),
+        "offset": offset,
+        "sort": sort
     }
 
+    if cursor is not None:
+        args["cursor"] = cursor
+
     if transaction_id is not None:
         args["transaction_id"] = transaction_id
 
@@ -43,18 +61,44 @@ def normalize_arguments(transaction_id=None, item_id=None, from_user_id=None, to
     if is_available is not None:
         args["is_available"] = is_available
 
+    if date is not None:
+        date_from = date[0] if date_from is None else date_from
+        date_to = date[1] if date_to is None else date_to
+
+    if date_from is not None:
+        args["date_from"] = date_from
+
+    if date_to is not None:
+        args["date_to"] = date_to
+
     return args
 
     
-arguments = reqparse.RequestParser()
-arguments.add_argument("transaction_id", type=int, location="args")
-arguments.add_argument("item_id", type=int, location="args")
-arguments.add_argument("from_user_id", type=int, location="args")
-arguments.add_argument("to_user_id", type=int, location="args")
-arguments.add_argument("is_available", type=str_to_bool, location="args")
-arguments.add_argument("date", type=str, location="args")
-arguments.add_argument("limit", type=float, location="args")
-arguments.add_argument("offset", type=float, location="args")
+arguments = ArgumentSchema(
+    transaction_id=int,
+    item_id=int,
+    from_user_id=int,
+    to_user_id=int,
+    is_available=str_to_bool,
+    date=Time.day_range,
+    date_from=Time.range_start,
+    date_to=Time.range_end,
+    limit=int,
+    offset=int,
+    cursor=str,
+    sort=sort_order,
+    format=format_name,
+)
+
+TRANSACTION_QUERY = ListQuery("transactions", "transaction_id", (
+    ("transaction_id", "transaction_id = :transaction_id", None),
+    ("item_id", "item_id = :item_id", None),
+    ("from_user_id", "from_user_id = :from_user_id", None),
+    ("to_user_id", "to_user_id = :to_user_id", None),
+    ("is_available", "is_available = :is_available", int),
+    ("date_from", "created_at >= :date_from", None),
+    ("date_to", "created_at < :date_to", None),
+), TRANSACTION_FIELDS)
 
 
 
@@ -63,74 +107,61 @@ class Transactions(Resource):
         """ Recupera transações do banco de dados com base nos parâmetros de consulta fornecidos.
 
         Esta função:
-        - Lê os argumentos da requisição (query string).
+        - Lê os argumentos da requisição (query string) com o esquema declarativo 'arguments'.
         - Normaliza os parâmetros utilizando a função 'normalize_arguments'.
-        - Constrói dinamicamente a consulta SQL com filtros opcionais para 'transaction_id', 'item_id', 'from_user_id', 'to_user_id' e 'is_available'.
-        - Aplica paginação usando 'limit' e 'offset'.
-        - Executa a consulta no banco SQLite e retorna os resultados.
+        - Obtém de 'TRANSACTION_QUERY' a consulta SQL (memorizada por combinação de filtros), com filtros opcionais para 'transaction_id', 'item_id', 'from_user_id', 'to_user_id', 'is_available' e o intervalo de datas ('date_from'/'date_to' ou 'date', pelo índice de 'created_at').
+        - Aplica paginação por cursor ('cursor', chave 'transaction_id') ou, sem cursor, por 'limit' e 'offset'.
+        - Consulta só as partições mensais que podem ter linhas para os filtros ('PartitionRouter'), além da
+          tabela quente; meses arquivados no intervalo vêm em 'archived_months' (ou no cabeçalho
+          'X-Archived-Months' da exportação) e não são lidos.
+        - Executa a consulta pelo pool de conexões compartilhado ('data') e retorna os resultados.
+        - Com 'format=ndjson|csv' (ou 'Accept: application/x-ndjson' / 'text/csv'), devolve as transações
+          em streaming, lidas do cursor aos poucos; nesse modo o 'limit' tem teto e padrão MAX_EXPORT_LIMIT (100000).
+        - Na resposta JSON, o ETag fraco é a versão da coleção ('versions.py'), que também muda com a
+          rotação e o arquivamento das partições: um 'If-None-Match' com a versão atual recebe 304
+          antes de ler o catálogo e consultar.
 
         Retorno:
-            tuple: Um dicionário contendo a lista de transações encontradas e o código de status HTTP 200.
-                   Cada transação contém os campos: 'transaction_id', 'item_id', 'from_user_id', 'to_user_id', 'is_available' e 'date'. """
-
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        
-        DB_PATH = os.path.normpath(os.path.join(BASE_DIR, "..", "instance", "data.db"))
-    
-        connection = sqlite3.connect(DB_PATH)
-        cursor = connection.cursor()
-
-        args = arguments.parse_args()
-
-        parameters = normalize_arguments(**{key: value for key, value in args.items() if value is not None})
-
-        query = "SELECT * FROM transactions"
-        filters = []
-        values = []
-
-        if "transaction_id" in parameters:
-            filters.append("transaction_id = ?")
-            values.append(parameters["transaction_id"])
-
-        if "item_id" in parameters:
-            filters.append("item_id = ?")
-            values.append(parameters["item_id"])
-
-        if "from_user_id" in parameters:
-            filters.append("from_user_id = ?")
-            values.append(parameters["from_user_id"])
-
-        if "to_user_id" in parameters:
-            filters.append("to_user_id = ?")
-            values.append(parameters["to_user_id"])
-
-        if "is_available" in parameters:
-            filters.append("is_available = ?")
-            values.append(int(parameters["is_available"]))
-        
-        if filters:
-            query += " WHERE " + " AND ".join(filters)
-
-        query += " LIMIT ? OFFSET ?"
-        values.append(parameters["limit"]) 
-        values.append(parameters["offset"]) 
-
-        result = cursor.execute(query, tuple(values))
-
-        transactions = [
-            {
-                "transaction_id": row[0],
-                "item_id": row[1],
-                "from_user_id": row[2],
-                "to_user_id": row[3],
-                "is_available": bool(row[4]),
-                "date": row[5]
-            }
-            for row in result
-        ]
-
-        connection.close()
-        return {"transactions": transactions}, 200
+            tuple: Um dicionário contendo a lista de transações encontradas, o 'next_cursor' da próxima página
+                   (None na última), 'archived_months' se houver meses arquivados no intervalo, o código de status HTTP 200
+                   e o cabeçalho 'ETag'.
+                   Cada transação contém os campos: 'transaction_id', 'item_id', 'from_user_id', 'to_user_id', 'is_available' e 'date'.
+            Response: No modo de exportação, a resposta em streaming; 304 Not Modified sem corpo. """
+
+        args = arguments.parse(request.args)
+        export = export_format(args.get("format"))
+
+        parameters = normalize_arguments(**args)
+
+        if export:
+            # A exportação é lida do cursor aos poucos, em memória constante, com o teto próprio de 'export_limit'
+            parameters["limit"] = export_limit(args.get("limit"))
+        else:
+            etag = collection_etag(data.session, "transactions")
+            unchanged = not_modified(etag)
+            if unchanged is not None:
+                return unchanged
+
+        # Na exportação o 'limit' é exato, sem a linha extra da paginação
+        router = PartitionRouter(data.session.execute(PARTITION_CATALOG).fetchall())
+        query, values, sort = TRANSACTION_QUERY.build(parameters, lookahead=not export, route=router.route)
+
+        if export:
+            result = data.session.execute(query, values, execution_options={"yield_per": 1000})
+            response = stream_export(export, TRANSACTION_FIELDS, (transaction_record(row) for row in result), "transactions")
+            if router.archived:
+                response.headers["X-Archived-Months"] = ",".join(router.archived)
+            return response
+
+        result = data.session.execute(query, values).fetchall()
+        result, next_cursor = paginate(result, parameters["limit"], 0, sort)
+
+        transactions = [transaction_record(row) for row in result]
+
+        body = {"transactions": transactions, "next_cursor": next_cursor}
+        if router.archived:
+            body["archived_months"] = router.archived
+        return body, 200, etag_header(etag)
     
 
 
@@ -142,15 +173,15 @@ class LoanTransaction(Resource):
             registrando a transação e atualizando o status de disponibilidade do item. """
     
 
-    @jwt_required()
+    @login_required
     def post(self):
         """ Realiza o empréstimo de um item.
 
-            - Valida se o item existe.
-            - Verifica se o usuário autenticado não é o dono do item.
-            - Confirma se o item está disponível para transferência.
-            - Atualiza o status do item para indisponível.
-            - Registra a transação de empréstimo.
+            - Reserva o item com um UPDATE condicional: só afeta a linha se o item existir,
+              estiver disponível e não pertencer ao usuário autenticado.
+            - Registra a transação de empréstimo na mesma transação do banco, com um único commit.
+            - Se o SQLite estiver ocupado por outra escrita, tenta novamente (run_with_retry).
+            - Se a reserva não afetar a linha, identifica o motivo para a resposta.
 
             Retorno:
                 tuple:
@@ -164,32 +195,22 @@ class LoanTransaction(Resource):
         arguments.add_argument('item_id', type=int, required=True, help="The field 'item_id' can not be left blank")
         data = arguments.parse_args()
         item_id = data['item_id']
-        user_id = int(get_jwt_identity())
+        user_id = current_user().user_id
 
-        item = ItemModel.query.get(item_id)
+        try:
+            transaction, refused = run_with_retry(lambda: TransactionModel.register_loan(item_id, user_id))
+        except SQLAlchemyError:
+            return {'message': 'An internal error ocurred trying to save item.'}, 500 # Internal Server Error}
 
-        if not item:                                        
+        if refused == 'not_found':                                        
             return {"message": "item not found."}, 404
         
-        if item.owner_id == user_id:                       
+        if refused == 'owner':                       
             return {"message": "This item is already in your inventory"}, 400
         
-        if item.is_available != True:
+        if refused == 'unavailable':
             return{"message": "Item is not available for transfer."}, 403
-        
-        item.is_available = False
-
-        transaction = TransactionModel(
-            item_id = item_id,
-            from_user_id = item.owner_id,
-            to_user_id = user_id,
-            is_available = item.is_available)
 
-        try:
-            transaction.save_transaction()
-            item.save_item()
-        except:
-            return {'message': 'An internal error ocurred trying to save item.'}, 500 # Internal Server Error}
         return transaction.json(), 201
     
     
@@ -202,15 +223,15 @@ class DevolutionTransaction(Resource):
             atualizando o status do item e registrando a transação de devolução. """
     
 
-    @jwt_required()
+    @login_required
     def post(self):
         """ Realiza a devolução de um item emprestado.
 
-            - Valida se o item existe.
-            - Obtém a última transação de empréstimo do item.
-            - Verifica se o usuário autenticado é o atual detentor do item.
-            - Atualiza o status do item para disponível.
-            - Registra a transação de devolução.
+            - Marca o item como disponível com um UPDATE condicional (só se estiver emprestado).
+            - Obtém a última transação de empréstimo do item e verifica se o usuário autenticado
+              é o atual detentor; se não for, desfaz a alteração.
+            - Registra a transação de devolução na mesma transação do banco, com um único commit.
+            - Se o SQLite estiver ocupado por outra escrita, tenta novamente (run_with_retry).
 
             Retorno:
                 tuple:
@@ -225,31 +246,154 @@ class DevolutionTransaction(Resource):
         data = arguments.parse_args()
 
         item_id = data['item_id']
-        user_id = int(get_jwt_identity())
-        item = ItemModel.query.get(item_id)
+        user_id = current_user().user_id
 
-        if not item:                                        
+        try:
+            transaction, refused = run_with_retry(lambda: TransactionModel.register_devolution(item_id, user_id))
+        except SQLAlchemyError:
+            return {'message': 'An internal error ocurred trying to save item.'}, 500 # Internal Server Error
+
+        if refused == 'not_found':                                        
             return {"message": "item not found."}, 404
-        
-        loan = TransactionModel.query.filter_by(item_id=item_id).order_by(TransactionModel.transaction_id.desc()).first()
 
-        if not loan:
+        if refused == 'no_loan':
             return {"message": "No transaction was made"}, 404
 
-        if loan.to_user_id != user_id:
+        if refused == 'not_holder':
             return{"message": "This item is not in your inventory"}, 403
-        
-        item.is_available = True
 
-        transaction = TransactionModel(
-            item_id = item_id,
-            from_user_id = user_id,
-            to_user_id = loan.from_user_id,
-            is_available = item.is_available)
-        
-        try:
-            transaction.save_transaction()
-            item.save_item()
-        except:
-            return {'message': 'An internal error ocurred trying to save item.'}, 500 # Internal Server Error
         return transaction.json(), 201
+
+
+
+# Mensagens das recusas por item nos lotes, as mesmas dos endpoints de um item só
+LOAN_REFUSALS = {
+    'not_found': "item not found.",
+    'owner': "This item is already in your inventory",
+    'unavailable': "Item is not available for transfer.",
+}
+DEVOLUTION_REFUSALS = {
+    'not_found': "item not found.",
+    'no_loan': "No transaction was made",
+    'not_holder': "This item is not in your inventory",
+}
+BATCH_MODES = ("atomic", "best_effort")
+
+
+def parse_batch_body():
+    """ Lê o corpo de '/loans/batch' e '/devolution/batch': {"item_ids": [...], "mode": "atomic" | "best_effort"}.
+
+        Retorna:
+            tuple: (IDs dos itens, na ordem recebida; True se o modo for 'atomic', o padrão).
+
+        Levanta:
+            BadRequest: Se a lista estiver vazia, tiver valores que não são inteiros, IDs repetidos ou
+                mais itens que BATCH_MAX_ITEMS (padrão 500), ou se o modo for desconhecido. """
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise BadRequest("The body must be a JSON object with the field 'item_ids'.")
+
+    item_ids = body.get("item_ids")
+    if not isinstance(item_ids, list) or not item_ids or any(
+            not isinstance(item_id, int) or isinstance(item_id, bool) for item_id in item_ids):
+        raise BadRequest("The field 'item_ids' must be a non-empty list of integers.")
+
+    max_items = current_app.config.get("BATCH_MAX_ITEMS", 500)
+    if len(item_ids) > max_items:
+        raise BadRequest("At most {} items can be moved in one request.".format(max_items))
+
+    if len(set(item_ids)) != len(item_ids):
+        raise BadRequest("Item ids can not be repeated in this request.")
+
+    mode = body.get("mode", "atomic")
+    if mode not in BATCH_MODES:
+        raise BadRequest("The field 'mode' must be one of: {}.".format(", ".join(BATCH_MODES)))
+
+    return item_ids, mode == "atomic"
+
+
+def move_batch(loan, messages):
+    # Corpo comum de '/loans/batch' e '/devolution/batch'
+    item_ids, atomic = parse_batch_body()
+    user_id = current_user().user_id
+
+    try:
+        moved, refused = run_with_retry(lambda: TransactionModel.register_batch(item_ids, user_id, loan, atomic))
+    except SQLAlchemyError:
+        data.session.rollback()
+        return {'message': 'An internal error ocurred trying to save item.'}, 500 # Internal Server Error
+
+    results = []
+    for index, item_id in enumerate(item_ids):
+        result = {"index": index, "item_id": item_id}
+        if item_id in moved:
+            result["status"] = "moved"
+            # Mesmo formato da transação de '/loans' e '/devolution'
+            result["transaction"] = movement_record(moved[item_id])
+        elif item_id in refused:
+            result["status"] = "error"
+            result["message"] = messages[refused[item_id]]
+        else:
+            # Item válido de um lote atômico desfeito por recusas de outros itens
+            result["status"] = "skipped"
+        results.append(result)
+
+    summary = {"moved": len(moved), "error": len(refused), "skipped": len(item_ids) - len(moved) - len(refused)}
+    return {"results": results, **summary}, 409 if atomic and refused else 200
+
+
+
+class LoanBatch(Resource):
+    """ Recurso para emprestar vários itens ao usuário autenticado em uma única requisição.
+
+        Método POST:
+            Recebe {"item_ids": [...], "mode": "atomic" | "best_effort"} e registra todos os
+            empréstimos em uma única transação do banco. """
+
+
+    @login_required
+    def post(self):
+        """ Realiza o empréstimo de um lote de itens (ex.: um kit entregue no balcão).
+
+            - Lê todos os itens com uma única consulta (IN) e valida o lote junto, com as mesmas
+              regras de '/loans' (existe, está disponível, não é do próprio usuário).
+            - Reserva os itens com um único UPDATE condicional e grava as transações com um único
+              INSERT de várias linhas, em uma transação com um único commit (ver 'register_batch').
+            - No modo 'atomic' (padrão), qualquer recusa desfaz o lote inteiro; em 'best_effort',
+              os itens aceitos são emprestados e só os demais são recusados.
+
+            Retorno:
+                tuple: Resultado por item ('moved' com a transação, 'error' com a mensagem de '/loans'
+                ou 'skipped' se o lote atômico foi desfeito), totais e código HTTP 200 (409 se o lote
+                atômico foi recusado). Corpo inválido retorna 400 e erro interno, 500. """
+
+        return move_batch(True, LOAN_REFUSALS)
+
+
+
+class DevolutionBatch(Resource):
+    """ Recurso para devolver vários itens emprestados ao usuário autenticado em uma única requisição.
+
+        Método POST:
+            Recebe {"item_ids": [...], "mode": "atomic" | "best_effort"} e registra todas as
+            devoluções em uma única transação do banco. """
+
+
+    @login_required
+    def post(self):
+        """ Realiza a devolução de um lote de itens.
+
+            - Lê todos os itens com uma única consulta (IN) e valida o lote junto, com as mesmas
+              regras de '/devolution' (o usuário autenticado é o detentor atual).
+            - Libera os itens com um único UPDATE condicional e grava as transações com um único
+              INSERT de várias linhas, em uma transação com um único commit (ver 'register_batch').
+            - No modo 'atomic' (padrão), qualquer recusa desfaz o lote inteiro; em 'best_effort',
+              os itens aceitos são devolvidos e só os demais são recusados.
+
+            Retorno:
+                tuple: Resultado por item ('moved' com a transação, 'error' com a mensagem de
+                '/devolution' ou 'skipped'), totais e código HTTP 200 (409 se o lote atômico foi
+                recusado). Corpo inválido retorna 400 e erro interno, 500. """
+
+        return move_batch(False, DEVOLUTION_REFUSALS)
@@ -1,9 +1,11 @@
 from flask_restful import Resource, reqparse
 from models.user_models import UserModel
-from models.transaction_models import TransactionModel
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
-from secrets import compare_digest
-from blacklist import BLACKLIST
+from models.item_models import ItemModel
+from flask_jwt_extended import create_access_token
+from auth import login_required, current_user, forget_token
+from blacklist import get_blacklist
+from cache import read_through, conditional_response, user_key
+from passwords import get_hasher, PasswordHasherBusy
 
 
 class User(Resource):
@@ -11,7 +13,7 @@ class User(Resource):
 
         Métodos:
             get(user_id): Recupera informações de um usuário pelo seu ID.
-            delete(user_id): Exclui o usuário autenticado, removendo também suas transações. """
+            delete(user_id): Exclui o usuário autenticado, com seus itens e as referências nas transações. """
 
 
     def get(self, user_id):
@@ -20,24 +22,27 @@ class User(Resource):
             Parâmetros:
                 user_id (int): Identificador do usuário a ser buscado.
 
+            O usuário vem do cache de leitura, com ETag (304 se não mudou).
+
             Retorno:
                 tuple:
-                    - Se o usuário for encontrado, retorna os dados em formato JSON.
+                    - Se o usuário for encontrado, retorna os dados em formato JSON (ou 304 Not Modified).
                     - Se não encontrado, retorna mensagem de erro e código HTTP 404. """
         
-        user = UserModel.find_user(user_id)
+        entry = read_through(user_key(user_id), lambda: UserModel.find_record(user_id))
 
-        if user:
-            return user.json()
+        if entry:
+            return conditional_response(entry)
         return {'message': 'User not found.'}, 404 #not found
 
 
-    @jwt_required()
+    @login_required
     def delete(self, user_id):
         """ Exclui o usuário autenticado.
 
             Verifica se o usuário existe e se o usuário autenticado tem permissão para deletar (só pode deletar a si mesmo).
-            Remove todas as transações associadas ao usuário antes de deletar o usuário.
+            Na mesma transação do banco, devolve aos donos os itens emprestados a ele, apaga os itens
+            de que é dono e remove a referência a ele nas transações (ver 'UserModel.delete_user').
 
             Parâmetros:
                 user_id (int): Identificador do usuário a ser deletado.
@@ -50,7 +55,7 @@ class User(Resource):
                     - Se a exclusão for bem-sucedida, retorna mensagem de sucesso. """
         
         user = UserModel.find_user(user_id)
-        user_accessed = int(get_jwt_identity())
+        user_accessed = current_user().user_id
         
         if not user:
             return {'message': 'User not found'}, 404 #not found
@@ -59,7 +64,6 @@ class User(Resource):
             return {"message": "You can not delete other users"}, 403 # Forbidden
         
         try:
-            TransactionModel.delete_user_transaction(user_id)
             user.delete_user()
         except:
             return {'message': 'An internal error ocurred trying to delete user.'}, 500 #Internal Server Error
@@ -67,6 +71,31 @@ class User(Resource):
     
     
 
+class UserHoldings(Resource):
+    """ Recurso para listar os itens que estão emprestados a um usuário. """
+
+
+    def get(self, user_id):
+        """ Lista os itens cujo detentor atual é o usuário.
+
+            Lê a coluna 'items.current_holder_id', mantida pelos empréstimos e devoluções,
+            sem percorrer o histórico de transações.
+
+            Parâmetros:
+                user_id (int): Identificador do usuário.
+
+            Retorno:
+                tuple:
+                    - Se o usuário não existir, retorna mensagem de erro e código HTTP 404.
+                    - Caso contrário, retorna a lista de itens e código HTTP 200. """
+
+        if not UserModel.find_user(user_id):
+            return {'message': 'User not found.'}, 404 #not found
+
+        return {'items': ItemModel.find_holdings(user_id)}, 200
+
+
+
 class UserRegister(Resource):
     """ Recurso para registro de novos usuários. """
 
@@ -76,11 +105,13 @@ class UserRegister(Resource):
 
             - Recebe os dados obrigatórios: 'login', 'username' e 'password'.
             - Verifica se o login já existe.
+            - Calcula o hash da senha no pool do 'PasswordHasher' (a senha não é gravada em texto puro).
             - Cria e salva o novo usuário no banco de dados.
 
             Retorno:
                 tuple:
                     - Se o login já existir, retorna mensagem de erro e código HTTP 400.
+                    - Se o pool de hash estiver sobrecarregado, retorna mensagem de erro e código HTTP 503.
                     - Se ocorrer erro interno ao salvar, retorna mensagem de erro e código HTTP 500.
                     - Se o usuário for criado com sucesso, retorna mensagem de confirmação e código HTTP 201. """
         
@@ -92,6 +123,11 @@ class UserRegister(Resource):
 
         if UserModel.find_by_login(data['login']):
             return {"message": "The login '{}' already exists.".format(data['login'])}, 400
+
+        try:
+            data['password'] = get_hasher().hash(data['password'])
+        except PasswordHasherBusy:
+            return {'message': 'Server busy, try again later.'}, 503 # Service Unavailable
         
         user = UserModel(**data)
 
@@ -112,14 +148,18 @@ class UserLogin(Resource):
         """ Autentica um usuário e gera um token de acesso JWT.
 
             - Recebe 'login' e 'password' via argumentos da requisição.
-            - Verifica se o usuário existe e se a senha confere.
+            - Verifica se o usuário existe e se a senha confere com o hash (no pool do 'PasswordHasher').
+              Um login inexistente também paga uma verificação, para não revelar quais logins existem.
+            - Senhas legadas em texto puro, ou com hash de custo diferente do configurado,
+              são refeitas com o custo atual no login bem-sucedido.
             - Em caso de sucesso, gera e retorna um token de acesso JWT.
             - Em caso de falha, retorna mensagem de erro e código HTTP 401.
 
             Retorno:
                 tuple:
                     - Sucesso: dicionário com 'token_accessed' e código HTTP 200.
-                    - Falha: mensagem de erro e código HTTP 401. """
+                    - Falha: mensagem de erro e código HTTP 401.
+                    - Pool de hash sobrecarregado: mensagem de erro e código HTTP 503. """
         
         arguments = reqparse.RequestParser()
         arguments.add_argument('login', type=str, required=True, help="The field 'login' can not be left blank")
@@ -127,8 +167,20 @@ class UserLogin(Resource):
         data = arguments.parse_args()
         
         user = UserModel.find_by_login(data['login'])
+        hasher = get_hasher()
+
+        try:
+            if not user:
+                hasher.dummy_verify(data['password'])
+                return {'message': 'The username or password is incorrect.'}, 401 # Unauthorized
+
+            valid, outdated = hasher.verify(user.password, data['password'])
+            if valid and outdated:
+                user.update_password(hasher.hash(data['password']))
+        except PasswordHasherBusy:
+            return {'message': 'Server busy, try again later.'}, 503 # Service Unavailable
 
-        if user and compare_digest(user.password, data['password']):
+        if valid:
            access_token = create_access_token(identity=str(user.user_id))
            return {'token_accessed': access_token}, 200 #Ok
         return {'message': 'The username or password is incorrect.'}, 401 # Unauthorized
@@ -139,17 +191,18 @@ class UserLogout(Resource):
     """ Recurso para realizar logout do usuário invalidando o token JWT. """
 
 
-    @jwt_required()
+    @login_required
     def post(self):
         """ Realiza o logout do usuário.
 
-            - Obtém o identificador do token JWT atual (jti).
-            - Adiciona o jti à blacklist para invalidação do token.
+            - Obtém o identificador do token JWT atual (jti) e sua expiração (exp).
+            - Adiciona o jti à blacklist até a expiração do token e tira o token do cache de tokens verificados.
             - Retorna mensagem de sucesso.
 
             Retorno:
                 dict: Mensagem de confirmação do logout e código HTTP 200. """
         
-        jwt_id = get_jwt()['jti']
-        BLACKLIST.add(jwt_id)
+        user = current_user()
+        get_blacklist().add(user.jti, user.expires_at)
+        forget_token(user.token)
         return{'message': 'Logged out sucessfully!'}, 200
@@ -1,3 +1,136 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool, StaticPool
+import time
 
-data = SQLAlchemy()
\ No newline at end of file
+data = SQLAlchemy()
+
+
+# Pragmas aplicados a cada nova conexão SQLite aberta pelo pool
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+    "mmap_size": 134217728,
+}
+
+
+def engine_options(uri, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=-1):
+    """ Monta as opções do engine SQLAlchemy de acordo com o banco apontado pela URI.
+
+        Para SQLite em arquivo, usa um QueuePool com 'check_same_thread' desativado: cada thread
+        de requisição pega uma conexão já aberta e a devolve ao final, sem reabrir o arquivo nem
+        recarregar o schema. Para SQLite em memória, usa uma única conexão compartilhada.
+        Para outros bancos, usa um QueuePool com pre-ping.
+
+        Parâmetros:
+            uri (str): Valor de 'SQLALCHEMY_DATABASE_URI'.
+            pool_size (int): Conexões mantidas abertas no pool.
+            max_overflow (int): Conexões extras permitidas em picos.
+            pool_timeout (int): Segundos de espera por uma conexão livre.
+            pool_recycle (int): Segundos até reciclar uma conexão (-1 desativa).
+
+        Retorna:
+            dict: Opções para 'SQLALCHEMY_ENGINE_OPTIONS'. """
+
+    url = make_url(uri)
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {
+                "poolclass": StaticPool,
+                "connect_args": {"check_same_thread": False},
+            }
+
+        return {
+            "poolclass": QueuePool,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            # Cabe um statement preparado por combinação de filtros das listagens (ver 'query_builder')
+            "connect_args": {"check_same_thread": False, "cached_statements": 512},
+        }
+
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """ Registra um listener que aplica os pragmas em cada conexão SQLite criada pelo engine. """
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        # Vale tanto para o sqlite3 quanto para o adaptador do aiosqlite (modo ASGI)
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+        cursor.close()
+
+
+def init_data(app):
+    """ Inicializa a extensão 'data' na aplicação com pool de conexões configurável.
+
+        Lê do config da aplicação (todos opcionais):
+            DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT,
+            DATABASE_POOL_RECYCLE: parâmetros do pool.
+            SQLITE_PRAGMAS (dict): pragmas extras ou substitutos dos padrões.
+
+        'SQLALCHEMY_ENGINE_OPTIONS' definido explicitamente tem prioridade sobre os padrões. """
+
+    options = engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        pool_size=app.config.get("DATABASE_POOL_SIZE", 5),
+        max_overflow=app.config.get("DATABASE_MAX_OVERFLOW", 10),
+        pool_timeout=app.config.get("DATABASE_POOL_TIMEOUT", 30),
+        pool_recycle=app.config.get("DATABASE_POOL_RECYCLE", -1),
+    )
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    data.init_app(app)
+
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas.update(app.config.get("SQLITE_PRAGMAS", {}))
+
+    with app.app_context():
+        if data.engine.dialect.name == "sqlite":
+            apply_sqlite_pragmas(data.engine, pragmas)
+
+
+def is_busy_error(error):
+    # SQLite sinaliza disputa de escrita como "database is locked" / "database is busy"
+    message = str(getattr(error, "orig", error)).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def run_with_retry(work, retries=5, backoff=0.01):
+    """ Executa uma unidade de trabalho no 'data.session', repetindo se o SQLite estiver ocupado.
+
+        A cada tentativa que falha por 'database is locked', a sessão é desfeita e a
+        tentativa seguinte espera o dobro do tempo anterior. Outros erros sobem direto.
+
+        Parâmetros:
+            work (callable): Função sem argumentos que faz as escritas e o commit.
+            retries (int): Tentativas extras depois da primeira.
+            backoff (float): Espera inicial, em segundos.
+
+        Retorna:
+            O valor retornado por 'work'. """
+
+    for attempt in range(retries + 1):
+        try:
+            return work()
+        except OperationalError as error:
+            data.session.rollback()
+            if attempt == retries or not is_busy_error(error):
+                raise
+            time.sleep(backoff * 2 ** attempt)
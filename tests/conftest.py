@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# O 'app' do módulo não deve criar o banco padrão; cada teste usa o seu
+os.environ["FLASK_SCHEMA_SETUP_ON_STARTUP"] = "false"
+
+from app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "SCHEMA_SETUP_ON_STARTUP": True,
+        "METRICS_ENABLED": False,
+        "RATE_LIMIT_ENABLED": False,
+        "MAX_CONCURRENT_REQUESTS": 0,
+        "PASSWORD_HASH_ALGORITHM": "pbkdf2_sha256",
+        "PASSWORD_PBKDF2_ITERATIONS": 1000,
+        "TRANSACTION_ARCHIVE_DIR": str(tmp_path / "archive"),
+    })
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """ Cria um usuário e devolve o cabeçalho 'Authorization' com o token dele. """
+
+    def login(name):
+        client.post("/signup", json={"login": name, "username": name, "password": "secret"})
+        token = client.post("/login", json={"login": name, "password": "secret"}).json["token_accessed"]
+        return {"Authorization": "Bearer " + token}
+    return login
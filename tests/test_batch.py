@@ -0,0 +1,14 @@
+def test_batch_transactions_have_the_single_endpoint_shape(client, login):
+    owner, borrower = login("owner"), login("borrower")
+    for item_id in (1, 2):
+        client.post("/items/{}".format(item_id), json={"description": "item", "is_available": True}, headers=owner)
+
+    single = client.post("/loans", json={"item_id": 1}, headers=borrower).json
+    batch = client.post("/loans/batch", json={"item_ids": [2]}, headers=borrower).json["results"][0]["transaction"]
+    assert batch.keys() == single.keys()
+    assert (batch["from_user"], batch["to_user"]) == (single["from_user"], single["to_user"]) == (1, 2)
+
+    single = client.post("/devolution", json={"item_id": 1}, headers=borrower).json
+    batch = client.post("/devolution/batch", json={"item_ids": [2]}, headers=borrower).json["results"][0]["transaction"]
+    assert batch.keys() == single.keys()
+    assert (batch["from_user"], batch["to_user"]) == (single["from_user"], single["to_user"]) == (2, 1)
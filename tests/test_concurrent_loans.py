@@ -0,0 +1,36 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Versão mínima de 'benchmarks/concurrent_loans.py': se o UPDATE condicional de '/loans' ou
+# '/devolution' deixar de ser atômico, mais de uma requisição da rodada é aceita
+REQUESTS = 32
+ROUNDS = 3
+
+
+def fire(app, endpoint, headers):
+    def call(index):
+        response = app.test_client().post(endpoint, json={"item_id": 1}, headers=headers[index % len(headers)])
+        return response.status_code, response.json.get("to_user")
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        return list(pool.map(call, range(REQUESTS)))
+
+
+def test_only_one_concurrent_loan_and_devolution_succeeds(app, client, login):
+    owner = login("owner")
+    borrowers = [login("user{}".format(index)) for index in range(8)]
+    client.post("/items/1", json={"description": "item", "is_available": True}, headers=owner)
+
+    for _ in range(ROUNDS):
+        results = fire(app, "/loans", borrowers)
+        assert Counter(status for status, _ in results)[201] == 1, results
+
+        holder_id = next(to_user for status, to_user in results if status == 201)
+        holder = borrowers[holder_id - 2] # ids: 1 = owner, 2.. = borrowers na ordem de criação
+
+        results = fire(app, "/devolution", [holder])
+        assert Counter(status for status, _ in results)[201] == 1, results
+
+    item = client.get("/items/1").json
+    assert item["is_available"] is True
+    assert len(client.get("/transactions?item_id=1").json["transactions"]) == 2 * ROUNDS
@@ -0,0 +1,24 @@
+import pytest
+
+import pagination
+
+
+@pytest.fixture
+def items(client, login):
+    owner = login("owner")
+    for item_id in range(1, 6):
+        client.post("/items/{}".format(item_id), json={"description": "item", "is_available": True}, headers=owner)
+
+
+@pytest.mark.parametrize("path", ["/items", "/transactions"])
+def test_export_is_capped(client, login, items, monkeypatch, path):
+    borrower = login("borrower")
+    for item_id in range(1, 6):
+        client.post("/loans", json={"item_id": item_id}, headers=borrower)
+    monkeypatch.setattr(pagination, "MAX_EXPORT_LIMIT", 3)
+
+    for query in ("?format=ndjson", "?format=ndjson&limit=1000000000", "?format=csv&limit=1000000000"):
+        lines = client.get(path + query).data.decode().splitlines()
+        assert len(lines) == 3 + query.startswith("?format=csv")
+
+    assert len(client.get(path + "?format=ndjson&limit=2").data.decode().splitlines()) == 2
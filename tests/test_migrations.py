@@ -0,0 +1,44 @@
+import sqlite3
+
+from app import create_app
+
+
+OLD_SCHEMA = """
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, username VARCHAR(20), login VARCHAR(40), password VARCHAR(40));
+CREATE TABLE items (item_id INTEGER PRIMARY KEY, description VARCHAR(40), is_available BOOLEAN, date VARCHAR(20), owner_id INTEGER);
+CREATE TABLE transactions (transaction_id INTEGER PRIMARY KEY, item_id INTEGER, from_user_id INTEGER REFERENCES users(user_id),
+                           to_user_id INTEGER REFERENCES users(user_id), is_available BOOLEAN, date VARCHAR(20));
+"""
+
+
+def old_database(path, users):
+    connection = sqlite3.connect(path)
+    connection.executescript(OLD_SCHEMA)
+    connection.executemany("INSERT INTO users VALUES (?, ?, ?, 'p')", users)
+    connection.commit()
+    connection.close()
+
+
+def test_migrate_reports_duplicate_logins(tmp_path):
+    path = str(tmp_path / "old.db")
+    old_database(path, [(1, "a", "ana"), (2, "b", "ana"), (3, "c", "bia")])
+    runner = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + path, "SCHEMA_SETUP_ON_STARTUP": False}).test_cli_runner()
+
+    result = runner.invoke(args=["migrate"])
+    assert result.exit_code != 0
+    assert "ix_users_login" in result.output and "'ana' x2" in result.output
+
+    connection = sqlite3.connect(path)
+    connection.execute("UPDATE users SET login = 'ana2' WHERE user_id = 2")
+    connection.commit()
+    connection.close()
+
+    result = runner.invoke(args=["init-db"])
+    assert result.exit_code == 0, result.output
+    assert "Applied add_filter_indexes" in result.output
+
+
+def test_endpoint_queries_use_indexes(app):
+    result = app.test_cli_runner().invoke(args=["explain-queries"])
+    assert result.exit_code == 0, result.output
+    assert "[SCAN]" not in result.output
@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import text
+
+from sql_alchemy import data
+
+
+@pytest.mark.parametrize("stored", [
+    "scrypt$x$8$1$c2FsdA$aGFzaA",
+    "scrypt$3$8$1$c2FsdA$aGFzaA",
+    "scrypt$16384$8$1$%%%$aGFzaA",
+    "pbkdf2_sha256$many$c2FsdA$aGFzaA",
+    "pbkdf2_sha256$1000$c2FsdA$a",
+])
+def test_malformed_stored_hash_fails_the_login(app, client, login, stored):
+    login("ana")
+    with app.app_context():
+        data.session.execute(text("UPDATE users SET password = :stored WHERE login = 'ana'"), {"stored": stored})
+        data.session.commit()
+
+    response = client.post("/login", json={"login": "ana", "password": "secret"})
+    assert response.status_code == 401
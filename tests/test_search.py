@@ -0,0 +1,38 @@
+import json
+
+from search import MAX_RANKED_MATCHES
+from sql_alchemy import data
+
+MATCHES = MAX_RANKED_MATCHES + 250
+
+
+def test_relevance_search_past_the_ranking_cap_loses_no_rows(app, client, login):
+    login("owner")
+    with app.app_context():
+        connection = data.engine.raw_connection()
+        connection.executemany("INSERT INTO items (item_id, description, is_available, owner_id, date) VALUES (?, ?, 1, 1, ?)",
+                               [(item_id, "livro" if item_id % 3 else "caneta", "17/10/2026 10:00:00")
+                                for item_id in range(1, MATCHES * 3 // 2 + 1)])
+        connection.commit()
+        connection.close()
+    expected = [item_id for item_id in range(1, MATCHES * 3 // 2 + 1) if item_id % 3]
+    assert len(expected) > MAX_RANKED_MATCHES
+
+    found, path = [], "/items?q=livro&limit=1000"
+    while path:
+        page = client.get(path).json
+        if not found:
+            assert page["truncated"] is True
+        found += [item["item_id"] for item in page["items"]]
+        path = page["next_cursor"] and "/items?q=livro&limit=1000&cursor=" + page["next_cursor"]
+
+    assert len(found) == len(set(found))
+    assert sorted(found) == expected
+    # Depois dos ranqueados (os mais recentes), os demais em ordem decrescente
+    assert found[MAX_RANKED_MATCHES:] == sorted(expected[:-MAX_RANKED_MATCHES], reverse=True)
+
+    exported = [json.loads(line)["item_id"] for line in client.get("/items?q=livro&format=ndjson").data.splitlines()]
+    assert sorted(exported) == expected
+
+    page = client.get("/items?q=caneta").json
+    assert "truncated" not in page
@@ -0,0 +1,87 @@
+import pytest
+
+from models.stats_models import compute_stats
+from sql_alchemy import data
+
+
+def assert_stats_consistent(app, client):
+    result = app.test_cli_runner().invoke(args=["stats-check"])
+    assert result.exit_code == 0, result.output
+    assert "Stats are consistent." in result.output
+
+    stats = client.get("/stats").json
+    assert stats["items"] == stats["available"] + stats["lent"]
+    with app.app_context(), data.engine.connect() as connection:
+        assert compute_stats(connection)[0] == stats
+
+
+@pytest.fixture
+def lent_item(client, login):
+    """ Item 1 do 'owner' emprestado ao 'borrower'; devolve os cabeçalhos de 'owner', 'borrower' e 'other'. """
+
+    owner, borrower, other = login("owner"), login("borrower"), login("other")
+    client.post("/items/1", json={"description": "drill", "is_available": True}, headers=owner)
+    client.post("/items/2", json={"description": "saw", "is_available": True}, headers=owner)
+    assert client.post("/loans", json={"item_id": 1}, headers=borrower).status_code == 201
+    return owner, borrower, other
+
+
+def test_owner_cannot_make_a_lent_item_available(app, client, lent_item):
+    owner, borrower, other = lent_item
+
+    response = client.put("/items/1", json={"description": "drill", "is_available": True}, headers=owner)
+    assert response.status_code == 409
+    assert client.post("/loans", json={"item_id": 1}, headers=other).status_code == 403
+
+    assert client.put("/items/1", json={"description": "red drill", "is_available": False}, headers=owner).status_code == 200
+    assert client.get("/users/2/holdings").json["items"][0]["description"] == "red drill"
+    assert_stats_consistent(app, client)
+
+
+def test_bulk_update_keeps_a_lent_item_unavailable(app, client, lent_item):
+    owner, borrower, other = lent_item
+
+    results = client.post("/items/bulk", json=[{"item_id": 1, "description": "drill", "is_available": True},
+                                               {"item_id": 2, "description": "red saw", "is_available": True}],
+                          headers=owner).json["results"]
+    assert [result["status"] for result in results] == ["error", "updated"]
+    assert client.post("/loans", json={"item_id": 1}, headers=other).status_code == 403
+    assert client.post("/devolution", json={"item_id": 1}, headers=borrower).status_code == 201
+    assert_stats_consistent(app, client)
+
+
+def test_deleting_a_lent_item(app, client, lent_item):
+    owner, borrower, other = lent_item
+
+    assert client.delete("/items/1", headers=owner).status_code == 200
+    assert client.get("/users/2/holdings").json["items"] == []
+    assert_stats_consistent(app, client)
+
+
+@pytest.mark.parametrize("user", ["owner", "borrower"])
+def test_deleting_a_user_with_lent_items(app, client, lent_item, user):
+    owner, borrower, other = lent_item
+    headers = owner if user == "owner" else borrower
+
+    assert client.post("/loans", json={"item_id": 2}, headers=other).status_code == 201
+    assert client.delete("/users/{}".format(1 if user == "owner" else 2), headers=headers).status_code == 200
+    assert_stats_consistent(app, client)
+
+
+def test_batch_loans_skip_lent_items(app, client, lent_item):
+    owner, borrower, other = lent_item
+
+    response = client.post("/loans/batch", json={"item_ids": [1, 2], "mode": "best_effort"}, headers=other)
+    assert response.status_code == 200, response.json
+    assert client.get("/users/3/holdings").json["items"][0]["item_id"] == 2
+    assert_stats_consistent(app, client)
+
+
+def test_loans_and_devolutions(app, client, lent_item):
+    owner, borrower, other = lent_item
+
+    assert client.post("/loans", json={"item_id": 2}, headers=other).status_code == 201
+    assert client.post("/devolution/batch", json={"item_ids": [1]}, headers=borrower).status_code == 200
+    assert client.post("/devolution", json={"item_id": 2}, headers=other).status_code == 201
+    assert client.post("/loans/batch", json={"item_ids": [1, 2]}, headers=borrower).status_code == 200
+    assert_stats_consistent(app, client)
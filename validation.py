@@ -0,0 +1,49 @@
+from flask_restful import abort
+
+""" Validação declarativa dos argumentos de query string das listagens.
+
+    Substitui o 'reqparse' nos caminhos mais usados ('GET /items', 'GET /transactions').
+    O esquema é montado uma vez, no import; cada requisição só percorre a tupla de campos
+    e converte os valores presentes, sem criar objetos 'Argument' nem consultar
+    'request.json'/'request.values' como o 'reqparse' faz.
+
+    Os erros têm o mesmo corpo do 'reqparse': {'message': {'<argumento>': '<erro>'}}, status 400. """
+
+
+class ArgumentSchema:
+    """ Esquema de argumentos: nome -> função de conversão.
+
+        Exemplo:
+            arguments = ArgumentSchema(owner_id=int, is_available=str_to_bool)
+            args = arguments.parse(request.args)   # {'owner_id': 3} """
+
+    __slots__ = ("fields", "names")
+
+    def __init__(self, **fields):
+        self.fields = tuple(fields.items())
+        self.names = frozenset(fields)
+
+
+    def parse(self, source):
+        """ Converte os argumentos presentes em 'source'.
+
+            Parâmetros:
+                source (Mapping): 'request.args' ou outro mapeamento com '.get' (o primeiro valor
+                    é usado quando o argumento se repete, como no 'reqparse').
+
+            Retorna:
+                dict: Somente os argumentos informados, já convertidos.
+
+            Levanta:
+                HTTPException: 400 com o argumento inválido e a mensagem do conversor. """
+
+        values = {}
+        for name, convert in self.fields:
+            raw = source.get(name)
+            if raw is None:
+                continue
+            try:
+                values[name] = convert(raw)
+            except Exception as error:
+                abort(400, message={name: str(error)})
+        return values
@@ -0,0 +1,80 @@
+from flask import Response, request
+from sqlalchemy import event, text
+from werkzeug.http import quote_etag
+from sql_alchemy import data
+
+""" Versões das coleções '/items' e '/transactions', usadas como ETag fraco das listagens.
+
+    'collection_versions' guarda um contador por coleção. Triggers em 'items',
+    'transactions' e 'transaction_partitions' somam 1 a cada linha inserida, alterada ou
+    apagada, então qualquer escrita (modelos, lotes com executemany, SQL direto, rotação e
+    arquivamento das partições) muda a versão no mesmo commit. Escritas só nas partições
+    online ('forget_user') chamam 'bump_version'.
+
+    A listagem lê a versão (uma busca pela chave) antes da consulta: se o cliente mandou o
+    mesmo ETag em 'If-None-Match', a resposta é 304 sem consultar nem serializar as
+    linhas. Uma escrita entre a leitura da versão e a consulta só faz o cliente baixar a
+    página de novo na próxima vez; o contrário (página antiga com a versão nova) não
+    acontece. """
+
+
+collection_versions = data.Table(
+    'collection_versions',
+    data.Column('name', data.String(20), primary_key=True),
+    data.Column('version', data.Integer, nullable=False, server_default='0'),
+)
+
+# Coleção -> tabelas cujas escritas mudam a versão dela
+VERSIONED_TABLES = {
+    "items": ("items",),
+    "transactions": ("transactions", "transaction_partitions"),
+}
+
+VERSION_QUERY = text("SELECT version FROM collection_versions WHERE name = :name")
+
+
+def create_version_triggers(connection):
+    """ Cria as linhas de 'collection_versions' e os triggers que as mantêm, se ainda não existirem (só no SQLite).
+
+        Parâmetros:
+            connection: Conexão SQLAlchemy. """
+
+    if connection.dialect.name != "sqlite":
+        return
+
+    for name, tables in VERSIONED_TABLES.items():
+        connection.execute(text("INSERT INTO collection_versions (name, version) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING"),
+                           {'name': name})
+        for table in tables:
+            for operation in ("INSERT", "UPDATE", "DELETE"):
+                connection.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS {0}_version_{1} AFTER {2} ON {0} BEGIN "
+                    "UPDATE collection_versions SET version = version + 1 WHERE name = '{3}'; END".format(
+                        table, operation.lower(), operation, name)))
+
+
+def bump_version(connection, name):
+    # Para escritas que os triggers não veem (tabelas das partições mensais)
+    connection.execute(text("UPDATE collection_versions SET version = version + 1 WHERE name = :name"), {'name': name})
+
+
+def collection_etag(connection, name):
+    """ ETag fraco da versão atual da coleção, sem as aspas (ex.: 'items-42'). """
+
+    return "{}-{}".format(name, connection.execute(VERSION_QUERY, {'name': name}).scalar() or 0)
+
+
+def not_modified(etag):
+    """ Resposta 304 se o 'If-None-Match' da requisição já tem 'etag' (comparação fraca); senão None. """
+
+    if request.if_none_match and request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers={"ETag": quote_etag(etag, weak=True)})
+    return None
+
+
+def etag_header(etag):
+    return {"ETag": quote_etag(etag, weak=True)}
+
+
+# Bancos novos: os triggers entram junto com as tabelas ('create_all')
+event.listen(data.metadata, 'after_create', lambda target, connection, **kw: create_version_triggers(connection))